@@ -190,59 +190,405 @@ import numpy          as np
 import numpy.random   as npr
 import scipy.linalg   as spla
 import scipy.stats    as sps
+import scipy.special  as spe
 import scipy.optimize as spo
 import cPickle
 import multiprocessing
 import ast
 
-def compute_ei(model, pred, ei_target=None, compute_grad=True):
-    # TODO: use ei_target
-    if pred.ndim == 1:
-        pred = pred[None,:]
+from abc import ABCMeta, abstractmethod
 
-    if not compute_grad:
-        func_m, func_v = model.predict(pred)
-    else:
-        (func_m,
-        func_v,
-        grad_xp_m,
-        grad_xp_v) = model.predict(pred, compute_grad=True)
+from ..models.gp_classifier      import GPClassifier
+from ..transformations.beta_warp import beta_cdf, beta_pdf
+
+SQRT_2PI_INV = 1.0/np.sqrt(2*np.pi)
+
+DEFAULT_LCB_KAPPA         = 2.0
+DEFAULT_THOMPSON_FEATURES = 500
+
+# The spectral density of the Matern 5/2 kernel is a multivariate
+# Student-t with 2*nu = 5 degrees of freedom
+MATERN52_DOF = 5.0
+
+
+class AbstractAcquisitionFunction(object):
+    """an acquisition function to be maximized, built on a fitted model
+
+    Subclasses compute the acquisition of the model in its current state.
+    Outputs for several MCMC states are averaged by the chooser.
+
+    Attributes
+    ----------
+    nonnegative : bool
+        whether the values are nonnegative, which is needed to multiply
+        them by the probability of satisfying the constraints
+    optimize : bool
+        whether the values have useful gradients to optimize them with
+    """
+    __metaclass__ = ABCMeta
+
+    nonnegative = True
+    optimize    = True
+
+    def __init__(self, model, options=None):
+        self.model   = model
+        self.options = options if options is not None else {}
+
+    @abstractmethod
+    def __call__(self, pred, compute_grad=True):
+        """return the acquisition at each row of pred in the current state
+
+        Returns
+        -------
+        acq : 1d array
+            the acquisition at each candidate
+        acq_grad : N x D array
+            its gradient wrt the candidates, only if compute_grad is True
+        """
+        pass
+
+
+class MarginalAcquisitionFunction(AbstractAcquisitionFunction):
+    """an acquisition function of the marginal predictive distribution
+
+    Subclasses only compute the acquisition from the predictive mean and
+    variance at each candidate, and their gradients.
+    """
+
+    def __call__(self, pred, compute_grad=True):
+        if pred.ndim == 1:
+            pred = pred[None,:]
+
+        if not compute_grad:
+            func_m, func_v = self.model.predict(pred)
+            return self.from_prediction(self.model.state, func_m, func_v)
+        else:
+            func_m, func_v, grad_xp_m, grad_xp_v = self.model.predict(pred, compute_grad=True)
+            return self.from_prediction(self.model.state, func_m, func_v, grad_xp_m, grad_xp_v)
+
+    @abstractmethod
+    def from_prediction(self, state, func_m, func_v, grad_xp_m=None, grad_xp_v=None):
+        """return the acquisition given the predictive distribution
+
+        func_m and func_v are N or N x F (for F fantasies), grad_xp_m and
+        grad_xp_v are N x D or N x D x F. The gradient is only computed if
+        they are given.
+        """
+        pass
+
+
+class ExpectedImprovement(MarginalAcquisitionFunction):
+    """expected improvement of a model over the best of its (fantasized) values
+
+    The incumbent depends on the state of the model, since the fantasies
+    for pending inputs do. It is computed the first time a state is used
+    and reused afterwards, so the object should be created anew whenever
+    the model is refit.
+
+    Parameters
+    ----------
+    model : GP
+        a fitted model with a `values` property and a `predict` method
+    """
+    def __init__(self, model, options=None):
+        super(ExpectedImprovement, self).__init__(model, options)
+        self._incumbents = {}
+
+    def incumbent(self, state=None):
+        """return the best value in the given state, one per fantasy, as a 1 x F array"""
+        state = self.model.state if state is None else state
+
+        if state not in self._incumbents:
+            if state != self.model.state:
+                current_state = self.model.state
+                self.model.set_state(state)
+                values = self.model.values
+                self.model.set_state(current_state)
+            else:
+                values = self.model.values
+            self._incumbents[state] = np.atleast_1d(values.min(axis=0)).reshape(1,-1)
+
+        return self._incumbents[state]
+
+    def from_prediction(self, state, func_m, func_v, grad_xp_m=None, grad_xp_v=None):
+        func_m, func_v, grad_xp_m, grad_xp_v = _with_fantasy_axis(func_m, func_v, grad_xp_m, grad_xp_v)
+
+        func_s = np.sqrt(func_v)
+        u      = self.incumbent(state) - func_m
+        u     /= func_s
+        ncdf   = spe.ndtr(u)
+        npdf   = np.exp(-0.5*u**2)
+        npdf  *= SQRT_2PI_INV
+
+        ei = u*ncdf
+        ei += npdf
+        ei *= func_s
+        ei = ei.mean(axis=1)
+
+        if grad_xp_m is None:
+            return ei
+
+        # Gradients of ei w.r.t. mean and variance, then the chain rule
+        # to the inputs, averaged over the fantasies
+        g_ei_m  = -ncdf
+        g_ei_s2 = 0.5*npdf / func_s
+
+        return ei, _chain_rule(grad_xp_m, g_ei_m, grad_xp_v, g_ei_s2)
+
+class ProbabilityOfImprovement(ExpectedImprovement):
+    """probability of improving on the best of the model's (fantasized) values"""
+
+    def from_prediction(self, state, func_m, func_v, grad_xp_m=None, grad_xp_v=None):
+        func_m, func_v, grad_xp_m, grad_xp_v = _with_fantasy_axis(func_m, func_v, grad_xp_m, grad_xp_v)
+
+        func_s = np.sqrt(func_v)
+        u      = self.incumbent(state) - func_m
+        u     /= func_s
+        pi     = spe.ndtr(u).mean(axis=1)
+
+        if grad_xp_m is None:
+            return pi
+
+        npdf  = np.exp(-0.5*u**2)
+        npdf *= SQRT_2PI_INV
+
+        g_pi_m  = -npdf / func_s
+        g_pi_v  = 0.5*g_pi_m*u / func_s
+
+        return pi, _chain_rule(grad_xp_m, g_pi_m, grad_xp_v, g_pi_v)
+
+class LowerConfidenceBound(MarginalAcquisitionFunction):
+    """the negated lower confidence bound, mean - kappa*std, of the model
+
+    The option 'lcb-kappa' sets kappa. This can be negative, so it cannot
+    be combined with constraints.
+    """
+    nonnegative = False
+
+    def __init__(self, model, options=None):
+        super(LowerConfidenceBound, self).__init__(model, options)
+        self.kappa = float(self.options.get('lcb-kappa', DEFAULT_LCB_KAPPA))
 
+    def from_prediction(self, state, func_m, func_v, grad_xp_m=None, grad_xp_v=None):
+        func_m, func_v, grad_xp_m, grad_xp_v = _with_fantasy_axis(func_m, func_v, grad_xp_m, grad_xp_v)
+
+        func_s = np.sqrt(func_v)
+        lcb    = (self.kappa*func_s - func_m).mean(axis=1)
+
+        if grad_xp_m is None:
+            return lcb
+
+        return lcb, _chain_rule(grad_xp_m, -np.ones(func_m.shape), grad_xp_v, 0.5*self.kappa/func_s)
+
+class ThompsonSampling(AbstractAcquisitionFunction):
+    """the negated value of a sample from the posterior
+
+    The sample is a RandomFeatureSample from a single MCMC state chosen at
+    random. It is drawn once, the first time that state is evaluated, and
+    kept for the lifetime of the object, so all the candidates of one
+    suggestion are ranked by the same joint draw however they are split
+    into calls. The other states contribute zero, so the average over
+    states ranks the candidates by that sample. The option
+    'thompson-features' sets the number of random features.
+    """
+    nonnegative = False
+
+    def __init__(self, model, options=None):
+        super(ThompsonSampling, self).__init__(model, options)
+        self.num_features = int(self.options.get('thompson-features', DEFAULT_THOMPSON_FEATURES))
+        self.state        = npr.randint(max(model.num_states, 1))
+        self.sample       = None
+
+    def __call__(self, pred, compute_grad=True):
+        if pred.ndim == 1:
+            pred = pred[None,:]
+
+        if self.model.state != self.state:
+            if not compute_grad:
+                return np.zeros(pred.shape[0])
+            else:
+                return np.zeros(pred.shape[0]), np.zeros(pred.shape)
+
+        if self.sample is None:
+            self.sample = RandomFeatureSample(self.model, self.num_features)
+
+        if not compute_grad:
+            return -self.sample(pred)
+        else:
+            return -self.sample(pred), -self.sample.grad(pred)
+
+ACQUISITION_FUNCTIONS = {
+    'ei'       : ExpectedImprovement,
+    'pi'       : ProbabilityOfImprovement,
+    'lcb'      : LowerConfidenceBound,
+    'thompson' : ThompsonSampling
+}
+
+class RandomFeatureSample(object):
+    """an approximate posterior sample of a model's latent function
+
+    The Matern52 kernel on the beta-warped inputs is approximated with
+    random Fourier features. Bayesian linear regression on the features
+    of the observations then gives a posterior over the weights, from
+    which one weight vector is drawn. The sample is a linear model, so it
+    can be evaluated anywhere, always as the same function. Uses the
+    current state of the model and conditions on its pending points
+    through one of their fantasies, with the noise the model has on each
+    value.
+
+    Parameters
+    ----------
+    model : GP or GPClassifier
+        a fitted model in the state to draw the sample from
+    num_features : int
+        the number of random features
+    """
+    def __init__(self, model, num_features):
+        params = model.params
+
+        ls         = params['ls'].value
+        amp2       = params['amp2'].value if 'amp2' in params else 1.0
+        self.alpha = params['beta_alpha'].value
+        self.beta  = params['beta_beta'].value
+        self.mean  = params['mean'].value
+
+        # Classifiers count the latent function as feasible above the
+        # level that corresponds to the target probability
+        if isinstance(model, GPClassifier):
+            self.threshold = model.sigmoid_inverse(model._one_minus_epsilon)
+        else:
+            self.threshold = 0.0
+
+        chi2       = npr.chisquare(MATERN52_DOF, num_features)
+        self.W     = npr.randn(num_features, ls.shape[0]) * np.sqrt(MATERN52_DOF/chi2)[:,np.newaxis] / ls
+        self.b     = 2*np.pi*npr.rand(num_features)
+        self.scale = np.sqrt(2.0*amp2/num_features)
+
+        # The values at the pending points are one of their fantasies
+        values = model.values
+        if values.ndim > 1:
+            values = values[:,npr.randint(values.shape[1])]
+
+        # The kernel has diagonal amp2, so the rest of the diagonal of the
+        # covariance that predictions condition on is the noise on each
+        # value: the stability noise, the noise of a GP and the pseudo
+        # observation noise of a Laplace classifier
+        noise = np.diag(model._inputs_cov()) - amp2
+
+        # The posterior of the weights given the observations
+        Phi   = self.features(model.inputs)
+        y     = values - self.mean
+        prec  = np.dot(Phi.T, Phi/noise[:,np.newaxis]) + np.eye(num_features)
+        chol  = spla.cholesky(prec, lower=True)
+        w_hat = spla.cho_solve((chol, True), np.dot(Phi.T, y/noise))
+
+        self.w = w_hat + spla.solve_triangular(chol.T, npr.randn(num_features), lower=False)
+
+    def warp(self, x):
+        return beta_cdf(np.clip(x, 0.0, 1.0), self.alpha, self.beta)
+
+    def features(self, x):
+        return self.scale*np.cos(np.dot(self.warp(x), self.W.T) + self.b)
+
+    def __call__(self, x):
+        return np.dot(self.features(x), self.w) + self.mean
+
+    def margin(self, x):
+        """how far above the feasibility threshold the sample is at x"""
+        return self(x) - self.threshold
+
+    def grad(self, x):
+        """the gradient at each row of x, as an N x D array"""
+        x  = np.clip(x, 0.0, 1.0)
+        z  = np.dot(self.warp(x), self.W.T) + self.b
+        dz = -self.scale*np.sin(z)*self.w
+
+        dx = beta_pdf(x, self.alpha, self.beta)
+        dx[np.logical_not(np.isfinite(dx))] = 1.0
+
+        return np.dot(dz, self.W)*dx
+
+    def value_and_grad(self, x):
+        """the value and gradient at a single point x, for the optimizer"""
+        x = x[None]
+
+        return self(x)[0], self.grad(x)[0]
+
+class ConstraintAggregator(object):
+    """the probability that all constraints are satisfied
+
+    The constraints are independent, so the probability is the product of
+    the probabilities of the constraint models. It is computed as the sum
+    of their log probabilities, as is its gradient, which takes O(C) work
+    for C constraints and stays accurate where the probabilities are tiny.
+    Uses the current state of each model.
+
+    Parameters
+    ----------
+    models : list
+        the constraint models, each with a `log_pi` method
+    """
+    def __init__(self, models):
+        self.models = models
+
+    def log_prob(self, pred, compute_grad=False):
+        """return the log probability at each row of pred, and its N x D gradient if compute_grad"""
+        log_prob = np.zeros(pred.shape[0])
+        if not compute_grad:
+            for model in self.models:
+                log_prob += model.log_pi(pred, compute_grad=False)
+            return log_prob
+
+        log_prob_grad = np.zeros(pred.shape)
+        for model in self.models:
+            lp, lp_grad = model.log_pi(pred, compute_grad=True)
+            log_prob      += lp
+            log_prob_grad += lp_grad
+        return log_prob, log_prob_grad
+
+    def prob(self, pred, compute_grad=False):
+        """return the probability at each row of pred, and its N x D gradient if compute_grad"""
+        if not compute_grad:
+            return np.exp(self.log_prob(pred))
+
+        log_prob, log_prob_grad = self.log_prob(pred, compute_grad=True)
+        prob = np.exp(log_prob)
+
+        return prob, prob[:,np.newaxis]*log_prob_grad
+
+def _with_fantasy_axis(func_m, func_v, grad_xp_m, grad_xp_v):
+    # Give the predictions a trailing fantasy axis if they do not have one
     if func_m.ndim == 1:
         func_m = func_m[:,np.newaxis]
     if func_v.ndim == 1:
         func_v = func_v[:,np.newaxis]
+    if grad_xp_m is not None and grad_xp_m.ndim == 2:
+        grad_xp_m = grad_xp_m[:,:,np.newaxis]
+    if grad_xp_v is not None and grad_xp_v.ndim == 2:
+        grad_xp_v = grad_xp_v[:,:,np.newaxis]
 
-    if compute_grad:
-        if grad_xp_m.ndim == 2:
-            grad_xp_m = grad_xp_m[:,:,np.newaxis]
-        if grad_xp_v.ndim == 2:
-            grad_xp_v = grad_xp_v[:,:,np.newaxis]
+    return func_m, func_v, grad_xp_m, grad_xp_v
 
-    ei_values = model.values.min(axis=0)
-
-    ei_values = np.array(ei_values)
-    if ei_values.ndim == 0:
-        ei_values = np.array([[ei_values]])
+def _chain_rule(grad_xp_m, g_m, grad_xp_v, g_v):
+    # The gradient wrt the inputs, averaged over the fantasies, given the
+    # gradients wrt the mean and variance. The variance does not depend on
+    # the fantasies, so its arrays may have a fantasy axis of size 1, in
+    # which case the gradient wrt the variance is summed over them first.
+    # The contractions avoid N x D x F temporaries.
+    grad = np.einsum('ndf,nf->nd', grad_xp_m, g_m)
+    if grad_xp_v.shape[2] == g_v.shape[1]:
+        grad += np.einsum('ndf,nf->nd', grad_xp_v, g_v)
+    else:
+        grad += grad_xp_v[:,:,0]*g_v.sum(axis=1)[:,np.newaxis]
+    grad /= g_m.shape[1]
 
-    # Expected improvement
-    func_s = np.sqrt(func_v)
-    u      = (ei_values - func_m) / func_s
-    ncdf   = sps.norm.cdf(u)
-    npdf   = sps.norm.pdf(u)
-    ei     = np.mean(func_s*( u*ncdf + npdf),axis=1)
+    return grad
 
+def compute_ei(model, pred, ei_target=None, compute_grad=True):
+    # TODO: use ei_target
     if not compute_grad:
-        return ei
-
-    ei = np.sum(ei)
+        return ExpectedImprovement(model)(pred, compute_grad=False)
 
-    # Gradients of ei w.r.t. mean and variance            
-    g_ei_m = -ncdf
-    g_ei_s2 = 0.5*npdf / func_s
-    
-    # Gradient of ei w.r.t. the inputs
-    grad_xp = (grad_xp_m*np.tile(g_ei_m,(pred.shape[1],1))).T + (grad_xp_v.T*g_ei_s2).T
-    grad_xp = np.mean(grad_xp,axis=0)
+    ei, ei_grad = ExpectedImprovement(model)(pred, compute_grad=True)
 
-    return ei, grad_xp.flatten()
+    return np.sum(ei), ei_grad.flatten()
@@ -184,6 +184,7 @@
 
 
 import sys
+import time
 import numpy          as np
 import numpy.random   as npr
 import scipy.optimize as spo
@@ -191,9 +192,9 @@ import multiprocessing
 
 from collections import defaultdict
 
-from .acquisition_functions  import compute_ei
+from .acquisition_functions  import ACQUISITION_FUNCTIONS, ConstraintAggregator
 from ..utils.grad_check      import check_grad
-from ..grids                 import sobol_grid
+from ..grids.candidate_grid  import CandidateGrid
 from ..models.abstract_model import function_over_hypers
 from ..                      import models
 
@@ -204,6 +205,29 @@ DEFAULT_NUMDESIGN = 2
 DEFAULT_NUMSPRAY  = 10
 DEFAULT_SPRAYSTD  = 1e-3
 
+DEFAULT_GRIDSUBSET = 20
+
+# Adaptive candidate generation: start from a small Sobol design and
+# refine around the most promising candidates until EI stops improving
+DEFAULT_ADAPTIVE_GRID_PER_DIM = 100
+DEFAULT_ADAPTIVE_GRID_MIN     = 500
+DEFAULT_ADAPTIVE_ROUNDS       = 10
+DEFAULT_ADAPTIVE_STD          = 0.1
+DEFAULT_ADAPTIVE_TOL          = 1e-3
+DEFAULT_ADAPTIVE_TIME         = 10.0
+
+# With a suggestion time budget, this fraction of it goes to fitting the
+# models and the rest to optimizing the acquisition function
+DEFAULT_FIT_BUDGET_FRACTION = 0.5
+DEFAULT_CHUNK_SIZE          = 2000
+
+# The batched optimizer moves all starting points in lock-step by projected
+# gradient ascent with Barzilai-Borwein steps, see optimize_batch
+DEFAULT_BATCH_ITERS = 200
+DEFAULT_BATCH_MOVE  = 1e-2
+DEFAULT_BATCH_TOL   = 1e-6
+DEFAULT_BATCH_C     = 1e-4
+
 VERBOSE = False
 
 
@@ -229,17 +253,45 @@ class DefaultChooser(object):
         self.spray_std = options.get('spray-std', DEFAULT_SPRAYSTD)
         self.check_grad = options.get('check-grad', False)
 
-        self.grid_subset = 20
-
-        if 'chooser-args' in options:
-            self.parallel_opt = bool(options['chooser-args'].get('parallel-opt', False))
-        else:
-            self.parallel_opt = False
+        self.grid_subset = int(options.get('grid-subset', DEFAULT_GRIDSUBSET))
+
+        self.adaptive_grid   = bool(options.get('adaptive-grid', False))
+        self.adaptive_init   = options.get('adaptive-grid-init', None)
+        self.adaptive_rounds = int(options.get('adaptive-grid-rounds', DEFAULT_ADAPTIVE_ROUNDS))
+        self.adaptive_std    = float(options.get('adaptive-grid-std', DEFAULT_ADAPTIVE_STD))
+        self.adaptive_tol    = float(options.get('adaptive-grid-tol', DEFAULT_ADAPTIVE_TOL))
+        self.adaptive_time   = float(options.get('adaptive-grid-time', DEFAULT_ADAPTIVE_TIME))
+
+        # Time budget in seconds for fit() and suggest() together
+        self.time_budget  = options.get('suggestion-time-budget', None)
+        self.fit_fraction = float(options.get('fit-budget-fraction', DEFAULT_FIT_BUDGET_FRACTION))
+        self.chunk_size   = int(options.get('chunk-size', DEFAULT_CHUNK_SIZE))
+        self.start_time   = None
+        self.acq          = None
+
+        self._grid_confidence = {}
+        self._grid_chunks     = None
+
+        chooser_args = options.get('chooser-args', {})
+        self.parallel_opt = bool(chooser_args.get('parallel-opt', False))
+        self.optimizer    = chooser_args.get('optimizer', 'lbfgs').lower()
+        if self.optimizer not in ('lbfgs', 'batch'):
+            raise Exception('Unknown optimizer %s, choose from batch, lbfgs' % self.optimizer)
+
+        # The acquisition function and whether to refine its best grid points with
+        # L-BFGS (by default if the acquisition function has useful gradients)
+        self.acquisition_name = chooser_args.get('acquisition', 'ei').lower()
+        self.acquisition_args = chooser_args
+        self.optimize         = chooser_args.get('optimize', None)
+        if self.acquisition_name not in ACQUISITION_FUNCTIONS:
+            raise Exception('Unknown acquisition function %s, choose from %s' %
+                            (self.acquisition_name, ', '.join(sorted(ACQUISITION_FUNCTIONS.keys()))))
 
         self.models      = {}
         self.objective   = {}
         self.constraints = defaultdict(dict)
         self.grid        = None
+        self.candidates  = None
         self.task_group  = None
         self.isFit = False
 
@@ -252,19 +304,32 @@ class DefaultChooser(object):
         """
         self.task_group = task_group
         self.num_dims   = task_group.num_dims
+        self.start_time = time.time()
+        self.acq        = None
         new_hypers      = {}
 
+        # The confidences of the constraints on the grid, see confidence(),
+        # and the blocks of the grid with cached predictions
+        self._grid_confidence = {}
+        self._grid_chunks     = None
+
         # Create the grid of optimization initializers
         # Need to do it here because it's used in many places e.g. best
-        self.grid = sobol_grid.generate(self.num_dims, grid_size=self.grid_size, 
-                                        grid_seed=self.grid_seed)
+        # The Sobol points are kept from one fit to the next
+        if self.candidates is None or not self.candidates.matches(self.num_dims, self.initial_grid_size(), self.grid_seed):
+            self.candidates = CandidateGrid(self.num_dims, self.initial_grid_size(), self.grid_seed)
 
-        # A useful hack: add previously visited points to the grid
+        # A useful hack: add previously visited points to the grid. The
+        # pending points are replaced, so finished jobs drop out of them.
+        pending = [np.zeros((0, self.num_dims))]
         for task_name, task in task_group.tasks.iteritems():
             if task.has_valid_inputs():
-                self.grid = np.append(self.grid, task.valid_normalized_data_dict['inputs'], axis=0)
+                self.candidates.add(task.valid_normalized_data_dict['inputs'])
             if task.has_pending():
-                self.grid = np.append(self.grid, task.valid_normalized_data_dict['pending'], axis=0)
+                pending.append(task.valid_normalized_data_dict['pending'])
+        self.candidates.set_pending(np.vstack(pending))
+
+        self.grid = self.candidates.grid
 
         # A fallback in case you don't fit -- just submit this
         # index off the grid
@@ -274,6 +339,10 @@ class DefaultChooser(object):
 
         # print 'Fittings tasks: %s' % str(task_group.tasks.keys())
 
+        # Split the fitting part of the time budget among the models
+        num_to_fit = sum([task.valid_values.shape[0] >= DEFAULT_NUMDESIGN for task in task_group.tasks.values()])
+        fit_deadline = self.deadline(self.fit_fraction)
+
         for task_name, task in task_group.tasks.iteritems():
             if task.type.lower() == 'objective':
                 data_dict = self.objective # confusing: this is how self.objective gets populated
@@ -301,12 +370,18 @@ class DefaultChooser(object):
 
                 vals = data_dict['values'] if data_dict.has_key('values') else data_dict['counts']
 
+                deadline = None
+                if fit_deadline is not None:
+                    deadline = time.time() + max(fit_deadline - time.time(), 0.0) / num_to_fit
+                num_to_fit -= 1
+
                 sys.stderr.write('Fitting %s for %s task...\n' % (model_class, task_name))
                 new_hypers[task_name] = self.models[task_name].fit(
                     data_dict['inputs'],
                     vals,
                     pending=data_dict['pending'],
-                    hypers=hypers.get(task_name, None)
+                    hypers=hypers.get(task_name, None),
+                    deadline=deadline
                 )
 
         self.isFit = True
@@ -331,16 +406,27 @@ class DefaultChooser(object):
         # if self.objective.has_key('pending'):
             # print 'pending: %s' % self.objective['pending']
 
+        # Predict on the grid once, for best(), the constraints and the acquisition function
+        # With a time budget the grid is cut down to the part that was predicted in time
+        self.cache_grid_predictions()
+
         # Compute the current best
         current_best, current_best_location = self.best()
 
-        # Add some extra candidates around the best so far (a useful hack)
-        spray_points = npr.randn(self.num_spray, self.num_dims)*self.spray_std + current_best_location
-        spray_points = np.minimum(np.maximum(spray_points,0.0),1.0)
-        
-        # Compute EI on the grid
-        grid_pred = np.vstack((self.grid, spray_points))
-        grid_ei = self.acquisition_function_over_hypers(grid_pred, current_best, compute_grad=False)
+        if self.adaptive_grid:
+            # Refine a small design around its most promising points
+            grid_pred, grid_ei = self.adaptive_candidates(current_best, current_best_location)
+        else:
+            # Add some extra candidates around the best so far (a useful hack)
+            spray_points = npr.randn(self.num_spray, self.num_dims)*self.spray_std + current_best_location
+            spray_points = np.minimum(np.maximum(spray_points,0.0),1.0)
+            
+            # Compute EI on the spray points and on the grid, whose predictions are cached
+            spray_pred, spray_ei = self.acquisition_over_candidates(spray_points, current_best)
+            grid_pred,  grid_ei  = self.acquisition_over_candidates(self.grid, current_best)
+
+            grid_pred = np.vstack((spray_pred, grid_pred))
+            grid_ei   = np.append(spray_ei, grid_ei)
 
         # Find the points on the grid with highest EI
         best_grid_inds = np.argsort(grid_ei)[-self.grid_subset:]
@@ -361,32 +447,55 @@ class DefaultChooser(object):
         cand = []
         b = [(0,1)]*best_grid_pred.shape[1]# optimization bounds
 
-        if self.parallel_opt:
+        # The optimization runs only as many restarts as fit in the time budget,
+        # starting with the most promising points
+        deadline = self.deadline()
+
+        optimize = self.optimize if self.optimize is not None else self.acquisition().optimize
+
+        if not optimize:
+            pass
+        elif self.optimizer == 'batch':
+            # Optimize all the points together
+            cand.extend(self.optimize_batch(best_grid_pred[::-1], current_best, deadline))
+        elif self.parallel_opt:
             # Optimize each point in parallel
             pool = multiprocessing.Pool(self.grid_subset)
             results = [pool.apply_async(self.optimize_pt,args=(
-                    c,b,current_best,True)) for c in best_grid_pred]
+                    c,b,current_best,True)) for c in best_grid_pred[::-1]]
 
             for res in results:
-                cand.append(res.get(1e8))
-            pool.close()
+                timeout = 1e8 if deadline is None else max(deadline - time.time(), 0.0)
+                try:
+                    cand.append(res.get(timeout))
+                except multiprocessing.TimeoutError:
+                    break
+            pool.terminate()
         else: 
             # Optimize in series
-            for c in best_grid_pred:
+            for c in best_grid_pred[::-1]:
+                if deadline is not None and time.time() > deadline:
+                    break
                 cand.append(self.optimize_pt(c,b,current_best,compute_grad=True))
         # Cand now stores the optimized points
 
-        # Compute one more time (re-computing is unnecessary, oh well... TODO)
-        cand = np.vstack(cand)
-        opt_ei = self.acquisition_function_over_hypers(cand, current_best, compute_grad=False)
+        if optimize and len(cand) < best_grid_pred.shape[0]:
+            sys.stderr.write('Time budget reached after %d of %d optimizer restarts.\n' % (len(cand), best_grid_pred.shape[0]))
+
+        if cand:
+            # Compute one more time (re-computing is unnecessary, oh well... TODO)
+            cand = np.vstack(cand)
+            opt_ei = self.acquisition_function_over_hypers(cand, current_best, compute_grad=False)
 
-        # The index and value of the top optimized point
-        best_opt_ind  = np.argmax(opt_ei)
-        best_opt_ei   = opt_ei[best_opt_ind]
+            # The index and value of the top optimized point
+            best_opt_ind  = np.argmax(opt_ei)
+            best_opt_ei   = opt_ei[best_opt_ind]
+        else:
+            best_opt_ei   = -np.inf
 
         # Optimization should always be better unless the optimization
         # breaks in some way.
-        if VERBOSE:
+        if VERBOSE and len(cand):
             print 'Best EI after  optimization: %f' % best_opt_ei
             print 'Suggested input %s' % cand[best_opt_ind]
 
@@ -405,6 +514,147 @@ class DefaultChooser(object):
         self.task_group.paramify_and_print(suggestion.flatten(), left_indent=16)
         return suggestion
 
+    def deadline(self, fraction=1.0):
+        """return the time at which the given fraction of the time budget is used up
+        
+        Returns None if there is no time budget.
+        """
+        if self.time_budget is None or self.start_time is None:
+            return None
+
+        return self.start_time + fraction*float(self.time_budget)
+
+    def diagnostics(self):
+        """return the convergence diagnostics of the chains of the last fit
+        by task name, see GP._diagnose. They are recorded with the job that
+        is suggested, see main.get_suggestion."""
+        return dict((task_name, model.diagnostics) for task_name, model in self.models.iteritems()
+                    if getattr(model, 'diagnostics', None) is not None)
+
+    def acquisition_over_candidates(self, cand, current_best):
+        """return the candidates that were evaluated and their acquisition values
+        
+        Without a time budget all the candidates are evaluated at once. With one,
+        the candidates are evaluated in chunks, in order, until the budget runs
+        out. The first chunk is always evaluated. The grid is evaluated in the
+        chunks whose predictions are cached, see cache_grid_predictions().
+        """
+        deadline = self.deadline()
+        if cand is self.grid:
+            chunks = self.grid_chunks()
+        elif deadline is None:
+            return cand, self.acquisition_function_over_hypers(cand, current_best, compute_grad=False)
+        else:
+            chunks = [cand[i:i+self.chunk_size] for i in xrange(0, cand.shape[0], self.chunk_size)]
+
+        acq = []
+        num = 0
+        for chunk in chunks:
+            if num > 0 and deadline is not None and time.time() > deadline:
+                sys.stderr.write('Time budget reached after evaluating %d of %d candidates.\n' % (num, cand.shape[0]))
+                break
+            acq.append(self.acquisition_function_over_hypers(chunk, current_best, compute_grad=False))
+            num += chunk.shape[0]
+
+        acq = np.hstack(acq)
+
+        return cand[:acq.shape[0]], acq
+
+    def cache_grid_predictions(self):
+        """precompute the predictions of all models on the grid, in every state
+        
+        Without a time budget the grid is predicted at once. With one, it is
+        predicted in chunks until the budget runs out, and the grid is cut
+        down to the chunks that were predicted. The first chunk is always
+        predicted.
+        """
+        deadline = self.deadline()
+        if deadline is None:
+            chunks = [self.grid]
+        else:
+            chunks = [self.grid[i:i+self.chunk_size] for i in xrange(0, self.grid.shape[0], self.chunk_size)]
+
+        self._grid_chunks = []
+        num = 0
+        for chunk in chunks:
+            if num > 0 and time.time() > deadline:
+                sys.stderr.write('Time budget reached after predicting %d of %d grid points.\n' % (num, self.grid.shape[0]))
+                self.grid = self.grid[:num]
+                break
+            for model in self.models.values():
+                if hasattr(model, 'cache_predictions'):
+                    model.cache_predictions(chunk, keep=num > 0)
+            self._grid_chunks.append(chunk)
+            num += chunk.shape[0]
+
+    def grid_chunks(self):
+        """return the blocks of rows of the grid whose predictions are cached"""
+        if self._grid_chunks is None:
+            return [self.grid]
+
+        return self._grid_chunks
+
+    def over_grid(self, fun):
+        """return fun evaluated on the grid, one chunk with cached predictions at a time"""
+        results = [fun(chunk) for chunk in self.grid_chunks()]
+        if isinstance(results[0], tuple) or isinstance(results[0], list):
+            return [np.concatenate(r) for r in zip(*results)]
+
+        return np.concatenate(results)
+
+    def initial_grid_size(self):
+        """return the size of the Sobol design that seeds the candidates"""
+        if not self.adaptive_grid:
+            return self.grid_size
+
+        if self.adaptive_init is not None:
+            return min(self.grid_size, int(self.adaptive_init))
+
+        return min(self.grid_size, max(DEFAULT_ADAPTIVE_GRID_MIN,
+                                       DEFAULT_ADAPTIVE_GRID_PER_DIM*self.num_dims))
+
+    def adaptive_candidates(self, current_best, current_best_location):
+        """return candidates and their acquisition values, grown adaptively
+        
+        Starting from the grid, each round perturbs the top candidates and the
+        current best location (a generalization of the spray points) with a
+        shrinking standard deviation. Stops when the best acquisition value
+        stops improving, after a maximum number of rounds, when the grid size
+        is reached or when the time budget for candidate generation runs out.
+        """
+        start_time = time.time()
+
+        deadline = self.deadline()
+
+        cand, cand_acq = self.acquisition_over_candidates(self.grid, current_best)
+        best_acq = np.max(cand_acq)
+
+        for i in xrange(self.adaptive_rounds):
+            if time.time() - start_time > self.adaptive_time or cand.shape[0] >= self.grid_size:
+                break
+            if deadline is not None and time.time() > deadline:
+                break
+
+            std     = max(self.spray_std, self.adaptive_std * 0.5**i)
+            centers = np.vstack((cand[np.argsort(cand_acq)[-self.grid_subset:]], current_best_location))
+            new_pts = np.repeat(centers, self.num_spray, axis=0)
+            new_pts = new_pts + npr.randn(*new_pts.shape)*std
+            new_pts = np.minimum(np.maximum(new_pts,0.0),1.0)
+            new_acq = self.acquisition_function_over_hypers(new_pts, current_best, compute_grad=False)
+
+            cand     = np.vstack((cand, new_pts))
+            cand_acq = np.append(cand_acq, new_acq)
+
+            new_best = np.max(new_acq)
+            if VERBOSE:
+                print 'Adaptive round %d: %d candidates, best EI %f' % (i, cand.shape[0], max(best_acq, new_best))
+
+            if new_best <= best_acq + self.adaptive_tol*np.abs(best_acq):
+                break
+            best_acq = new_best
+
+        return cand, cand_acq
+
     # TODO: add optimization in here
     def best(self):
         grid = self.grid
@@ -414,7 +664,7 @@ class DefaultChooser(object):
         # If unconstrained
         if self.numConstraints() == 0:
             # Compute the GP mean
-            obj_mean, obj_var = obj_model.function_over_hypers(obj_model.predict, grid)
+            obj_mean, obj_var = self.over_grid(lambda chunk: obj_model.function_over_hypers(obj_model.predict, chunk))
 
             # find the min and argmin of the GP mean
             current_best_location = grid[np.argmin(obj_mean),:][None]
@@ -448,7 +698,7 @@ class DefaultChooser(object):
             if not np.any(mc): 
                 # P-con is violated everywhere
                 # Compute the product of the probabilities, and return None for the current best value
-                probs = reduce(lambda x,y:x*y, [self.confidence(c, grid) for c in self.constraints], np.ones(grid.shape[0]))
+                probs = reduce(np.multiply, [self.confidence(c, grid) for c in self.constraints], np.ones(grid.shape[0]))
                 best_probs_ind = np.argmax(probs)
                 best_probs_location = grid[best_probs_ind,:][None]
                 # TODO -- could use BFGS for this (unconstrained) optimization as well -- everytime for min of mean
@@ -464,7 +714,7 @@ class DefaultChooser(object):
             # A feasible region has been found
 
             # Compute GP mean and find minimum
-            mean, var = obj_model.function_over_hypers(obj_model.predict, grid)
+            mean, var = self.over_grid(lambda chunk: obj_model.function_over_hypers(obj_model.predict, chunk))
             valid_mean = mean[mc]
             valid_var = var[mc]
             best_ind = np.argmin(valid_mean)
@@ -509,8 +759,15 @@ class DefaultChooser(object):
         return len(self.constraints)
 
     # The confidence that conststraint c is satisfied
+    # On the grid, this is computed once per fit and shared by all the callers
     def confidence(self, c, grid, compute_grad=False):
-        return self.models[c].function_over_hypers(self.models[c].pi, grid, compute_grad=compute_grad)
+        if compute_grad or grid is not self.grid:
+            return self.models[c].function_over_hypers(self.models[c].pi, grid, compute_grad=compute_grad)
+
+        if c not in self._grid_confidence:
+            self._grid_confidence[c] = self.over_grid(lambda chunk: self.models[c].function_over_hypers(self.models[c].pi, chunk))
+
+        return self._grid_confidence[c]
 
     # Returns a boolean array of size pred.shape[0] indicating whether the prob con-constraint is satisfied there
     def probabilistic_constraint(self, pred):
@@ -522,18 +779,29 @@ class DefaultChooser(object):
     def acquisition_function_over_hypers(self, *args, **kwargs):
         return function_over_hypers(self.models.values(), self.acquisition_function, *args, **kwargs)
 
-    def acquisition_function(self, cand, current_best, compute_grad=True):
+    def acquisition(self):
+        """return the acquisition function for the current fit of the objective"""
         obj_model = self.models[self.objective['name']]
 
-        # If unconstrained, just compute regular ei
+        # Anything precomputed from the model is kept until the next fit
+        if self.acq is None or self.acq.model is not obj_model:
+            self.acq = ACQUISITION_FUNCTIONS[self.acquisition_name](obj_model, self.acquisition_args)
+
+        return self.acq
+
+    def acquisition_function(self, cand, current_best, compute_grad=True):
+        acq_fun = self.acquisition()
+
+        # If unconstrained, just compute the acquisition function
         if self.numConstraints() == 0:
-            return compute_ei(obj_model, cand, ei_target=current_best, compute_grad=compute_grad)
+            return acq_fun(cand, compute_grad=compute_grad)
+
+        if not acq_fun.nonnegative:
+            raise Exception('Acquisition function %s can be negative and cannot be used with constraints.' % self.acquisition_name)
 
         if cand.ndim == 1:
             cand = cand[None]
 
-        N_cand = cand.shape[0]
-
         ############## ---------------------------------------- ############
         ##############                                          ############
         ##############   Part that depends on the objective     ############
@@ -543,42 +811,19 @@ class DefaultChooser(object):
             ei = 1.
             ei_grad = 0.
         else:
-            target = current_best
-     
             # Compute the predictive mean and variance
             if not compute_grad:
-                ei = compute_ei(obj_model, cand, target, compute_grad=compute_grad)
+                ei = acq_fun(cand, compute_grad=compute_grad)
             else:
-                ei, ei_grad = compute_ei(obj_model, cand, target, compute_grad=compute_grad)
+                ei, ei_grad = acq_fun(cand, compute_grad=compute_grad)
 
         ############## ---------------------------------------- ############
         ##############                                          ############
         ##############  Part that depends on the constraints    ############
         ##############                                          ############
         ############## ---------------------------------------- ############
-        # Compute p(valid) for ALL constraints
-        p_valid, p_grad = list(), list()
-        for c in self.constraints:
-            if compute_grad:
-                pv, pvg = self.models[c].pi(cand, compute_grad=True)
-                p_valid.append(pv)
-                p_grad.append(pvg)
-            else:
-                p_valid.append(self.models[c].pi(cand, compute_grad=False))
-        
-        p_valid_prod = reduce(np.multiply, p_valid, np.ones(N_cand))
-
-        # To compute the gradient, need to do the chain rule for the product of N factors
-        if compute_grad:
-            p_grad_prod = np.zeros(p_grad[0].shape)
-            for i in xrange(self.numConstraints()):
-                pg = p_grad[i]
-                for j in xrange(self.numConstraints()):
-                    if j == i:
-                        continue
-                    pg *= p_valid[j]
-                p_grad_prod += pg
-            # multiply that gradient by all other pv's (this might be numerically disasterous if pv=0...)
+        # Compute p(valid) for ALL constraints, as a product done in log space
+        constraints = ConstraintAggregator([self.models[c] for c in self.constraints])
 
         ############## ---------------------------------------- ############
         ##############                                          ############
@@ -586,12 +831,14 @@ class DefaultChooser(object):
         ##############                                          ############
         ############## ---------------------------------------- ############
 
+        if not compute_grad:
+            return ei * constraints.prob(cand)
+
+        p_valid_prod, p_grad_prod = constraints.prob(cand, compute_grad=True)
+
         acq = ei * p_valid_prod
 
-        if not compute_grad:
-            return acq
-        else:
-            return acq, ei_grad * p_valid_prod + p_grad_prod * ei
+        return acq, ei_grad * p_valid_prod[:,np.newaxis] + p_grad_prod * np.reshape(ei, (-1,1))
 
     # Flip the sign so that we are maximizing with BFGS instead of minimizing
     def acq_optimize_wrapper(self, cand, current_best, compute_grad):
@@ -602,6 +849,61 @@ class DefaultChooser(object):
         else:
             return -ret
 
+    def optimize_batch(self, initializers, current_best, deadline=None):
+        """return the local maxima of the acquisition function from all initializers
+
+        All points take projected gradient ascent steps in the unit hypercube
+        at the same time, so each iteration needs one prediction per state for
+        the whole batch instead of one per point. Each point has its own
+        Barzilai-Borwein step size, which is halved whenever the step does not
+        increase the acquisition enough, and stops on its own once its
+        projected gradient or its step vanishes. Stops early at the deadline.
+        """
+        x = np.array(initializers, dtype=float).reshape(-1, self.num_dims)
+        f, g = self.acquisition_function_over_hypers(x, current_best, compute_grad=True)
+
+        # The first step moves each point by DEFAULT_BATCH_MOVE
+        step   = DEFAULT_BATCH_MOVE / np.maximum(np.sqrt(np.sum(g**2, axis=1)), 1e-300)
+        active = np.ones(x.shape[0], dtype=bool)
+
+        for i in xrange(DEFAULT_BATCH_ITERS):
+            if deadline is not None and time.time() > deadline:
+                break
+
+            inds = np.nonzero(active)[0]
+            if inds.size == 0:
+                break
+
+            x_new = np.clip(x[inds] + step[inds,None]*g[inds], 0.0, 1.0)
+            s     = x_new - x[inds]
+            f_new, g_new = self.acquisition_function_over_hypers(x_new, current_best, compute_grad=True)
+
+            # Armijo condition for the projected step
+            accept = f_new >= f[inds] + DEFAULT_BATCH_C*np.sum(g[inds]*s, axis=1)
+            moved  = np.sqrt(np.sum(s**2, axis=1))
+
+            # Barzilai-Borwein step sizes for the accepted points, halved otherwise
+            y   = g[inds] - g_new
+            sy  = np.sum(s*y, axis=1)
+            ss  = np.sum(s**2, axis=1)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                bb = np.where(sy > 0, ss / sy, 2*step[inds])
+            step[inds] = np.where(accept, bb, 0.5*step[inds])
+
+            acc = inds[accept]
+            x[acc] = x_new[accept]
+            f[acc] = f_new[accept]
+            g[acc] = g_new[accept]
+
+            # Converged when the projected gradient or the move vanishes
+            proj_grad = np.sqrt(np.sum((np.clip(x[inds] + g[inds], 0.0, 1.0) - x[inds])**2, axis=1))
+            active[inds] = np.logical_and(proj_grad > DEFAULT_BATCH_TOL, moved > DEFAULT_BATCH_TOL**2)
+
+        if VERBOSE:
+            print 'Batch optimizer: %d iterations, %d points not converged' % (i+1, np.sum(active))
+
+        return list(x)
+
     def optimize_pt(self, initializer, bounds, current_best, compute_grad=True):
         opt_x, opt_y, opt_info = spo.fmin_l_bfgs_b(self.acq_optimize_wrapper,
                 initializer.flatten(), args=(current_best,compute_grad),
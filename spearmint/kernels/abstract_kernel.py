@@ -209,5 +209,11 @@ class AbstractKernel(object):
     def cross_cov_grad_data(self, inputs_1, inputs_2):
         pass
 
+    # V is the gradient of some function wrt cov(inputs). This returns the
+    # gradient of that function wrt the hypers, as a list of (hyper, gradient)
+    # pairs where each gradient has the shape of the value of its hyper.
+    def cov_grad_hypers(self, inputs, V):
+        raise NotImplementedError('%s does not implement gradients wrt its hypers.' % self.__class__.__name__)
+
 
 
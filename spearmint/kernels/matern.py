@@ -186,6 +186,8 @@
 import numpy as np
 import kernel_utils
 
+from scipy.linalg.blas import daxpy as axpy
+
 from .abstract_kernel import AbstractKernel
 from ..utils          import priors
 from ..utils.param    import Param as Hyperparameter
@@ -193,6 +195,14 @@ from ..utils.param    import Param as Hyperparameter
 SQRT_3 = np.sqrt(3.0)
 SQRT_5 = np.sqrt(5.0)
 
+# cov() keeps the per-dimension squared differences of its inputs so that
+# a change in a single length scale or input column (as in component-wise
+# slice sampling) only costs O(N^2). The cache is not used if it would take
+# more than this many bytes and is rebuilt from scratch after this many
+# incremental updates to keep rounding errors from accumulating.
+DEFAULT_CACHE_BYTES   = 2**26
+DEFAULT_CACHE_REFRESH = 100
+
 
 class Matern52(AbstractKernel):
     def __init__(self, num_dims, length_scale=None, name='Matern52'):
@@ -209,12 +219,67 @@ class Matern52(AbstractKernel):
 
         assert self.ls.value.shape[0] == self.num_dims
 
+        self._cache_inputs = None
+        self._cache_ls2    = None
+        self._cache_sqdiff = None
+        self._cache_r2     = None
+        self._cache_age    = 0
+
     @property
     def hypers(self):
         return self.ls
 
     def cov(self, inputs):
-        return self.cross_cov(inputs, inputs)
+        if inputs.shape[0]**2 * inputs.shape[1] * 8 > DEFAULT_CACHE_BYTES:
+            return self.cross_cov(inputs, inputs)
+
+        # Same as cross_cov, but in place to avoid temporary N x N arrays
+        r2  = np.abs(self._cached_dist2(inputs))
+        r   = np.sqrt(r2)
+        r  *= SQRT_5
+        cov = np.exp(-r)
+        r  += 1.0
+        r2 *= 5.0/3.0
+        r2 += r
+        cov *= r2
+
+        return cov
+
+    def _cached_dist2(self, inputs):
+        ls2 = self.ls.value**2
+
+        if (self._cache_inputs is None or self._cache_inputs.shape != inputs.shape
+            or self._cache_age >= DEFAULT_CACHE_REFRESH):
+            N, D   = inputs.shape
+            diff   = inputs.T[:,:,np.newaxis] - inputs.T[:,np.newaxis,:]
+            sqdiff = np.ascontiguousarray(diff**2)
+            r2     = np.dot(1.0/ls2, sqdiff.reshape(D, N*N)).reshape(N, N)
+
+            self._cache_sqdiff = sqdiff
+            self._cache_age    = 0
+        else:
+            changed_inputs = np.any(inputs != self._cache_inputs, axis=0)
+            changed        = np.nonzero(changed_inputs | (ls2 != self._cache_ls2))[0]
+
+            r2 = self._cache_r2
+            if changed.size > 0:
+                # Scaled additions with BLAS axpy. It updates a contiguous
+                # float64 r2 in place, otherwise it returns a new array
+                r2_flat = np.array(r2, dtype=np.float64).ravel()
+                for d in changed:
+                    r2_flat = axpy(self._cache_sqdiff[d].ravel(), r2_flat, a=-1.0/self._cache_ls2[d])
+                    if changed_inputs[d]:
+                        np.subtract(inputs[:,d,np.newaxis], inputs[np.newaxis,:,d], out=self._cache_sqdiff[d])
+                        self._cache_sqdiff[d] **= 2
+                    r2_flat = axpy(self._cache_sqdiff[d].ravel(), r2_flat, a=1.0/ls2[d])
+                r2 = r2_flat.reshape(r2.shape)
+                self._cache_age += 1
+
+        self._cache_inputs = inputs.copy()
+        self._cache_ls2    = ls2
+        self._cache_r2     = r2
+
+        return r2
 
     def diag_cov(self, inputs):
         return np.ones(inputs.shape[0])
@@ -235,3 +300,16 @@ class Matern52(AbstractKernel):
 
         return grad_r2[:,:,np.newaxis] * kernel_utils.grad_dist2(self.ls.value, inputs_1, inputs_2)
 
+    def cov_grad_hypers(self, inputs, V):
+        ls = self.ls.value
+        r  = np.sqrt(np.abs(kernel_utils.dist2(ls, inputs)))
+
+        # The derivative of cov wrt ls is
+        # (5/3)(1 + sqrt(5)r)exp(-sqrt(5)r) (x - x')**2 / ls**3
+        # and the squared differences summed against W expand into
+        # products with the inputs, which avoids an N x N x D array.
+        W    = V*(5.0/3.0)*(1.0 + SQRT_5*r)*np.exp(-SQRT_5*r)
+        grad = np.dot(W.sum(0) + W.sum(1), inputs**2) - 2*np.sum(inputs*np.dot(W, inputs), axis=0)
+
+        return [(self.ls, grad/ls**3)]
+
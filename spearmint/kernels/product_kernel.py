@@ -210,4 +210,13 @@ class ProductKernel(AbstractKernel):
         grads = np.array([kernel.cross_cov_grad_data(inputs_1,inputs_2) for kernel in self.kernels])
         V     = vals == 0
 
-        return (((vprod[:,:,np.newaxis]*grads) / (vals + V)[:,:,:,np.newaxis]) + (V[:,:,:,np.newaxis]*grads)).sum(0)
\ No newline at end of file
+        return (((vprod[:,:,np.newaxis]*grads) / (vals + V)[:,:,:,np.newaxis]) + (V[:,:,:,np.newaxis]*grads)).sum(0)
+
+    def cov_grad_hypers(self, inputs, V):
+        covs  = [kernel.cov(inputs) for kernel in self.kernels]
+        grads = []
+        for i, kernel in enumerate(self.kernels):
+            others = reduce(lambda K1, K2: K1*K2, covs[:i] + covs[i+1:], 1.0)
+            grads += kernel.cov_grad_hypers(inputs, V*others)
+
+        return grads
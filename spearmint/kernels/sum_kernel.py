@@ -203,3 +203,6 @@ class SumKernel(AbstractKernel):
     def cross_cov_grad_data(self, inputs_1, inputs_2):
         return reduce(lambda dK1, dK2: dK1+dK2, [kernel.cross_cov_grad_data(inputs_1,inputs_2) for kernel in self.kernels])
 
+    def cov_grad_hypers(self, inputs, V):
+        return reduce(lambda g1, g2: g1+g2, [kernel.cov_grad_hypers(inputs, V) for kernel in self.kernels])
+
@@ -183,6 +183,8 @@
 # its Institution.
 
 
+import numpy as np
+
 from .abstract_kernel import AbstractKernel
 
 
@@ -218,3 +220,17 @@ class TransformKernel(AbstractKernel):
 
         return self.transformer.backward_pass(kernel_grad)
 
+    def cov_grad_hypers(self, inputs, V):
+        # NOTE: As above, the backward pass uses the state left by this
+        # forward pass.
+        tinputs = self.transformer.forward_pass(inputs)
+        grads   = self.kernel.cov_grad_hypers(tinputs, V)
+
+        # The gradient wrt the transformed inputs. They appear as both
+        # arguments of cov, and the gradient wrt the first argument is -1
+        # times the data gradient (which is wrt the second).
+        data_grad = self.kernel.cross_cov_grad_data(tinputs, tinputs)
+        V_inputs  = np.einsum('ij,ijd->jd', V, data_grad) - np.einsum('ji,jid->jd', V, data_grad)
+
+        return grads + self.transformer.backward_pass_hypers(V_inputs)
+
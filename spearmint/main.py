@@ -394,7 +394,8 @@ def get_suggestion(chooser, task_names, db, expt_dir, options, resource_name):
         'status'      : 'new',
         'submit time' : time.time(),
         'start time'  : None,
-        'end time'    : None
+        'end time'    : None,
+        'diagnostics' : chooser.diagnostics()
     }
 
     save_job(job, db, experiment_name)
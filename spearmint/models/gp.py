@@ -183,17 +183,25 @@
 # its Institution.
 
 import sys
+import time
 import logging
 import numpy        as np
 import numpy.random as npr
 import scipy.linalg as spla
 import scipy.stats  as sps
+import scipy.special as spe
+import scipy.optimize as spo
+
+from collections import OrderedDict
 
 from .abstract_model          import AbstractModel
 from ..utils.param            import Param as Hyperparameter
+from ..utils.param            import params_to_array, ParamLayout
 from ..kernels                import Matern52, Noise, Scale, SumKernel, TransformKernel
 from ..sampling.slice_sampler import SliceSampler
+from ..sampling.diagnostics   import chain_diagnostics, stationary
 from ..utils                  import priors
+from ..utils.linalg           import cholesky
 from ..transformations        import BetaWarp, Transformer
 
 try:
@@ -206,6 +214,56 @@ except:
 DEFAULT_MCMC_ITERS = 10
 DEFAULT_BURNIN     = 100
 
+# Burn-in longer than DEFAULT_MIN_BURNIN samples ends once the log
+# likelihood over the second half of the chain is stationary, which is
+# checked every DEFAULT_BURNIN_CHECK samples. If it is not stationary by
+# the end of the burn-in, it continues up to DEFAULT_MAX_BURNIN_FACTOR
+# times as long.
+DEFAULT_MIN_BURNIN        = 40
+DEFAULT_BURNIN_CHECK      = 10
+DEFAULT_MAX_BURNIN_FACTOR = 3
+
+# Number of noiseless Cholesky factors kept, see GP.noiseless_chol
+DEFAULT_CHOL_VERSIONS = 4
+
+# The chain reseeds the RNG at each fit with a seed below this, which is
+# saved instead of the full state of the RNG, see GP.fit
+MAX_CHAIN_SEED = 2**31 - 1
+
+# With fit_method 'ml' the hypers are set to the mode of their posterior,
+# found by L-BFGS-B from the current hypers and DEFAULT_ML_RESTARTS random
+# points within these bounds. Hypers with a positive lower bound are
+# optimized in log space, and the bounds are pulled in by DEFAULT_ML_INSET
+# there so that the optimizer stays inside the support of the priors.
+DEFAULT_ML_RESTARTS = 3
+DEFAULT_ML_ITERS    = 200
+DEFAULT_ML_FACTR    = 1e10 # stop at a relative change in the objective of about 2e-6
+DEFAULT_ML_INSET    = 1e-6
+DEFAULT_ML_BOUNDS   = {
+    'mean'       : (None, None),
+    'amp2'       : (1e-6, 1e6),
+    'noise'      : (1e-8, 1e2),
+    'ls'         : (1e-3, 10.0),
+    'beta_alpha' : (0.1, 10.0),
+    'beta_beta'  : (0.1, 10.0)
+}
+
+def past_deadline(deadline):
+    return deadline is not None and time.time() > deadline
+
+def samples_to_dict(hypers_list):
+    """return a list of hyper dicts as a dict of arrays, with one row per
+    sample, which compresses to one array per hyper in the database"""
+    if not hypers_list:
+        return {}
+    return dict((name, np.array([hypers[name] for hypers in hypers_list])) for name in hypers_list[0])
+
+def samples_from_dict(samples_dict):
+    """inverse of samples_to_dict"""
+    num_samples = len(samples_dict.values()[0]) if samples_dict else 0
+    return [dict((name, np.copy(values[i])) for name, values in samples_dict.iteritems())
+            for i in xrange(num_samples)]
+
 class GP(AbstractModel):
     """Gaussian process model
     
@@ -218,8 +276,20 @@ class GP(AbstractModel):
         Default is gaussian.
     verbose : bool, optional
     mcmc_diagnostics : bool, optional
+        print the convergence diagnostics of the chain after each fit.
+        They are always recorded with each suggested job, see
+        DefaultChooser.diagnostics.
     mcmc_iters : int, optional
     burnin : int, optional
+    max_burnin : int, optional
+        the longest burn-in when the chain has not converged after burnin
+        samples, see DEFAULT_MIN_BURNIN.
+    fit_method : str, optional
+        `mcmc` (the default) samples the hypers. `ml` sets them to a single
+        point estimate, the maximum of the marginal likelihood times the
+        priors, see DEFAULT_ML_RESTARTS.
+    ml_restarts : int, optional
+        the number of random starting points of the `ml` fit.
     thinning : int, optional
     num_fantasies : int, optional
     """
@@ -233,7 +303,13 @@ class GP(AbstractModel):
         self.mcmc_diagnostics = bool(options.get("mcmc_diagnostics", False))
         self.mcmc_iters       = int(options.get("mcmc_iters", DEFAULT_MCMC_ITERS))
         self.burnin           = int(options.get("burnin", DEFAULT_BURNIN))
+        self.max_burnin       = int(options.get("max_burnin", DEFAULT_MAX_BURNIN_FACTOR*self.burnin))
         self.thinning         = int(options.get("thinning", 0))
+        self.fit_method       = options.get("fit_method", "mcmc").lower()
+        self.ml_restarts      = int(options.get("ml_restarts", DEFAULT_ML_RESTARTS))
+
+        if self.fit_method not in ('mcmc', 'ml'):
+            raise Exception("Fit method must be mcmc or ml, not %s" % self.fit_method)
 
         self._inputs = None # Matrix of data inputs
         self._values = None # Vector of data values
@@ -247,18 +323,27 @@ class GP(AbstractModel):
 
         self._caching                    = bool(options.get("caching", True))
         self._cache_list                 = [] # Cached computations for re-use.
+        self._chol_cache                 = OrderedDict() # Recent factors of the covariance, see log_likelihood
         self._hypers_list                = [] # Hyperparameter dicts for each state.
         self._fantasy_values_list        = [] # Fantasy values generated from pending samples.
+        self._stacked_inputs             = None
+        self._stacked_values             = {}
+        self._prediction_cache           = [] # Inputs with precomputed predictions, see cache_predictions
+        self._noiseless_chols            = OrderedDict() # Factors by kernel hypers, see noiseless_chol
         self.state                       = None
-        self._random_state               = npr.get_state()
+        self._random_state               = npr.get_state() # Fixed state for fantasies, see _fantasize
+        self._chain_seed                 = None # Seed of the RNG for the next fit of the chain, see fit
+        self._chain_random               = npr.RandomState(npr.randint(MAX_CHAIN_SEED)) # RNG of the chain and its samplers
         self._samplers                   = []
         self._use_mean_if_single_fantasy = True
         
         self._kernel            = None
         self._kernel_with_noise = None
 
-        self.num_states   = 0
-        self.chain_length = 0
+        self.num_states    = 0
+        self.chain_length  = 0
+        self._burned_in    = False # Whether the chain finished its burn-in, see _burn_samples
+        self._burnin_trace = []    # Log likelihoods of an unfinished burn-in, see _burn_samples
 
         self.max_cache_mb    = 256 # TODO -- make in config
         self.max_cache_bytes = self.max_cache_mb*1024*1024
@@ -286,16 +371,20 @@ class GP(AbstractModel):
             chol  = self._cache_list[self.state]['chol']
             alpha = self._cache_list[self.state]['alpha']
         else:
-            chol  = spla.cholesky(self.kernel.cov(self.inputs), lower=True)
+            chol  = cholesky(self._inputs_cov(), lower=True, cache=self._chol_cache)
             alpha = spla.cho_solve((chol, True), self.values - self.mean.value)
 
         return chol, alpha
 
+    def _inputs_cov(self):
+        # The covariance of the values at the inputs that predictions condition on
+        return self.kernel.cov(self.inputs)
+
     def _prepare_cache(self):
         inputs_hash = hash(self.inputs.tostring())
         for i in xrange(self.num_states):
             self.set_state(i)
-            chol  = spla.cholesky(self.kernel.cov(self.inputs), lower=True)
+            chol  = cholesky(self._inputs_cov(), lower=True)
             alpha = spla.cho_solve((chol, True), self.values - self.mean.value)
             cache_dict = {
                 'chol'  : chol,
@@ -307,11 +396,20 @@ class GP(AbstractModel):
         """reset the GP
         """
         self._cache_list          = []
+        self._chol_cache          = OrderedDict()
         self._fantasy_values_list = []
         self._hypers_list         = []
+        self._stacked_inputs      = None # observed and pending inputs, see inputs
+        self._stacked_values      = {}   # observed and fantasy values per state, see values
+        self._prediction_cache    = []
+        self._noiseless_chols     = OrderedDict()
+        self._chain_seed          = None
+        self.diagnostics          = None # Convergence diagnostics of the chain, see _diagnose
         
         self._reset_params()
-        self.chain_length = 0
+        self.chain_length  = 0
+        self._burned_in    = False
+        self._burnin_trace = []
             
 
     def _build(self):
@@ -356,31 +454,157 @@ class GP(AbstractModel):
 
         # Build the samplers
         if self.noiseless:
-            self._samplers.append(SliceSampler(self.mean, amp2, compwise=False, thinning=self.thinning))
+            self._samplers.append(SliceSampler(self.mean, amp2, compwise=False, thinning=self.thinning, random_state=self._chain_random))
         else:
             noise = noise_kernel.hypers
             self.params.update({'noise' : noise})
-            self._samplers.append(SliceSampler(self.mean, amp2, noise, compwise=False, thinning=self.thinning))
+            self._samplers.append(SliceSampler(self.mean, amp2, noise, compwise=False, thinning=self.thinning, random_state=self._chain_random))
 
-        self._samplers.append(SliceSampler(ls, beta_alpha, beta_beta, compwise=True, thinning=self.thinning))
+        self._samplers.append(SliceSampler(ls, beta_alpha, beta_beta, compwise=True, thinning=self.thinning, random_state=self._chain_random))
+
+    def _trace_row(self):
+        # The hypers and the log probability from the last sampler,
+        # whose traces show whether the chain has converged
+        return np.append(params_to_array(self.params.values()), self._samplers[-1].current_ll)
+
+    def _burnin_done(self, trace, num_samples):
+        """return whether the burn-in whose log likelihoods are trace can
+        end. See DEFAULT_MIN_BURNIN for when the diagnostics decide this."""
+        num_burned = len(trace)
+        if num_samples <= DEFAULT_MIN_BURNIN:
+            return num_burned >= num_samples
+
+        if num_burned >= max(num_samples, self.max_burnin):
+            return True
+
+        if num_burned < DEFAULT_MIN_BURNIN or num_burned % DEFAULT_BURNIN_CHECK:
+            return False
+
+        return stationary(trace[num_burned//2:])
+
+    def _diagnose(self, trace, num_burned):
+        """set the diagnostics of the collected samples, see chain_diagnostics"""
+        self.diagnostics = chain_diagnostics(trace)
+        if self.diagnostics is None:
+            return
+
+        self.diagnostics['burn-in'] = num_burned
+        if self.mcmc_diagnostics:
+            sys.stderr.write('Chain: %d burn-in samples, split R-hat %.3f (log likelihood %.3f), '
+                             'effective sample size %.1f of %d.\n' % (num_burned, self.diagnostics['rhat'],
+                             self.diagnostics['log likelihood rhat'], self.diagnostics['ess'], self.diagnostics['num samples']))
+
+    def _burn_samples(self, num_samples, deadline=None):
+        # The log likelihoods of the burn-in, which starts with those of an
+        # earlier fit whose burn-in the deadline cut short
+        trace = self._burnin_trace
+        start = len(trace)
+        while not self._burnin_done(trace, num_samples):
+            if past_deadline(deadline):
+                sys.stderr.write('Time budget reached after %d of %d burn-in samples.\n' % (len(trace), num_samples))
+                break
 
-    def _burn_samples(self, num_samples):
-        for i in xrange(num_samples):
             for sampler in self._samplers:
-                sampler.sample(self)
+                sampler.sample(self, adapt=True)
 
+            trace.append(self._samplers[-1].current_ll)
             self.chain_length += 1
 
-    def _collect_samples(self, num_samples):
+        # A burn-in that the deadline cut short continues in the next fit
+        # from where it stopped
+        self._burned_in    = self._burned_in or self._burnin_done(trace, num_samples)
+        self._burnin_trace = [] if self._burned_in else trace
+
+        return len(trace) - start
+
+    def _collect_samples(self, num_samples, deadline=None):
         hypers_list = []
+        trace       = []
         for i in xrange(num_samples):
+            # Always collect at least one sample so that there is a state to use
+            if i > 0 and past_deadline(deadline):
+                sys.stderr.write('Time budget reached after collecting %d of %d samples.\n' % (i, num_samples))
+                break
+
             for sampler in self._samplers:
                 sampler.sample(self)
 
-            hypers_list.append(self.to_dict()['hypers'])
+            hypers_list.append(self._hypers_dict())
+            trace.append(self._trace_row())
             self.chain_length += 1
 
-        return hypers_list
+        return hypers_list, trace
+
+    def _fit_ml(self, deadline=None):
+        """return the hypers at the mode of their posterior, see DEFAULT_ML_RESTARTS
+
+        The gradients of the marginal likelihood, see log_likelihood, and
+        of the priors, see ParamLayout.prior_grad, are analytic, including
+        those of the beta warp, which come from the series in
+        beta_warp.beta_cdf_grad.
+        """
+        names  = sorted(self.params.keys())
+        layout = ParamLayout([self.params[name] for name in names])
+
+        log_scale = []
+        bounds    = []
+        for name in names:
+            lower, upper = DEFAULT_ML_BOUNDS.get(name, (None, None))
+            positive     = lower is not None and lower > 0
+            for i in xrange(self.params[name].size()):
+                log_scale.append(positive)
+                bounds.append((np.log(lower)+DEFAULT_ML_INSET, np.log(upper)-DEFAULT_ML_INSET) if positive else (lower, upper))
+        log_scale = np.array(log_scale)
+
+        def to_params(theta):
+            return np.where(log_scale, np.exp(theta), theta)
+
+        def objective(theta):
+            params = to_params(theta)
+            layout.set_params(params)
+
+            ll, ll_grads = self.log_likelihood(compute_grad=True)
+            grad = np.hstack([ll_grads.get(name, np.zeros(self.params[name].size())) for name in names])
+            grad = grad + layout.prior_grad(params)
+            grad = np.where(log_scale, grad*params, grad) # chain rule through exp
+
+            lp = ll + layout.prior_logprob(params)
+
+            return -lp, -grad
+
+        # The current hypers, moved into the bounds, and random points
+        # within them. Unbounded hypers start from their current values.
+        lower   = np.array([-np.inf if l is None else l for l, u in bounds])
+        upper   = np.array([np.inf if u is None else u for l, u in bounds])
+        bounded = np.isfinite(lower) & np.isfinite(upper)
+
+        start = np.hstack([self.params[name].value for name in names]).astype(float)
+        start[log_scale] = np.log(np.maximum(start[log_scale], np.exp(lower[log_scale])))
+        starts = [np.clip(start, lower, upper)]
+        for i in xrange(self.ml_restarts):
+            start = starts[0].copy()
+            start[bounded] = lower[bounded] + self._chain_random.rand(np.sum(bounded))*(upper[bounded] - lower[bounded])
+            starts.append(start)
+
+        best_theta = None
+        best_value = np.inf
+        for i, start in enumerate(starts):
+            # Always finish the first run so that there are hypers to use
+            if i > 0 and past_deadline(deadline):
+                sys.stderr.write('Time budget reached after %d of %d optimization runs.\n' % (i, len(starts)))
+                break
+
+            theta, value, info = spo.fmin_l_bfgs_b(objective, start, bounds=bounds,
+                                                   maxiter=DEFAULT_ML_ITERS, factr=DEFAULT_ML_FACTR, disp=0)
+            if value < best_value:
+                best_theta = theta
+                best_value = value
+
+        layout.set_params(to_params(best_theta))
+        if self.verbose:
+            sys.stderr.write('Log posterior of the fitted hypers: %f\n' % -best_value)
+
+        return self._hypers_dict()
 
     def _collect_fantasies(self, pending):
         fantasy_values_list = []
@@ -398,15 +622,53 @@ class GP(AbstractModel):
             predicted_mean, cov = self.predict(pend)
             return predicted_mean
         else:
+            # Draw the fantasies from a fixed stream without
+            # disturbing the one the chain continues with
+            chain_random_state = npr.get_state()
             npr.set_state(self._random_state)
-            return self.sample_from_posterior_given_hypers_and_data(pend, self.num_fantasies)
+            fantasy_vals = self.sample_from_posterior_given_hypers_and_data(pend, self.num_fantasies)
+            npr.set_state(chain_random_state)
+            return fantasy_vals
 
     @property
     def inputs(self):
         if self.pending is None or len(self._fantasy_values_list) < self.num_states:
             return self._inputs
             
-        return np.vstack((self._inputs, self.pending)) # Could perhaps cache this to make it faster.
+        # Keep returning the same array so that computations keyed on it can be reused
+        if self._stacked_inputs is None:
+            self._stacked_inputs = np.vstack((self._inputs, self.pending))
+
+        return self._stacked_inputs
+
+    def _kernel_version(self):
+        # The values of the hypers that the noiseless kernel depends on
+        return tuple([(name, np.asarray(param.value, dtype=float).tostring())
+                      for name, param in sorted(self.params.iteritems()) if name not in ('mean', 'noise')])
+
+    def noiseless_chol(self):
+        """return the Cholesky factor of the noiseless covariance of the inputs
+
+        The factors are cached by the values of the kernel hypers, so that
+        samplers that keep coming back to the same hypers, e.g. after a
+        rejected proposal, factorize the covariance only once. The last
+        DEFAULT_CHOL_VERSIONS factors are kept until the next fit.
+        """
+        inputs  = self.inputs
+        version = (id(inputs), inputs.shape, self._kernel_version())
+
+        if version in self._noiseless_chols:
+            self._noiseless_chols[version] = self._noiseless_chols.pop(version)
+            return self._noiseless_chols[version]
+
+        chol = cholesky(self.noiseless_kernel.cov(inputs), lower=True)
+        chol.flags.writeable = False
+
+        self._noiseless_chols[version] = chol
+        while len(self._noiseless_chols) > DEFAULT_CHOL_VERSIONS:
+            self._noiseless_chols.popitem(last=False)
+
+        return chol
 
     @property
     def observed_inputs(self):
@@ -417,10 +679,14 @@ class GP(AbstractModel):
         if self.pending is None or len(self._fantasy_values_list) < self.num_states:
             return self._values
         
-        if self.num_fantasies == 1:
-            return np.append(self._values, self._fantasy_values_list[self.state].flatten(), axis=0)
-        else:
-            return np.append(np.tile(self._values[:,None], (1,self.num_fantasies)), self._fantasy_values_list[self.state], axis=0)
+        if self.state not in self._stacked_values:
+            if self.num_fantasies == 1:
+                values = np.append(self._values, self._fantasy_values_list[self.state].flatten(), axis=0)
+            else:
+                values = np.append(np.tile(self._values[:,None], (1,self.num_fantasies)), self._fantasy_values_list[self.state], axis=0)
+            self._stacked_values[self.state] = values
+
+        return self._stacked_values[self.state]
 
     @property
     def observed_values(self):
@@ -460,22 +726,64 @@ class GP(AbstractModel):
         self.state = state
         self._set_params_from_dict(self._hypers_list[state])
 
+    def _hypers_dict(self):
+        return dict((name, hyper.value) for name, hyper in self.params.iteritems())
+
+    def _chain_state_dict(self):
+        """return the state needed to resume the chain where it stopped:
+        the adapted state of the samplers, the seed of the RNG, whether the
+        burn-in is done and, if not, how far it got"""
+        chain_state = {'samplers'  : [sampler.to_dict() for sampler in self._samplers],
+                       'burned in' : self._burned_in}
+        if self._chain_seed is not None:
+            chain_state['seed'] = self._chain_seed
+        if self._burnin_trace:
+            chain_state['burn-in trace'] = np.array(self._burnin_trace)
+
+        return chain_state
+
+    def _set_chain_state_from_dict(self, chain_state):
+        # The samplers change with the model options, in which case
+        # their state is of no use and the chain continues without it
+        if len(chain_state['samplers']) == len(self._samplers):
+            for sampler, sampler_dict in zip(self._samplers, chain_state['samplers']):
+                sampler.from_dict(sampler_dict)
+
+        if chain_state.has_key('seed'):
+            self._chain_seed = chain_state['seed']
+
+        if chain_state.has_key('burned in'):
+            self._burned_in = chain_state['burned in']
+
+        if chain_state.has_key('burn-in trace'):
+            self._burnin_trace = list(chain_state['burn-in trace'])
+
     def to_dict(self):
-        """return a dictionary that saves the values of the hypers and the chain length"""
-        gp_dict = {'hypers' : {}}
-        for name, hyper in self.params.iteritems():
-            gp_dict['hypers'][name] = hyper.value
+        """return a dictionary that saves the values of the hypers, the chain
+        length, the state of the chain and the most recent samples"""
+        gp_dict = {'hypers' : self._hypers_dict()}
 
         gp_dict['chain length'] = self.chain_length
+        gp_dict['chain state']  = self._chain_state_dict()
+        gp_dict['samples']      = samples_to_dict(self._hypers_list)
 
         return gp_dict
 
     def from_dict(self, gp_dict):
-        """set the hyper parameter values and the chain length from a dict"""
+        """set the hyper parameter values, the chain length and, if saved,
+        the state of the chain and the most recent samples from a dict"""
         self._set_params_from_dict(gp_dict['hypers'])
         self.chain_length = gp_dict['chain length']
+        self._burned_in   = self.chain_length >= self.burnin # Unless the chain state says otherwise
+
+        if gp_dict.has_key('chain state'):
+            self._set_chain_state_from_dict(gp_dict['chain state'])
 
-    def fit(self, inputs, values, pending=None, hypers=None, reburn=False, fit_hypers=True):
+        if gp_dict.get('samples'):
+            self._hypers_list = samples_from_dict(gp_dict['samples'])
+            self.num_states   = len(self._hypers_list)
+
+    def fit(self, inputs, values, pending=None, hypers=None, reburn=False, fit_hypers=True, deadline=None):
         """return a set of hyperparameters after fitting the GP to the input and values
         
         inputs : 2d array
@@ -484,6 +792,9 @@ class GP(AbstractModel):
             the values corresponding to the input data
         hypers : dict 
             initial values for the hyperparameters
+        deadline : float, optional
+            time (as returned by time.time()) after which burn-in and sample
+            collection stop early. At least one state is always collected.
         """
         # Set the data for the GP
         self._inputs = inputs
@@ -496,19 +807,36 @@ class GP(AbstractModel):
         if hypers:
             self.from_dict(hypers)
 
-        if fit_hypers:
+        if fit_hypers and self.fit_method == 'ml':
+            # A point estimate is the only state
+            self._hypers_list = [self._fit_ml(deadline)]
+            self.num_states   = 1
+        elif fit_hypers:
+            # Continue the random stream of the saved chain. The chain
+            # has an RNG of its own, so it neither changes nor depends on
+            # the global one or those of the other models.
+            if self._chain_seed is not None:
+                self._chain_random.seed(self._chain_seed)
+
             # Burn samples (if needed)
-            num_samples = self.burnin if reburn or self.chain_length < self.burnin else 0
-            self._burn_samples(num_samples)
+            if reburn:
+                self._burnin_trace = []
+            num_samples = self.burnin if reburn or not self._burned_in else 0
+            num_burned  = self._burn_samples(num_samples, deadline)
 
             # Now collect some samples
-            self._hypers_list = self._collect_samples(self.mcmc_iters)
+            self._hypers_list, trace = self._collect_samples(self.mcmc_iters, deadline)
+            self._diagnose(trace, num_burned)
 
             # Now we have more states
-            self.num_states = self.mcmc_iters
+            self.num_states = len(self._hypers_list)
+
+            # The chain draws the seed of its next fit, which is all
+            # of the RNG state that needs to be saved
+            self._chain_seed = self._chain_random.randint(MAX_CHAIN_SEED)
         elif not self._hypers_list:
             # Just use the current hypers as the only state
-            self._hypers_list = [self.to_dict()['hypers']]
+            self._hypers_list = [self._hypers_dict()]
             self.num_states  = 1
 
         # Set pending data and generate corresponding fantasies
@@ -525,22 +853,70 @@ class GP(AbstractModel):
 
         return self.to_dict()
 
-    def log_likelihood(self):
+    def log_likelihood(self, compute_grad=False):
         """
         GP Marginal likelihood
         
         Notes
         -----
         This is called by the samplers when fitting the hyperparameters.
+        With compute_grad it also returns the gradient wrt the hypers,
+        as a dict keyed like self.params.
         """
         cov   = self.kernel.cov(self.observed_inputs)
-        chol  = spla.cholesky(cov, lower=True)
+        chol  = cholesky(cov, lower=True, cache=self._chol_cache)
         solve = spla.cho_solve((chol, True), self.observed_values - self.mean.value)
 
         # Uses the identity that log det A = log prod diag chol A = sum log diag chol A
-        return -np.sum(np.log(np.diag(chol)))-0.5*np.dot(self.observed_values - self.mean.value, solve)
+        ll = -np.sum(np.log(np.diag(chol)))-0.5*np.dot(self.observed_values - self.mean.value, solve)
+
+        if not compute_grad:
+            return ll
+
+        # The gradient wrt cov is (solve solve^T - cov^-1)/2, which the
+        # kernels take back to their hypers
+        V = 0.5*(np.outer(solve, solve) - spla.cho_solve((chol, True), np.eye(solve.size)))
+
+        names = dict((id(param), name) for name, param in self.params.iteritems())
+        grads = {'mean' : np.sum(solve)}
+        for hyper, grad in self.kernel.cov_grad_hypers(self.observed_inputs, V):
+            # Hypers that are not fitted, e.g. the stability noise, are fixed
+            if id(hyper) in names:
+                grads[names[id(hyper)]] = grads.get(names[id(hyper)], 0.0) + grad
+
+        return ll, grads
+
+    def cache_predictions(self, pred, keep=False):
+        """precompute the predictive mean and variance at pred in every state
+
+        Until the next fit, predict() returns these for the very same array
+        (by identity) without gradients or the full covariance. This lets
+        everything that is evaluated on a fixed grid share one prediction pass.
+        The predictions cached before are dropped unless keep is True, which
+        lets a grid be cached in blocks of rows. The cached arrays are read-only.
+        """
+        if not keep:
+            self._prediction_cache = []
+
+        prediction_list = []
+        current_state   = self.state
+        for i in xrange(self.num_states):
+            self.set_state(i)
+            func_m, func_v = self.predict(pred)
+            func_m.flags.writeable = False
+            func_v.flags.writeable = False
+            prediction_list.append((func_m, func_v))
+        if current_state is not None:
+            self.set_state(current_state)
+
+        self._prediction_cache.append((pred, prediction_list))
 
     def predict(self, pred, full_cov=False, compute_grad=False):
+        if not full_cov and not compute_grad:
+            for cached_pred, prediction_list in self._prediction_cache:
+                if pred is cached_pred:
+                    return prediction_list[self.state]
+
         inputs = self.inputs
         values = self.values
 
@@ -678,6 +1054,29 @@ class GP(AbstractModel):
     # -------------------------------------------------------- #
 
 
+    # log_pi = log of pi below, computed stably in the tails
+    def log_pi(self, pred, C=0, compute_grad=False):
+        if not compute_grad:
+            mean, sigma2 = self.predict(pred, compute_grad=False)
+        else:
+            mean, sigma2, g_m_x, g_v_x = self.predict(pred, compute_grad=True)
+        sigma = np.sqrt(sigma2)
+
+        u      = (mean-C)/sigma
+        log_pi = spe.log_ndtr(u)
+
+        if not compute_grad:
+            return log_pi
+        else:
+            # pdf/cdf of u, which stays finite where the cdf underflows
+            ratio = np.exp(-0.5*u**2 - 0.5*np.log(2*np.pi) - log_pi)
+            # Gradients of log pi w.r.t. GP mean and variance
+            g_lp_m = ratio / sigma
+            g_lp_v = -ratio * u / (2*sigma2)
+            # Total derivative of log pi w.r.t. inputs
+            grad_lp = g_lp_m[:,np.newaxis] * g_m_x + g_lp_v[:,np.newaxis] * g_v_x
+            return log_pi, grad_lp
+
     # pi = probability that the latent function value is greater than or equal to C
     # This is evaluated separately at each location in pred
     def pi(self, pred, C=0, compute_grad=False):
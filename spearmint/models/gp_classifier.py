@@ -191,16 +191,18 @@ import scipy.linalg      as spla
 import scipy.optimize    as spo
 import scipy.io          as sio
 import scipy.stats       as sps
+import scipy.special     as spe
 import scipy.weave
 
 
-from .gp                                     import GP
+from .gp                                     import GP, past_deadline, MAX_CHAIN_SEED
 from ..utils.param                           import Param as Hyperparameter
 from ..kernels                               import Matern52, Noise, Scale, SumKernel, TransformKernel
 from ..sampling.slice_sampler                import SliceSampler
 from ..sampling.whitened_prior_slice_sampler import WhitenedPriorSliceSampler
 from ..sampling.elliptical_slice_sampler     import EllipticalSliceSampler
 from ..utils                                 import priors
+from ..utils.linalg                          import cholesky
 from ..transformations                       import BetaWarp, Transformer
 
 try:
@@ -210,6 +212,34 @@ except:
     log = logging.getLogger()
     print 'Not running from main.'
 
+# Newton iterations of the Laplace approximation, see GPClassifier._laplace_mode
+DEFAULT_LAPLACE_ITERS      = 50
+DEFAULT_LAPLACE_TOL        = 1e-8
+DEFAULT_LAPLACE_STEP_TOL   = 1e-3
+DEFAULT_LAPLACE_MIN_W      = 1e-10
+DEFAULT_LAPLACE_REFACTOR   = 0.05
+DEFAULT_LAPLACE_LOGDET_TOL = 1e-3
+
+LOG_SQRT_2PI = 0.5*np.log(2*np.pi)
+
+# Constants of the hash in input_keys (FNV-1a offset and prime, then a mixing shift)
+KEY_OFFSET = np.uint64(14695981039346656037)
+KEY_PRIME  = np.uint64(1099511628211)
+KEY_SHIFT  = np.uint64(29)
+
+def input_keys(inputs):
+    """return a 64 bit hash of the bytes of each row of inputs, as uint64"""
+    bits = np.ascontiguousarray(inputs, dtype=np.float64).reshape(inputs.shape[0], -1).view(np.uint64)
+    keys = np.empty(bits.shape[0], dtype=np.uint64)
+    keys.fill(KEY_OFFSET)
+    with np.errstate(over='ignore'):
+        for j in xrange(bits.shape[1]):
+            keys ^= bits[:,j]
+            keys *= KEY_PRIME
+            keys ^= keys >> KEY_SHIFT
+
+    return keys
+
 class GPClassifier(GP):
     def __init__(self, num_dims, **options):
         self.counts = None
@@ -221,7 +251,14 @@ class GPClassifier(GP):
     
         self.prior_whitening = options.get('prior-whitening', True)
 
+        # How to infer the latent values: sampling them with elliptical slice
+        # sampling, or a Laplace approximation to their posterior
+        self.inference = options.get('latent-inference', 'ess').lower()
+        if self.inference not in ('ess', 'laplace'):
+            raise Exception("Latent inference must be ess or laplace, not %s" % self.inference)
+
         sigmoid = options.get("sigmoid", "probit")
+        self.sigmoid_name = sigmoid
         if not self.noiseless:
             if sigmoid == "probit":
                 self.sigmoid            = sps.norm.cdf
@@ -240,6 +277,9 @@ class GPClassifier(GP):
             self.sigmoid            = lambda x: np.greater_equal(x, 0)
             self.sigmoid_derivative = lambda x: 0.
             self.sigmoid_inverse    = lambda x: 0.
+
+            if self.inference == 'laplace':
+                raise Exception("The Laplace approximation needs a binomial likelihood")
         
         # The constraint is that p=s(f) > 1-epsilon
         # where s if the sigmoid and f is the latent function value, and p is the binomial probability
@@ -253,6 +293,9 @@ class GPClassifier(GP):
 
         super(GPClassifier, self).__init__(num_dims, **options)
 
+        if self.fit_method != 'mcmc':
+            raise Exception("GP classifier only supports mcmc fitting of the hypers, not %s" % self.fit_method)
+
     def _set_likelihood(self, options):
         self.likelihood = options.get('likelihood', 'binomial').lower()
 
@@ -272,61 +315,222 @@ class GPClassifier(GP):
         else:
             initial_latent_vals = np.zeros(0)
 
+        # The data with positive and negative counts, see log_binomial_likelihood
+        if self.counts is not None:
+            pos = np.asarray(self.counts, dtype=float) # positive counts
+            neg = 1 - pos
+            self._pos_inds,   self._neg_inds   = np.nonzero(pos > 0)[0], np.nonzero(neg > 0)[0]
+            self._pos_counts, self._neg_counts = pos[self._pos_inds], neg[self._neg_inds]
+
         self.latent_values.initial_value = initial_latent_vals
         self.latent_values.reset_value()
 
         self._latent_values_list = []
+        self._pseudo_list        = []
+        self._laplace_last       = None # The last mode and the hypers it is for, see _laplace_mode
 
     def _set_latent_values_from_dict(self, latent_values_dict):
         # Read in the latent values. For pre-existing data, just load them in
         # For new data, set them to a default.
-        default_latent_values = self.counts - 0.5
-
-        latent_values = np.zeros(self._inputs.shape[0])
-        for i in xrange(self._inputs.shape[0]):
-            key = str(hash(self._inputs[i].tostring()))
-            
-            if key in latent_values_dict:
-                latent_values[i] = latent_values_dict[key]
-            else:
-                latent_values[i] = default_latent_values[i]
+        latent_values = self.counts - 0.5
+
+        if 'keys' in latent_values_dict and latent_values_dict['keys'].size > 0:
+            # Match the stored inputs to the current ones by their keys
+            keys  = input_keys(self._inputs)
+            order = np.argsort(latent_values_dict['keys'].view(np.uint64))
+
+            stored_keys = latent_values_dict['keys'].view(np.uint64)[order]
+            inds        = np.minimum(np.searchsorted(stored_keys, keys), stored_keys.shape[0]-1)
+            found       = stored_keys[inds] == keys
+
+            latent_values[found] = latent_values_dict['values'][order[inds[found]]]
+        elif 'keys' not in latent_values_dict:
+            # Latent values saved as a dict from the hash of each input
+            for i in xrange(self._inputs.shape[0]):
+                key = str(hash(self._inputs[i].tostring()))
+                if key in latent_values_dict:
+                    latent_values[i] = latent_values_dict[key]
 
         self.latent_values.value = latent_values
 
-    def _burn_samples(self, num_samples):
+    def _burn_samples(self, num_samples, deadline=None):
         # sys.stderr.write('GPClassifer: burning %s: ' % ', '.join(self.params.keys()))
         # sys.stderr.write('%04d/%04d' % (0, num_samples))
-        for i in xrange(num_samples):
-            # sys.stderr.write('\b'*9+'%04d/%04d' % (i, num_samples))
+        trace = self._burnin_trace
+        start = len(trace)
+        while not self._burnin_done(trace, num_samples):
+            if past_deadline(deadline):
+                sys.stderr.write('Time budget reached after %d of %d burn-in samples.\n' % (len(trace), num_samples))
+                break
+
+            # sys.stderr.write('\b'*9+'%04d/%04d' % (len(trace), num_samples))
             for sampler in self._samplers:
-                sampler.sample(self)
+                sampler.sample(self, adapt=True)
 
-            self.latent_values_sampler.sample(self)
+            self._sample_latent_values()
 
+            trace.append(self._samplers[-1].current_ll)
             self.chain_length += 1
         # sys.stderr.write('\n')
 
+        # A burn-in that the deadline cut short continues in the next fit
+        # from where it stopped
+        self._burned_in    = self._burned_in or self._burnin_done(trace, num_samples)
+        self._burnin_trace = [] if self._burned_in else trace
+
+        return len(trace) - start
+
 
-    def _collect_samples(self, num_samples):
+    def _collect_samples(self, num_samples, deadline=None):
         # sys.stderr.write('GPClassifer: sampling %s: ' % ', '.join(self.params.keys()))
         # sys.stderr.write('%04d/%04d' % (0, num_samples))
         hypers_list        = []
         latent_values_list = []
+        trace              = []
         for i in xrange(num_samples):
+            # Always collect at least one sample so that there is a state to use
+            if i > 0 and past_deadline(deadline):
+                sys.stderr.write('Time budget reached after collecting %d of %d samples.\n' % (i, num_samples))
+                break
+
             # sys.stderr.write('\b'*9+'%04d/%04d' % (i, num_samples))
             for sampler in self._samplers:
                 sampler.sample(self)
 
-            self.latent_values_sampler.sample(self)
+            self._sample_latent_values()
 
-            current_dict = self.to_dict()
-            hypers_list.append(current_dict['hypers'])
-            latent_values_list.append(current_dict['latent values'])
+            hypers_list.append(self._hypers_dict())
+            latent_values_list.append(self.latent_values.value.copy())
+            trace.append(self._trace_row())
 
             self.chain_length += 1
 
         # sys.stderr.write('\n')
-        return hypers_list, latent_values_list
+        return hypers_list, latent_values_list, trace
+
+    def _sample_latent_values(self):
+        if self.inference == 'laplace':
+            self.latent_values.value = self._laplace_mode()[1]
+        else:
+            self.latent_values_sampler.sample(self)
+
+    def _likelihood_terms(self, y):
+        """return the binomial log likelihood of the latent values y, and its
+        gradient and negative Hessian (which is diagonal) w.r.t. y"""
+        pos = self.counts # positive counts
+        neg = 1 - pos
+
+        if self.sigmoid_name == "probit":
+            log_p     = spe.log_ndtr(y)
+            log_1mp   = spe.log_ndtr(-y)
+            log_pdf   = -0.5*y**2 - LOG_SQRT_2PI
+            ratio_pos = np.exp(log_pdf - log_p)
+            ratio_neg = np.exp(log_pdf - log_1mp)
+
+            grad = pos*ratio_pos - neg*ratio_neg
+            W    = pos*ratio_pos*(y + ratio_pos) + neg*ratio_neg*(ratio_neg - y)
+        else:
+            log_p   = -np.logaddexp(0, -y)
+            log_1mp = -np.logaddexp(0, y)
+            p       = np.exp(log_p)
+
+            grad = pos - (pos + neg)*p
+            W    = (pos + neg)*p*(1 - p)
+
+        # Terms with zero counts are left out, as in log_binomial_likelihood
+        log_lik = np.dot(self._pos_counts, log_p[self._pos_inds]) + np.dot(self._neg_counts, log_1mp[self._neg_inds])
+
+        return log_lik, grad, np.maximum(W, DEFAULT_LAPLACE_MIN_W)
+
+    def _laplace_mode(self):
+        """return the Laplace approximation to the log marginal likelihood and
+        the posterior mode of the latent values, given the hypers
+
+        Uses Newton's method (Rasmussen and Williams, Algorithm 3.1) started
+        from the current latent values, which it does not change. The
+        factorization of I + W^1/2 K W^1/2 is reused for as long as the
+        curvature W does not change by more than DEFAULT_LAPLACE_REFACTOR,
+        which makes those iterations O(N^2). They converge to the same mode.
+        Steps that do not increase the objective are halved. The result for
+        the last hypers is kept, so that finding the mode for the hypers that
+        a sampler accepted is usually a lookup.
+        """
+        if not self.has_data:
+            return 0.0, self.latent_values.value
+
+        key = tuple([(name, np.asarray(param.value, dtype=float).tostring())
+                     for name, param in sorted(self.params.iteritems())])
+        if self._laplace_last is not None and self._laplace_last[0] == key:
+            return self._laplace_last[1]
+
+        K = self.noiseless_kernel.cov(self._inputs)
+        m = self.mean.value
+        f = self.latent_values.value
+
+        a   = np.zeros(f.shape[0])
+        obj = -np.inf
+        L   = None
+        for i in xrange(DEFAULT_LAPLACE_ITERS):
+            log_lik, grad, W = self._likelihood_terms(f)
+
+            if L is None or np.max(np.abs(W - W_fact)) > DEFAULT_LAPLACE_REFACTOR:
+                W_fact = W
+                sW     = np.sqrt(W)
+                L      = cholesky(np.eye(f.shape[0]) + sW[:,None]*K*sW[None,:], lower=True)
+
+            b       = W_fact*(f - m) + grad
+            a_new   = b - sW*spla.cho_solve((L, True), sW*np.dot(K, b))
+            f_new   = np.dot(K, a_new) + m
+            obj_new = -0.5*np.dot(a_new, f_new - m) + self._likelihood_terms(f_new)[0]
+
+            # Damp the step until the objective does not decrease
+            for j in xrange(10):
+                if obj_new >= obj or not np.isfinite(obj):
+                    break
+                a_new   = 0.5*(a + a_new)
+                f_new   = np.dot(K, a_new) + m
+                obj_new = -0.5*np.dot(a_new, f_new - m) + self._likelihood_terms(f_new)[0]
+
+            # The error in the approximation is quadratic in the distance to the mode,
+            # so a small step means that the warm start was already close enough
+            converged = (np.abs(obj_new - obj) < DEFAULT_LAPLACE_TOL*max(1.0, np.abs(obj_new)) or
+                         np.max(np.abs(f_new - f)) < DEFAULT_LAPLACE_STEP_TOL)
+            a, f, obj = a_new, f_new, obj_new
+            if converged:
+                break
+
+        # log q(y|X) = Psi(f) - sum log diag chol(B), with B at the mode
+        W = self._likelihood_terms(f)[2]
+        if np.max(np.abs(W - W_fact)) > DEFAULT_LAPLACE_LOGDET_TOL:
+            sW = np.sqrt(W)
+            L  = cholesky(np.eye(f.shape[0]) + sW[:,None]*K*sW[None,:], lower=True)
+
+        self._laplace_last = (key, (obj - np.sum(np.log(np.diag(L))), f))
+
+        return self._laplace_last[1]
+
+    def _pseudo_observations(self, latent_values):
+        # The Laplace posterior equals the posterior of a GP regression on
+        # these targets with this heteroscedastic noise
+        log_lik, grad, W = self._likelihood_terms(latent_values)
+        return latent_values + grad/W, 1.0/W
+
+    def _inputs_cov(self):
+        cov = super(GPClassifier, self)._inputs_cov()
+
+        if self.inference == 'laplace' and self.has_data and len(self._pseudo_list) == self.num_states:
+            n = self._inputs.shape[0]
+            cov[np.arange(n), np.arange(n)] += self._pseudo_list[self.state][1]
+
+        return cov
+
+    def log_likelihood(self):
+        # With the Laplace approximation the latent values stay at the mode of
+        # the accepted hypers, see _sample_latent_values
+        if self.inference == 'laplace':
+            return self._laplace_mode()[0]
+
+        return super(GPClassifier, self).log_likelihood()
 
     def _build(self):
         self.params        = {}
@@ -378,9 +582,13 @@ class GPClassifier(GP):
 
         # Build the samplers
         to_sample = [self.mean] if self.noiseless else [self.mean, amp2]
-        self._samplers.append(SliceSampler(*to_sample, compwise=False, thinning=self.thinning))
-        self._samplers.append(WhitenedPriorSliceSampler(ls, beta_alpha, beta_beta, compwise=True, thinning=self.thinning))
-        self.latent_values_sampler = EllipticalSliceSampler(self.latent_values, thinning=self.ess_thinning)
+        self._samplers.append(SliceSampler(*to_sample, compwise=False, thinning=self.thinning, random_state=self._chain_random))
+        if self.inference == 'laplace':
+            # The hypers are sampled under the Laplace approximation to the marginal likelihood
+            self._samplers.append(SliceSampler(ls, beta_alpha, beta_beta, compwise=True, thinning=self.thinning, random_state=self._chain_random))
+        else:
+            self._samplers.append(WhitenedPriorSliceSampler(ls, beta_alpha, beta_beta, compwise=True, thinning=self.thinning, random_state=self._chain_random))
+        self.latent_values_sampler = EllipticalSliceSampler(self.latent_values, thinning=self.ess_thinning, random_state=self._chain_random)
 
     @property
     def values(self):
@@ -388,13 +596,16 @@ class GPClassifier(GP):
             return self.observed_values
 
         if self.num_fantasies == 1:
-            return np.append(self.latent_values.value, self._fantasy_values_list[self.state].flatten(), axis=0)
+            return np.append(self.observed_values, self._fantasy_values_list[self.state].flatten(), axis=0)
         else:
-            return np.append(np.tile(self.latent_values.value[:,None], (1,self.num_fantasies)), self._fantasy_values_list[self.state], axis=0)
+            return np.append(np.tile(self.observed_values[:,None], (1,self.num_fantasies)), self._fantasy_values_list[self.state], axis=0)
 
     @property
     def observed_values(self):
-        if self.latent_values is not None:
+        # With the Laplace approximation predictions condition on pseudo observations, see _inputs_cov
+        if self.inference == 'laplace' and self.has_data and len(self._pseudo_list) == self.num_states:
+            return self._pseudo_list[self.state][0]
+        elif self.latent_values is not None:
             return self.latent_values.value
         else:
             return np.array([])
@@ -402,13 +613,18 @@ class GPClassifier(GP):
     def set_state(self, state):
         self.state = state
         self._set_params_from_dict(self._hypers_list[state])
-        self._set_latent_values_from_dict(self._latent_values_list[state])
+        # The latent values of each state are aligned with the inputs
+        self.latent_values.value = self._latent_values_list[state]
 
     def pi(self, pred, compute_grad=False):
         return super(GPClassifier, self).pi( pred, compute_grad=compute_grad, 
             C=self.sigmoid_inverse(self._one_minus_epsilon) )
 
-    def fit(self, inputs, counts, pending=None, hypers=None, reburn=False, fit_hypers=True):
+    def log_pi(self, pred, compute_grad=False):
+        return super(GPClassifier, self).log_pi( pred, compute_grad=compute_grad, 
+            C=self.sigmoid_inverse(self._one_minus_epsilon) )
+
+    def fit(self, inputs, counts, pending=None, hypers=None, reburn=False, fit_hypers=True, deadline=None):
         # Set the data for the GP
         self._inputs = inputs
         self.counts  = counts
@@ -421,22 +637,35 @@ class GPClassifier(GP):
             self.from_dict(hypers)
 
         if fit_hypers:
+            # Continue the random stream of the saved chain
+            if self._chain_seed is not None:
+                self._chain_random.seed(self._chain_seed)
+
             # Burn samples (if needed)
-            num_samples = self.burnin if reburn or self.chain_length < self.burnin else 0
-            self._burn_samples(num_samples)
+            if reburn:
+                self._burnin_trace = []
+            num_samples = self.burnin if reburn or not self._burned_in else 0
+            num_burned  = self._burn_samples(num_samples, deadline)
 
             # Now collect some samples
-            self._hypers_list, self._latent_values_list = self._collect_samples(self.mcmc_iters)
+            self._hypers_list, self._latent_values_list, trace = self._collect_samples(self.mcmc_iters, deadline)
+            self._diagnose(trace, num_burned)
 
             # Now we have more states
-            self.num_states = self.mcmc_iters
+            self.num_states = len(self._hypers_list)
+
+            self._chain_seed = self._chain_random.randint(MAX_CHAIN_SEED)
         elif not self._hypers_list:
             # Just use the current hypers as the only state
-            current_dict             = self.to_dict()
-            self._hypers_list        = [current_dict['hypers']]
-            self._latent_values_list = [current_dict['latent values']]
+            if self.inference == 'laplace':
+                self.latent_values.value = self._laplace_mode()[1]
+            self._hypers_list        = [self._hypers_dict()]
+            self._latent_values_list = [self.latent_values.value.copy()]
             self.num_states          = 1
 
+        if self.inference == 'laplace' and self.has_data:
+            self._pseudo_list = [self._pseudo_observations(latent_values) for latent_values in self._latent_values_list]
+
         # Set pending data and generate corresponding fantasies
         if pending is not None:
             self.pending              = pending
@@ -459,33 +688,45 @@ class GPClassifier(GP):
         if y is None:
             y = self.latent_values.value
 
-        p = self.sigmoid(y)
-        
         # Note on the below: the obvious implementation would be 
         #    return np.sum( pos*np.log(p) + neg*np.log(1-p) )
         # The problem is, if pos = 0, and p=0, we will get a 0*-Inf = nan
         # This messes things up. So we use the safer implementation below that ignores
-        # the term entirely if the counts are 0.
-        pos = self.counts # positive counts
-        neg = 1 - pos
+        # the term entirely if the counts are 0. The data with nonzero positive and
+        # negative counts are found once per fit, see _reset.
+        y_pos = y[self._pos_inds]
+        y_neg = y[self._neg_inds]
 
-        with np.errstate(divide='ignore'):  # suppress warnings about log(0)
-            return np.sum( pos[pos>0]*np.log(p[pos>0]) ) + np.sum( neg[neg>0]*np.log(1-p[neg>0]) )
+        # log(p) and log(1-p) directly, which stay finite far in the tails
+        if self.noiseless:
+            with np.errstate(divide='ignore'):  # suppress warnings about log(0)
+                log_p   = np.log(self.sigmoid(y_pos))
+                log_1mp = np.log(1 - self.sigmoid(y_neg))
+        elif self.sigmoid_name == "probit":
+            log_p   = spe.log_ndtr(y_pos)
+            log_1mp = spe.log_ndtr(-y_neg)
+        else:
+            log_p   = -np.logaddexp(0, -y_pos)
+            log_1mp = -np.logaddexp(0, y_neg)
+
+        return np.dot(self._pos_counts, log_p) + np.dot(self._neg_counts, log_1mp)
 
     def to_dict(self):
         gp_dict = {}
 
-        gp_dict['hypers'] = {}
-        for name, hyper in self.params.iteritems():
-            gp_dict['hypers'][name] = hyper.value
+        gp_dict['hypers'] = self._hypers_dict()
 
-        # Save the latent values as a dict with keys as hashes of the data
+        # Save the latent values with keys hashed from the data
         # so that each latent value is associated with its input
-        # then when we load them in we know which ones are which
-        gp_dict['latent values'] = {str(hash(self._inputs[i].tostring())) : self.latent_values.value[i] 
-                for i in xrange(self._inputs.shape[0])}
+        # then when we load them in we know which ones are which.
+        # The keys are 64 bit integers stored as float64 arrays.
+        gp_dict['latent values'] = {
+            'keys'   : input_keys(self._inputs).view(np.float64),
+            'values' : self.latent_values.value.copy()
+        }
 
         gp_dict['chain length'] = self.chain_length
+        gp_dict['chain state']  = self._chain_state_dict()
 
         return gp_dict
 
@@ -493,6 +734,10 @@ class GPClassifier(GP):
         self._set_params_from_dict(gp_dict['hypers'])
         self._set_latent_values_from_dict(gp_dict['latent values'])
         self.chain_length = gp_dict['chain length']
+        self._burned_in   = self.chain_length >= self.burnin # Unless the chain state says otherwise
+
+        if gp_dict.has_key('chain state'):
+            self._set_chain_state_from_dict(gp_dict['chain state'])
 
 
 
@@ -183,10 +183,18 @@
 # its Institution.
 
 
+import numpy as np
+
 from abc import ABCMeta, abstractmethod
 
 from ..utils import param as hyperparameter_utils
 
+# The slice widths move by this fraction (in log space) towards
+# DEFAULT_ADAPT_SCALE times the size of each bracket at acceptance,
+# which is about the width with the fewest log probability evaluations
+DEFAULT_ADAPT_RATE  = 0.1
+DEFAULT_ADAPT_SCALE = 1.5
+
 
 class AbstractSampler(object):
     __metaclass__ = ABCMeta
@@ -195,6 +203,7 @@ class AbstractSampler(object):
         self.params          = params_to_sample
         self.sampler_options = sampler_options
         self.current_ll      = None
+        self.layout          = None # compiled in sample(), see utils.param.ParamLayout
 
         # Note: thinning is currently implemented such that each sampler does its thinning
         # We could also do a different type of thinning, implemented in SamplerCollection,
@@ -210,6 +219,41 @@ class AbstractSampler(object):
     def sample(self, model):
         pass
 
+    def _adapt_sigma(self, brackets, num_dims):
+        """update the per dimension slice widths from the brackets recorded
+        by mcmc.slice_sample. Only call this during burn-in, since adapting
+        the widths breaks detailed balance."""
+        sigma = self.sampler_options.get('sigma', 1.0)
+
+        # Along a random direction the bracket is set by the narrowest
+        # dimension, so it says little about the width of the others
+        # and the sampler keeps a single width
+        if self.sampler_options.get('compwise', True):
+            sigma = np.ones(num_dims)*sigma
+
+        for direction, width, size in brackets:
+            step = DEFAULT_ADAPT_RATE*np.log(DEFAULT_ADAPT_SCALE*size/width)
+            if np.ndim(sigma) > 0:
+                sigma = sigma*np.exp(step*direction**2)
+            else:
+                sigma = sigma*np.exp(step)
+
+        self.sampler_options['sigma'] = sigma
+
+    def to_dict(self):
+        """return the state of the sampler that is kept from one fit to
+        the next, such as the slice widths"""
+        sampler_dict = {}
+        if self.sampler_options.has_key('sigma'):
+            sampler_dict['sigma'] = self.sampler_options['sigma']
+
+        return sampler_dict
+
+    def from_dict(self, sampler_dict):
+        """restore the state saved by to_dict"""
+        if sampler_dict.has_key('sigma'):
+            self.sampler_options['sigma'] = sampler_dict['sigma']
+
     def print_diagnostics(self):
         params_array = hyperparameter_utils.params_to_array(self.params)
         for param in self.params:
@@ -205,9 +205,8 @@ class EllipticalSliceSampler(AbstractSampler):
         if not model.has_data:
             return np.zeros(0) # TODO this should be a sample from the prior...
 
-        prior_cov      = model.noiseless_kernel.cov(model.inputs)
-        prior_cov_chol = spla.cholesky(prior_cov, lower=True)
         # Here get the Cholesky from model
+        prior_cov_chol = model.noiseless_chol()
 
         params_array = hyperparameter_utils.params_to_array(self.params)
         for i in xrange(self.thinning + 1):
@@ -228,9 +227,11 @@ class EllipticalSliceSampler(AbstractSampler):
 # log_like_fn: a function that computes the log likelihood of an input
 # cur_log_like (optional): the current log likelihood
 # angle_range: not sure
+# random_state (optional): the numpy RandomState to draw from, by default the global one
 def elliptical_slice(xx, log_like_fn, prior_chol, prior_mean, *log_like_args, **sampler_args):
     cur_log_like = sampler_args.get('cur_log_like', None)
     angle_range = sampler_args.get('angle_range', 0)
+    random_state = sampler_args.get('random_state', npr)
 
     if cur_log_like is None:
         cur_log_like = log_like_fn(xx, *log_like_args)
@@ -240,22 +241,22 @@ def elliptical_slice(xx, log_like_fn, prior_chol, prior_mean, *log_like_args, **
     if np.isnan(cur_log_like):
         raise Exception("Elliptical Slice Sampler: initial logprob is NaN for inputs %s" % xx)
 
-    nu = np.dot(prior_chol, npr.randn(xx.shape[0])) # don't bother adding mean here, would just subtract it at update step
-    hh = np.log(npr.rand()) + cur_log_like  
+    nu = np.dot(prior_chol, random_state.randn(xx.shape[0])) # don't bother adding mean here, would just subtract it at update step
+    hh = np.log(random_state.rand()) + cur_log_like  
     # log likelihood threshold -- LESS THAN THE INITIAL LOG LIKELIHOOD
 
     # Set up a bracket of angles and pick a first proposal.
     # "phi = (theta'-theta)" is a change in angle.
     if angle_range <= 0:
         # Bracket whole ellipse with both edges at first proposed point
-        phi = npr.rand()*2*math.pi
+        phi = random_state.rand()*2*math.pi
         phi_min = phi - 2*math.pi
         phi_max = phi
     else:
         # Randomly center bracket on current point
-        phi_min = -angle_range*npr.rand();
+        phi_min = -angle_range*random_state.rand();
         phi_max = phi_min + angle_range;
-        phi = npr.rand()*(phi_max - phi_min) + phi_min;
+        phi = random_state.rand()*(phi_max - phi_min) + phi_min;
 
     # Slice sampling loop
     while True:
@@ -283,7 +284,7 @@ def elliptical_slice(xx, log_like_fn, prior_chol, prior_mean, *log_like_args, **
                             'and still not acceptable.');
 
         # Propose new angle difference
-        phi = npr.rand()*(phi_max - phi_min) + phi_min
+        phi = random_state.rand()*(phi_max - phi_min) + phi_min
 
 
 
@@ -244,6 +244,13 @@ def slice_sample(init_x, logprob, *logprob_args, **slice_sample_args):
         location
     *logprob_args :
         additional arguments are passed to logprob
+    **slice_sample_args :
+        `sigma` is the initial width of the bracket, either a float or
+        an array with one width per dimension. If `brackets` is a list,
+        a tuple (direction, width, size) is appended to it for every
+        direction sampled, where size is the bracket size at acceptance.
+        `random_state` is the numpy RandomState to draw from, by default
+        the global one.
         
     TODO: this function has too many levels and is hard to read.  It would be clearer
     as a class or just moving the sub-functions to another location
@@ -266,10 +273,21 @@ def slice_sample(init_x, logprob, *logprob_args, **slice_sample_args):
     compwise      = slice_sample_args.get('compwise', True)
     doubling_step = slice_sample_args.get('doubling_step', True)
     verbose       = slice_sample_args.get('verbose', False)
+    brackets      = slice_sample_args.get('brackets', None)
+    random_state  = slice_sample_args.get('random_state', npr)
+
+    def direction_slice(direction, init_x, sigma, init_llh=None):
+        # The log probabilities at the positions along the direction that
+        # were already evaluated. The step out evaluates the end that did
+        # not move again on every step and acceptable() evaluates the
+        # ends of the earlier brackets again. The memo does not change
+        # the samples, since it only skips repeated evaluations.
+        evaluated = {} if init_llh is None else {0.0 : init_llh}
 
-    def direction_slice(direction, init_x):
         def dir_logprob(z):
-            return logprob(direction*z + init_x, *logprob_args)
+            if z not in evaluated:
+                evaluated[z] = logprob(direction*z + init_x, *logprob_args)
+            return evaluated[z]
 
         def acceptable(z, llh_s, L, U):
             while (U-L) > 1.1*sigma:
@@ -279,21 +297,20 @@ def slice_sample(init_x, logprob, *logprob_args, **slice_sample_args):
                     U = middle
                 else:
                     L = middle
-                # Probably these could be cached from the stepping out.
                 if splits and llh_s >= dir_logprob(U) and llh_s >= dir_logprob(L):
                     return False
             return True
     
-        upper = sigma*npr.rand()
+        upper = sigma*random_state.rand()
         lower = upper - sigma
-        llh_s = np.log(npr.rand()) + dir_logprob(0.0)
+        llh_s = np.log(random_state.rand()) + dir_logprob(0.0)
 
         l_steps_out = 0
         u_steps_out = 0
         if step_out:
             if doubling_step:
                 while (dir_logprob(lower) > llh_s or dir_logprob(upper) > llh_s) and (l_steps_out + u_steps_out) < max_steps_out:
-                    if npr.rand() < 0.5:
+                    if random_state.rand() < 0.5:
                         l_steps_out += 1
                         lower       -= (upper-lower)                        
                     else:
@@ -313,7 +330,7 @@ def slice_sample(init_x, logprob, *logprob_args, **slice_sample_args):
         steps_in = 0
         while True:
             steps_in += 1
-            new_z     = (upper - lower)*npr.rand() + lower
+            new_z     = (upper - lower)*random_state.rand() + lower
             new_llh   = dir_logprob(new_z)
             if np.isnan(new_llh):
                 print new_z, direction*new_z + init_x, new_llh, llh_s, init_x, logprob(init_x, *logprob_args)
@@ -330,6 +347,9 @@ def slice_sample(init_x, logprob, *logprob_args, **slice_sample_args):
         if verbose:
             print "Steps Out:", l_steps_out, u_steps_out, " Steps In:", steps_in
 
+        if brackets is not None:
+            brackets.append((direction, sigma, upper - lower))
+
         return new_z*direction + init_x, new_llh
 
     if type(init_x) == float or isinstance(init_x, np.number):
@@ -338,20 +358,27 @@ def slice_sample(init_x, logprob, *logprob_args, **slice_sample_args):
     else:
         scalar = False
 
+    # The width may be given per dimension
+    per_dim = np.ndim(sigma) > 0
+
     dims = init_x.shape[0]
     if compwise:
         ordering = range(dims)
-        npr.shuffle(ordering)
-        new_x = init_x.copy()
+        random_state.shuffle(ordering)
+        new_x   = init_x.copy()
+        new_llh = None
         for d in ordering:
             direction    = np.zeros((dims))
             direction[d] = 1.0
-            new_x, new_llh = direction_slice(direction, new_x)
+            # The log probability at the start of each direction is the
+            # one at the sample from the previous direction
+            new_x, new_llh = direction_slice(direction, new_x, sigma[d] if per_dim else sigma, new_llh)
 
     else:
-        direction = npr.randn(dims)
+        direction = random_state.randn(dims)
         direction = direction / np.sqrt(np.sum(direction**2))
-        new_x, new_llh = direction_slice(direction, init_x)
+        width     = np.sqrt(np.sum((direction*sigma)**2)) if per_dim else sigma
+        new_x, new_llh = direction_slice(direction, init_x, width)
 
     if scalar:
         return float(new_x[0]), new_llh
@@ -219,23 +219,26 @@ class SliceSampler(AbstractSampler):
         lp : float
             the log probability
         """
-        # set values of the parameers in self.params to be x
-        hyperparameter_utils.set_params_from_array(self.params, x)
-        
-        lp = 0.0
+        if self.layout is None:
+            self.layout = hyperparameter_utils.ParamLayout(self.params)
+
         # sum the log probabilities of the parameter priors
-        for param in self.params:
-            lp += param.prior_logprob()
+        lp = self.layout.prior_logprob(x)
 
-            if np.isnan(lp): # Positive infinity should be ok, right?
-                print 'Param diagnostics:'
+        if np.isnan(lp): # Positive infinity should be ok, right?
+            hyperparameter_utils.set_params_from_array(self.params, x)
+            print 'Param diagnostics:'
+            for param in self.params:
                 param.print_diagnostics()
                 print 'Prior logprob: %f' % param.prior_logprob()
-                raise Exception("Prior returned %f logprob" % lp)
+            raise Exception("Prior returned %f logprob" % lp)
 
         if not np.isfinite(lp):
             return lp
-        
+
+        # set values of the parameers in self.params to be x
+        self.layout.set_params(x)
+
         # include the log probability from the model
         lp += model.log_likelihood()
 
@@ -244,9 +247,15 @@ class SliceSampler(AbstractSampler):
 
         return lp
 
-    def sample(self, model):
+    def sample(self, model, adapt=False):
         """generate a new sample of parameters for the model
         
+        Parameters
+        ----------
+        adapt : bool, optional
+            adapt the slice widths to the brackets found while sampling,
+            during burn-in only.
+
         Notes
         -----
         The parameters are stored as self.params which is a list of Params objects.  
@@ -257,12 +266,17 @@ class SliceSampler(AbstractSampler):
         """
         # turn self.params into a 1d numpy array
         params_array = hyperparameter_utils.params_to_array(self.params)
+        self.layout  = hyperparameter_utils.ParamLayout(self.params)
+        brackets     = [] if adapt else None
         for i in xrange(self.thinning + 1):
             # get a new value for the parameter array via slice sampling
-            params_array, current_ll = slice_sample(params_array, self.logprob, model, **self.sampler_options)
+            params_array, current_ll = slice_sample(params_array, self.logprob, model, brackets=brackets, **self.sampler_options)
             hyperparameter_utils.set_params_from_array(self.params, params_array) # Can this be untabbed safely?
         self.current_ll = current_ll # for diagnostics
 
+        if adapt:
+            self._adapt_sigma(brackets, params_array.size)
+
 
 if __name__ == '__main__':
 
@@ -205,19 +205,20 @@ class WhitenedPriorSliceSampler(AbstractSampler):
     """
 
     def _compute_implied_y(self, model, nu):
-        K_XX = model.noiseless_kernel.cov(model.inputs)
-        L    = spla.cholesky(K_XX, lower=True) 
-        
+        L = model.noiseless_chol()
+
         return np.dot(L, nu) + model.mean.value
 
     def logprob(self, x, model, nu):
-        hyperparameter_utils.set_params_from_array(self.params, x)
-        lp = 0.0
-        for param in self.params:
-            lp += param.prior_logprob()
+        if self.layout is None:
+            self.layout = hyperparameter_utils.ParamLayout(self.params)
+
+        lp = self.layout.prior_logprob(x)
         
         # Compute this if prior logprob is finite AND there is data
         if np.isfinite(lp) and nu is not None:
+            self.layout.set_params(x)
+
             # Get implied y from nu
             implied_y = self._compute_implied_y(model, nu)
 
@@ -226,19 +227,23 @@ class WhitenedPriorSliceSampler(AbstractSampler):
 
         return lp
 
-    def sample(self, model):
+    def sample(self, model, adapt=False):
+        brackets = [] if adapt else None
         for i in xrange(self.thinning + 1):
-            params_array, new_latent_values, current_ll = self.sample_fun(model, **self.sampler_options)
+            params_array, new_latent_values, current_ll = self.sample_fun(model, brackets=brackets, **self.sampler_options)
             hyperparameter_utils.set_params_from_array(self.params, params_array)
             model.latent_values.set_value(new_latent_values)
         self.current_ll = current_ll # for diagnostics
 
+        if adapt:
+            self._adapt_sigma(brackets, params_array.size)
+
     def sample_fun(self, model, **sampler_options):
         params_array = hyperparameter_utils.params_to_array(self.params)
+        self.layout  = hyperparameter_utils.ParamLayout(self.params)
 
         if model.has_data:
-            K_XX      = model.noiseless_kernel.cov(model.inputs)
-            current_L = spla.cholesky(K_XX, lower=True)
+            current_L = model.noiseless_chol()
             nu        = spla.solve_triangular(current_L, model.latent_values.value-model.mean.value, lower=True)
         else:
             nu = None # if no data
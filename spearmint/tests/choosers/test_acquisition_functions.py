@@ -0,0 +1,303 @@
+# -*- coding: utf-8 -*-
+# Spearmint
+#
+# Academic and Non-Commercial Research Use Software License and Terms
+# of Use
+#
+# Spearmint is a software package to perform Bayesian optimization
+# according to specific algorithms (the “Software”).  The Software is
+# designed to automatically run experiments (thus the code name
+# 'spearmint') in a manner that iteratively adjusts a number of
+# parameters so as to minimize some objective in as few runs as
+# possible.
+#
+# The Software was developed by Ryan P. Adams, Michael Gelbart, and
+# Jasper Snoek at Harvard University, Kevin Swersky at the
+# University of Toronto (“Toronto”), and Hugo Larochelle at the
+# Université de Sherbrooke (“Sherbrooke”), which assigned its rights
+# in the Software to Socpra Sciences et Génie
+# S.E.C. (“Socpra”). Pursuant to an inter-institutional agreement
+# between the parties, it is distributed for free academic and
+# non-commercial research use by the President and Fellows of Harvard
+# College (“Harvard”).
+#
+# Using the Software indicates your agreement to be bound by the terms
+# of this Software Use Agreement (“Agreement”). Absent your agreement
+# to the terms below, you (the “End User”) have no rights to hold or
+# use the Software whatsoever.
+#
+# Harvard agrees to grant hereunder the limited non-exclusive license
+# to End User for the use of the Software in the performance of End
+# User’s internal, non-commercial research and academic use at End
+# User’s academic or not-for-profit research institution
+# (“Institution”) on the following terms and conditions:
+#
+# 1.  NO REDISTRIBUTION. The Software remains the property Harvard,
+# Toronto and Socpra, and except as set forth in Section 4, End User
+# shall not publish, distribute, or otherwise transfer or make
+# available the Software to any other party.
+#
+# 2.  NO COMMERCIAL USE. End User shall not use the Software for
+# commercial purposes and any such use of the Software is expressly
+# prohibited. This includes, but is not limited to, use of the
+# Software in fee-for-service arrangements, core facilities or
+# laboratories or to provide research services to (or in collaboration
+# with) third parties for a fee, and in industry-sponsored
+# collaborative research projects where any commercial rights are
+# granted to the sponsor. If End User wishes to use the Software for
+# commercial purposes or for any other restricted purpose, End User
+# must execute a separate license agreement with Harvard.
+#
+# Requests for use of the Software for commercial purposes, please
+# contact:
+#
+# Office of Technology Development
+# Harvard University
+# Smith Campus Center, Suite 727E
+# 1350 Massachusetts Avenue
+# Cambridge, MA 02138 USA
+# Telephone: (617) 495-3067
+# Facsimile: (617) 495-9568
+# E-mail: otd@harvard.edu
+#
+# 3.  OWNERSHIP AND COPYRIGHT NOTICE. Harvard, Toronto and Socpra own
+# all intellectual property in the Software. End User shall gain no
+# ownership to the Software. End User shall not remove or delete and
+# shall retain in the Software, in any modifications to Software and
+# in any Derivative Works, the copyright, trademark, or other notices
+# pertaining to Software as provided with the Software.
+#
+# 4.  DERIVATIVE WORKS. End User may create and use Derivative Works,
+# as such term is defined under U.S. copyright laws, provided that any
+# such Derivative Works shall be restricted to non-commercial,
+# internal research and academic use at End User’s Institution. End
+# User may distribute Derivative Works to other Institutions solely
+# for the performance of non-commercial, internal research and
+# academic use on terms substantially similar to this License and
+# Terms of Use.
+#
+# 5.  FEEDBACK. In order to improve the Software, comments from End
+# Users may be useful. End User agrees to provide Harvard with
+# feedback on the End User’s use of the Software (e.g., any bugs in
+# the Software, the user experience, etc.).  Harvard is permitted to
+# use such information provided by End User in making changes and
+# improvements to the Software without compensation or an accounting
+# to End User.
+#
+# 6.  NON ASSERT. End User acknowledges that Harvard, Toronto and/or
+# Sherbrooke or Socpra may develop modifications to the Software that
+# may be based on the feedback provided by End User under Section 5
+# above. Harvard, Toronto and Sherbrooke/Socpra shall not be
+# restricted in any way by End User regarding their use of such
+# information.  End User acknowledges the right of Harvard, Toronto
+# and Sherbrooke/Socpra to prepare, publish, display, reproduce,
+# transmit and or use modifications to the Software that may be
+# substantially similar or functionally equivalent to End User’s
+# modifications and/or improvements if any.  In the event that End
+# User obtains patent protection for any modification or improvement
+# to Software, End User agrees not to allege or enjoin infringement of
+# End User’s patent against Harvard, Toronto or Sherbrooke or Socpra,
+# or any of the researchers, medical or research staff, officers,
+# directors and employees of those institutions.
+#
+# 7.  PUBLICATION & ATTRIBUTION. End User has the right to publish,
+# present, or share results from the use of the Software.  In
+# accordance with customary academic practice, End User will
+# acknowledge Harvard, Toronto and Sherbrooke/Socpra as the providers
+# of the Software and may cite the relevant reference(s) from the
+# following list of publications:
+#
+# Practical Bayesian Optimization of Machine Learning Algorithms
+# Jasper Snoek, Hugo Larochelle and Ryan Prescott Adams
+# Neural Information Processing Systems, 2012
+#
+# Multi-Task Bayesian Optimization
+# Kevin Swersky, Jasper Snoek and Ryan Prescott Adams
+# Advances in Neural Information Processing Systems, 2013
+#
+# Input Warping for Bayesian Optimization of Non-stationary Functions
+# Jasper Snoek, Kevin Swersky, Richard Zemel and Ryan Prescott Adams
+# Preprint, arXiv:1402.0929, http://arxiv.org/abs/1402.0929, 2013
+#
+# Bayesian Optimization and Semiparametric Models with Applications to
+# Assistive Technology Jasper Snoek, PhD Thesis, University of
+# Toronto, 2013
+#
+# 8.  NO WARRANTIES. THE SOFTWARE IS PROVIDED "AS IS." TO THE FULLEST
+# EXTENT PERMITTED BY LAW, HARVARD, TORONTO AND SHERBROOKE AND SOCPRA
+# HEREBY DISCLAIM ALL WARRANTIES OF ANY KIND (EXPRESS, IMPLIED OR
+# OTHERWISE) REGARDING THE SOFTWARE, INCLUDING BUT NOT LIMITED TO ANY
+# IMPLIED WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+# PURPOSE, OWNERSHIP, AND NON-INFRINGEMENT.  HARVARD, TORONTO AND
+# SHERBROOKE AND SOCPRA MAKE NO WARRANTY ABOUT THE ACCURACY,
+# RELIABILITY, COMPLETENESS, TIMELINESS, SUFFICIENCY OR QUALITY OF THE
+# SOFTWARE.  HARVARD, TORONTO AND SHERBROOKE AND SOCPRA DO NOT WARRANT
+# THAT THE SOFTWARE WILL OPERATE WITHOUT ERROR OR INTERRUPTION.
+#
+# 9.  LIMITATIONS OF LIABILITY AND REMEDIES. USE OF THE SOFTWARE IS AT
+# END USER’S OWN RISK. IF END USER IS DISSATISFIED WITH THE SOFTWARE,
+# ITS EXCLUSIVE REMEDY IS TO STOP USING IT.  IN NO EVENT SHALL
+# HARVARD, TORONTO OR SHERBROOKE OR SOCPRA BE LIABLE TO END USER OR
+# ITS INSTITUTION, IN CONTRACT, TORT OR OTHERWISE, FOR ANY DIRECT,
+# INDIRECT, SPECIAL, INCIDENTAL, CONSEQUENTIAL, PUNITIVE OR OTHER
+# DAMAGES OF ANY KIND WHATSOEVER ARISING OUT OF OR IN CONNECTION WITH
+# THE SOFTWARE, EVEN IF HARVARD, TORONTO OR SHERBROOKE OR SOCPRA IS
+# NEGLIGENT OR OTHERWISE AT FAULT, AND REGARDLESS OF WHETHER HARVARD,
+# TORONTO OR SHERBROOKE OR SOCPRA IS ADVISED OF THE POSSIBILITY OF
+# SUCH DAMAGES.
+#
+# 10. INDEMNIFICATION. To the extent permitted by law, End User shall
+# indemnify, defend and hold harmless Harvard, Toronto and Sherbrooke
+# and Socpra, their corporate affiliates, current or future directors,
+# trustees, officers, faculty, medical and professional staff,
+# employees, students and agents and their respective successors,
+# heirs and assigns (the "Indemnitees"), against any liability,
+# damage, loss or expense (including reasonable attorney's fees and
+# expenses of litigation) incurred by or imposed upon the Indemnitees
+# or any one of them in connection with any claims, suits, actions,
+# demands or judgments arising from End User’s breach of this
+# Agreement or its Institution’s use of the Software except to the
+# extent caused by the gross negligence or willful misconduct of
+# Harvard, Toronto or Sherbrooke or Socpra. This indemnification
+# provision shall survive expiration or termination of this Agreement.
+#
+# 11. GOVERNING LAW. This Agreement shall be construed and governed by
+# the laws of the Commonwealth of Massachusetts regardless of
+# otherwise applicable choice of law standards.
+#
+# 12. NON-USE OF NAME.  Nothing in this License and Terms of Use shall
+# be construed as granting End Users or their Institutions any rights
+# or licenses to use any trademarks, service marks or logos associated
+# with the Software.  You may not use the terms “Harvard” or
+# “University of Toronto” or “Université de Sherbrooke” or “Socpra
+# Sciences et Génie S.E.C.” (or a substantially similar term) in any
+# way that is inconsistent with the permitted uses described
+# herein. You agree not to use any name or emblem of Harvard, Toronto
+# or Sherbrooke, or any of their subdivisions for any purpose, or to
+# falsely suggest any relationship between End User (or its
+# Institution) and Harvard, Toronto and/or Sherbrooke, or in any
+# manner that would infringe or violate any of their rights.
+#
+# 13. End User represents and warrants that it has the legal authority
+# to enter into this License and Terms of Use on behalf of itself and
+# its Institution.
+
+
+import numpy        as np
+import numpy.random as npr
+
+from spearmint.models                         import GP
+from spearmint.models.abstract_model          import function_over_hypers
+from spearmint.choosers.acquisition_functions import ACQUISITION_FUNCTIONS, MarginalAcquisitionFunction
+from spearmint.choosers.acquisition_functions import ExpectedImprovement, ThompsonSampling, RandomFeatureSample, _chain_rule
+
+def fit_gp(N=15, D=2, pending=None):
+    inputs = npr.rand(N,D)
+    vals   = np.sin(3*inputs).sum(1) + 0.1*npr.randn(N)
+
+    gp = GP(D, burnin=5, mcmc_iters=3, num_fantasies=4)
+    gp.fit(inputs, vals, pending)
+
+    return gp
+
+def test_marginal_acquisition_functions():
+    npr.seed(1)
+
+    gp   = fit_gp()
+    pred = npr.rand(5,2)
+
+    # Only the acquisitions of the marginal prediction go through it, the
+    # Thompson sample needs the joint posterior
+    for name, acq_class in ACQUISITION_FUNCTIONS.iteritems():
+        acq = acq_class(gp)
+        assert isinstance(acq, MarginalAcquisitionFunction) == (name != 'thompson')
+        if isinstance(acq, MarginalAcquisitionFunction):
+            func_m, func_v = gp.predict(pred)
+            assert np.allclose(acq(pred, compute_grad=False), acq.from_prediction(gp.state, func_m, func_v))
+
+def test_chain_rule():
+    npr.seed(1)
+
+    N = 6
+    D = 3
+    F = 4
+
+    grad_xp_m = npr.randn(N,D,F)
+    g_m       = npr.randn(N,F)
+    g_v       = npr.randn(N,F)
+
+    for grad_xp_v in [npr.randn(N,D,F), npr.randn(N,D,1)]:
+        expected = (grad_xp_m*g_m[:,np.newaxis,:] + grad_xp_v*g_v[:,np.newaxis,:]).mean(axis=2)
+        assert np.allclose(_chain_rule(grad_xp_m, g_m, grad_xp_v, g_v), expected)
+
+def test_ei_grad():
+    npr.seed(1)
+
+    gp  = fit_gp(pending=npr.rand(2,2))
+    ei  = ExpectedImprovement(gp)
+    eps = 1e-6
+
+    pred = npr.rand(5,2)
+    val, grad = ei(pred)
+
+    grad_est = np.zeros(grad.shape)
+    for i in xrange(pred.shape[1]):
+        step       = np.zeros(pred.shape)
+        step[:,i]  = eps
+        grad_est[:,i] = (ei(pred+step, compute_grad=False) - ei(pred-step, compute_grad=False)) / (2*eps)
+
+    assert np.allclose(grad, grad_est, rtol=1e-4, atol=1e-6)
+
+def test_thompson_sampling():
+    npr.seed(1)
+
+    gp       = fit_gp()
+    thompson = ThompsonSampling(gp)
+    cand     = npr.rand(1000,2)
+
+    # One joint draw, whether the candidates are evaluated at once or in chunks
+    values  = function_over_hypers([gp], thompson, cand, compute_grad=False)
+    chunked = np.hstack([function_over_hypers([gp], thompson, cand[i:i+300], compute_grad=False)
+                         for i in xrange(0, cand.shape[0], 300)])
+
+    assert np.all(np.isfinite(values))
+    assert np.allclose(values, chunked)
+
+    # Only the state of the sample contributes
+    gp.set_state((thompson.state+1) % gp.num_states)
+    assert np.all(thompson(cand, compute_grad=False) == 0)
+
+    # The gradient of the sample is that of its values
+    gp.set_state(thompson.state)
+    eps  = 1e-6
+    pred = cand[:5]
+    val, grad = thompson(pred)
+
+    grad_est = np.zeros(grad.shape)
+    for i in xrange(pred.shape[1]):
+        step       = np.zeros(pred.shape)
+        step[:,i]  = eps
+        grad_est[:,i] = (thompson(pred+step, compute_grad=False) - thompson(pred-step, compute_grad=False)) / (2*eps)
+
+    assert np.allclose(grad, grad_est, rtol=1e-4, atol=1e-6)
+
+    # The sample follows the posterior: near the data it is close to the mean
+    mean, var = gp.predict(gp.observed_inputs)
+    sample    = -thompson(gp.observed_inputs, compute_grad=False)
+    assert np.all(np.abs(sample - mean) < 5*np.sqrt(var) + 0.1)
+
+def test_random_feature_sample_pending():
+    npr.seed(1)
+
+    # Far from the data the sample follows the fantasies at the pending
+    # points, up to the stability noise and the feature approximation
+    pending = np.array([[0.9, 0.9], [0.9, 0.1]])
+    inputs  = npr.rand(15,2)*0.5
+    vals    = np.sin(3*inputs).sum(1)
+
+    gp = GP(2, burnin=5, mcmc_iters=3, num_fantasies=1, likelihood='noiseless')
+    gp.fit(inputs, vals, pending)
+
+    sample = RandomFeatureSample(gp, 2000)
+    assert np.allclose(sample(pending), gp.values[-2:], atol=0.05)
+    assert np.allclose(sample(inputs), vals, atol=0.05)
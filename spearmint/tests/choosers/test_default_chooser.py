@@ -0,0 +1,349 @@
+# -*- coding: utf-8 -*-
+# Spearmint
+#
+# Academic and Non-Commercial Research Use Software License and Terms
+# of Use
+#
+# Spearmint is a software package to perform Bayesian optimization
+# according to specific algorithms (the “Software”).  The Software is
+# designed to automatically run experiments (thus the code name
+# 'spearmint') in a manner that iteratively adjusts a number of
+# parameters so as to minimize some objective in as few runs as
+# possible.
+#
+# The Software was developed by Ryan P. Adams, Michael Gelbart, and
+# Jasper Snoek at Harvard University, Kevin Swersky at the
+# University of Toronto (“Toronto”), and Hugo Larochelle at the
+# Université de Sherbrooke (“Sherbrooke”), which assigned its rights
+# in the Software to Socpra Sciences et Génie
+# S.E.C. (“Socpra”). Pursuant to an inter-institutional agreement
+# between the parties, it is distributed for free academic and
+# non-commercial research use by the President and Fellows of Harvard
+# College (“Harvard”).
+#
+# Using the Software indicates your agreement to be bound by the terms
+# of this Software Use Agreement (“Agreement”). Absent your agreement
+# to the terms below, you (the “End User”) have no rights to hold or
+# use the Software whatsoever.
+#
+# Harvard agrees to grant hereunder the limited non-exclusive license
+# to End User for the use of the Software in the performance of End
+# User’s internal, non-commercial research and academic use at End
+# User’s academic or not-for-profit research institution
+# (“Institution”) on the following terms and conditions:
+#
+# 1.  NO REDISTRIBUTION. The Software remains the property Harvard,
+# Toronto and Socpra, and except as set forth in Section 4, End User
+# shall not publish, distribute, or otherwise transfer or make
+# available the Software to any other party.
+#
+# 2.  NO COMMERCIAL USE. End User shall not use the Software for
+# commercial purposes and any such use of the Software is expressly
+# prohibited. This includes, but is not limited to, use of the
+# Software in fee-for-service arrangements, core facilities or
+# laboratories or to provide research services to (or in collaboration
+# with) third parties for a fee, and in industry-sponsored
+# collaborative research projects where any commercial rights are
+# granted to the sponsor. If End User wishes to use the Software for
+# commercial purposes or for any other restricted purpose, End User
+# must execute a separate license agreement with Harvard.
+#
+# Requests for use of the Software for commercial purposes, please
+# contact:
+#
+# Office of Technology Development
+# Harvard University
+# Smith Campus Center, Suite 727E
+# 1350 Massachusetts Avenue
+# Cambridge, MA 02138 USA
+# Telephone: (617) 495-3067
+# Facsimile: (617) 495-9568
+# E-mail: otd@harvard.edu
+#
+# 3.  OWNERSHIP AND COPYRIGHT NOTICE. Harvard, Toronto and Socpra own
+# all intellectual property in the Software. End User shall gain no
+# ownership to the Software. End User shall not remove or delete and
+# shall retain in the Software, in any modifications to Software and
+# in any Derivative Works, the copyright, trademark, or other notices
+# pertaining to Software as provided with the Software.
+#
+# 4.  DERIVATIVE WORKS. End User may create and use Derivative Works,
+# as such term is defined under U.S. copyright laws, provided that any
+# such Derivative Works shall be restricted to non-commercial,
+# internal research and academic use at End User’s Institution. End
+# User may distribute Derivative Works to other Institutions solely
+# for the performance of non-commercial, internal research and
+# academic use on terms substantially similar to this License and
+# Terms of Use.
+#
+# 5.  FEEDBACK. In order to improve the Software, comments from End
+# Users may be useful. End User agrees to provide Harvard with
+# feedback on the End User’s use of the Software (e.g., any bugs in
+# the Software, the user experience, etc.).  Harvard is permitted to
+# use such information provided by End User in making changes and
+# improvements to the Software without compensation or an accounting
+# to End User.
+#
+# 6.  NON ASSERT. End User acknowledges that Harvard, Toronto and/or
+# Sherbrooke or Socpra may develop modifications to the Software that
+# may be based on the feedback provided by End User under Section 5
+# above. Harvard, Toronto and Sherbrooke/Socpra shall not be
+# restricted in any way by End User regarding their use of such
+# information.  End User acknowledges the right of Harvard, Toronto
+# and Sherbrooke/Socpra to prepare, publish, display, reproduce,
+# transmit and or use modifications to the Software that may be
+# substantially similar or functionally equivalent to End User’s
+# modifications and/or improvements if any.  In the event that End
+# User obtains patent protection for any modification or improvement
+# to Software, End User agrees not to allege or enjoin infringement of
+# End User’s patent against Harvard, Toronto or Sherbrooke or Socpra,
+# or any of the researchers, medical or research staff, officers,
+# directors and employees of those institutions.
+#
+# 7.  PUBLICATION & ATTRIBUTION. End User has the right to publish,
+# present, or share results from the use of the Software.  In
+# accordance with customary academic practice, End User will
+# acknowledge Harvard, Toronto and Sherbrooke/Socpra as the providers
+# of the Software and may cite the relevant reference(s) from the
+# following list of publications:
+#
+# Practical Bayesian Optimization of Machine Learning Algorithms
+# Jasper Snoek, Hugo Larochelle and Ryan Prescott Adams
+# Neural Information Processing Systems, 2012
+#
+# Multi-Task Bayesian Optimization
+# Kevin Swersky, Jasper Snoek and Ryan Prescott Adams
+# Advances in Neural Information Processing Systems, 2013
+#
+# Input Warping for Bayesian Optimization of Non-stationary Functions
+# Jasper Snoek, Kevin Swersky, Richard Zemel and Ryan Prescott Adams
+# Preprint, arXiv:1402.0929, http://arxiv.org/abs/1402.0929, 2013
+#
+# Bayesian Optimization and Semiparametric Models with Applications to
+# Assistive Technology Jasper Snoek, PhD Thesis, University of
+# Toronto, 2013
+#
+# 8.  NO WARRANTIES. THE SOFTWARE IS PROVIDED "AS IS." TO THE FULLEST
+# EXTENT PERMITTED BY LAW, HARVARD, TORONTO AND SHERBROOKE AND SOCPRA
+# HEREBY DISCLAIM ALL WARRANTIES OF ANY KIND (EXPRESS, IMPLIED OR
+# OTHERWISE) REGARDING THE SOFTWARE, INCLUDING BUT NOT LIMITED TO ANY
+# IMPLIED WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+# PURPOSE, OWNERSHIP, AND NON-INFRINGEMENT.  HARVARD, TORONTO AND
+# SHERBROOKE AND SOCPRA MAKE NO WARRANTY ABOUT THE ACCURACY,
+# RELIABILITY, COMPLETENESS, TIMELINESS, SUFFICIENCY OR QUALITY OF THE
+# SOFTWARE.  HARVARD, TORONTO AND SHERBROOKE AND SOCPRA DO NOT WARRANT
+# THAT THE SOFTWARE WILL OPERATE WITHOUT ERROR OR INTERRUPTION.
+#
+# 9.  LIMITATIONS OF LIABILITY AND REMEDIES. USE OF THE SOFTWARE IS AT
+# END USER’S OWN RISK. IF END USER IS DISSATISFIED WITH THE SOFTWARE,
+# ITS EXCLUSIVE REMEDY IS TO STOP USING IT.  IN NO EVENT SHALL
+# HARVARD, TORONTO OR SHERBROOKE OR SOCPRA BE LIABLE TO END USER OR
+# ITS INSTITUTION, IN CONTRACT, TORT OR OTHERWISE, FOR ANY DIRECT,
+# INDIRECT, SPECIAL, INCIDENTAL, CONSEQUENTIAL, PUNITIVE OR OTHER
+# DAMAGES OF ANY KIND WHATSOEVER ARISING OUT OF OR IN CONNECTION WITH
+# THE SOFTWARE, EVEN IF HARVARD, TORONTO OR SHERBROOKE OR SOCPRA IS
+# NEGLIGENT OR OTHERWISE AT FAULT, AND REGARDLESS OF WHETHER HARVARD,
+# TORONTO OR SHERBROOKE OR SOCPRA IS ADVISED OF THE POSSIBILITY OF
+# SUCH DAMAGES.
+#
+# 10. INDEMNIFICATION. To the extent permitted by law, End User shall
+# indemnify, defend and hold harmless Harvard, Toronto and Sherbrooke
+# and Socpra, their corporate affiliates, current or future directors,
+# trustees, officers, faculty, medical and professional staff,
+# employees, students and agents and their respective successors,
+# heirs and assigns (the "Indemnitees"), against any liability,
+# damage, loss or expense (including reasonable attorney's fees and
+# expenses of litigation) incurred by or imposed upon the Indemnitees
+# or any one of them in connection with any claims, suits, actions,
+# demands or judgments arising from End User’s breach of this
+# Agreement or its Institution’s use of the Software except to the
+# extent caused by the gross negligence or willful misconduct of
+# Harvard, Toronto or Sherbrooke or Socpra. This indemnification
+# provision shall survive expiration or termination of this Agreement.
+#
+# 11. GOVERNING LAW. This Agreement shall be construed and governed by
+# the laws of the Commonwealth of Massachusetts regardless of
+# otherwise applicable choice of law standards.
+#
+# 12. NON-USE OF NAME.  Nothing in this License and Terms of Use shall
+# be construed as granting End Users or their Institutions any rights
+# or licenses to use any trademarks, service marks or logos associated
+# with the Software.  You may not use the terms “Harvard” or
+# “University of Toronto” or “Université de Sherbrooke” or “Socpra
+# Sciences et Génie S.E.C.” (or a substantially similar term) in any
+# way that is inconsistent with the permitted uses described
+# herein. You agree not to use any name or emblem of Harvard, Toronto
+# or Sherbrooke, or any of their subdivisions for any purpose, or to
+# falsely suggest any relationship between End User (or its
+# Institution) and Harvard, Toronto and/or Sherbrooke, or in any
+# manner that would infringe or violate any of their rights.
+#
+# 13. End User represents and warrants that it has the legal authority
+# to enter into this License and Terms of Use on behalf of itself and
+# its Institution.
+
+
+import numpy        as np
+import numpy.random as npr
+
+from collections import OrderedDict
+
+from spearmint.choosers                import default_chooser
+from spearmint.choosers.default_chooser import DEFAULT_ADAPTIVE_GRID_MIN, DEFAULT_ADAPTIVE_GRID_PER_DIM
+from spearmint.tasks.task_group        import TaskGroup
+
+# Short chains keep the model fits fast
+TASK_OPTIONS = {'burnin' : 5, 'mcmc_iters' : 2}
+
+def create_task_group(N, D, num_pending=2, constrained=False):
+    variables = OrderedDict([('x%d' % i, {'type' : 'FLOAT', 'size' : 1, 'min' : -5, 'max' : 10}) for i in xrange(D)])
+
+    tasks = {'main' : dict(TASK_OPTIONS, type='OBJECTIVE', likelihood='GAUSSIAN')}
+    if constrained:
+        tasks['con'] = dict(TASK_OPTIONS, type='CONSTRAINT', likelihood='BINOMIAL')
+
+    task_group = TaskGroup(tasks, variables)
+
+    inputs = npr.rand(N,D)*15 - 5
+    values = {'main' : np.sum((inputs - 1)**2, axis=1)}
+    if constrained:
+        values['con'] = (inputs[:,0] > 0).astype(float)
+
+    task_group.inputs  = inputs
+    task_group.pending = npr.rand(num_pending,D)*15 - 5
+    task_group.values  = values
+
+    return task_group, tasks
+
+def fit_chooser(task_group, tasks, **options):
+    chooser = default_chooser.init(options)
+    chooser.fit(task_group, None, tasks)
+
+    return chooser
+
+def test_adaptive_grid_size():
+    npr.seed(1)
+
+    for N, D in [(5,2), (50,2), (5,10), (50,10)]:
+        task_group, tasks = create_task_group(N, D)
+
+        # The Sobol design grows with the dimensions, and the visited
+        # and pending points are added to it
+        design  = max(DEFAULT_ADAPTIVE_GRID_MIN, DEFAULT_ADAPTIVE_GRID_PER_DIM*D)
+        chooser = fit_chooser(task_group, tasks, **{'adaptive-grid' : True})
+        assert chooser.initial_grid_size() == design
+        assert chooser.grid.shape == (design+N+2, D)
+
+        # It is capped by grid_size, the full grid without adaptation
+        chooser = fit_chooser(task_group, tasks, **{'adaptive-grid' : True, 'grid_size' : 300})
+        assert chooser.grid.shape == (300+N+2, D)
+        chooser = fit_chooser(task_group, tasks, grid_size=3000)
+        assert chooser.grid.shape == (3000+N+2, D)
+
+def test_adaptive_candidates():
+    npr.seed(1)
+
+    D = 2
+    task_group, tasks = create_task_group(20, D)
+
+    # Each round adds num-spray perturbations of the top grid-subset
+    # candidates and of the current best
+    per_round = (5+1)*4
+    options   = {'adaptive-grid' : True, 'grid-subset' : 5, 'num-spray' : 4, 'adaptive-grid-tol' : -np.inf}
+
+    chooser = fit_chooser(task_group, tasks, **options)
+    chooser.cache_grid_predictions()
+    current_best, current_best_location = chooser.best()
+    cand, cand_acq = chooser.adaptive_candidates(current_best, current_best_location)
+
+    assert cand.shape == (chooser.grid.shape[0] + chooser.adaptive_rounds*per_round, D)
+    assert cand_acq.shape == (cand.shape[0],)
+    assert np.all(cand >= 0) and np.all(cand <= 1)
+
+    # Candidate generation stops growing once grid_size is reached
+    chooser = fit_chooser(task_group, tasks, grid_size=DEFAULT_ADAPTIVE_GRID_MIN+per_round, **options)
+    chooser.cache_grid_predictions()
+    current_best, current_best_location = chooser.best()
+    cand, cand_acq = chooser.adaptive_candidates(current_best, current_best_location)
+
+    assert chooser.grid.shape[0] == DEFAULT_ADAPTIVE_GRID_MIN+20+2
+    assert cand.shape[0] == chooser.grid.shape[0] + per_round
+
+def test_diagnostics():
+    npr.seed(1)
+
+    task_group, tasks = create_task_group(20, 2, constrained=True)
+    for task_options in tasks.values():
+        task_options['mcmc_iters'] = 10
+    chooser = fit_chooser(task_group, tasks)
+
+    # One set of chain diagnostics per task, to record with the suggestion
+    diagnostics = chooser.diagnostics()
+    assert sorted(diagnostics.keys()) == ['con', 'main']
+    for task_diagnostics in diagnostics.values():
+        assert task_diagnostics['num samples'] == 10
+
+def test_grid_time_budget():
+    npr.seed(1)
+
+    D = 2
+    task_group, tasks = create_task_group(20, D)
+
+    # Without a budget the whole grid is predicted and evaluated
+    chooser = fit_chooser(task_group, tasks, grid_size=3000, **{'chunk-size' : 500})
+    chooser.cache_grid_predictions()
+    current_best, current_best_location = chooser.best()
+    cand, cand_acq = chooser.acquisition_over_candidates(chooser.grid, current_best)
+    assert cand.shape == (3000+20+2, D)
+    assert cand_acq.shape == (cand.shape[0],)
+
+    # A budget that has run out stops after the first chunk of the grid
+    chooser = fit_chooser(task_group, tasks, grid_size=3000, **{'chunk-size' : 500, 'suggestion-time-budget' : 1e-6})
+    chooser.cache_grid_predictions()
+    assert chooser.grid.shape == (500, D)
+
+    current_best, current_best_location = chooser.best()
+    cand, cand_acq = chooser.acquisition_over_candidates(chooser.grid, current_best)
+    assert cand.shape == (500, D)
+    assert cand_acq.shape == (500,)
+
+    suggestion = chooser.suggest()
+    assert suggestion.shape == (D,)
+
+    # No optimizer restart finishes, so the grid point is suggested
+    verbose = default_chooser.VERBOSE
+    default_chooser.VERBOSE = True
+    try:
+        suggestion = chooser.suggest()
+    finally:
+        default_chooser.VERBOSE = verbose
+    assert suggestion.shape == (D,)
+
+def test_optimize_batch():
+    npr.seed(1)
+
+    D = 3
+    task_group, tasks = create_task_group(20, D)
+    chooser = fit_chooser(task_group, tasks, **{'chooser-args' : {'optimizer' : 'batch'}})
+    chooser.cache_grid_predictions()
+    current_best, current_best_location = chooser.best()
+
+    # The top of the grid, as in suggest(), and points on the boundary
+    grid_pred, grid_ei = chooser.acquisition_over_candidates(chooser.grid, current_best)
+    start = np.vstack((grid_pred[np.argsort(grid_ei)[-10:]], npr.randint(2, size=(5,D))))
+    start = np.array(list(set([tuple(x) for x in start])))
+
+    opt = np.vstack(chooser.optimize_batch(start, current_best))
+    assert opt.shape == start.shape
+    assert np.all(opt >= 0) and np.all(opt <= 1)
+    assert len(set([tuple(x) for x in opt])) == opt.shape[0]
+
+    # Each point only takes steps that increase the acquisition function
+    start_acq = chooser.acquisition_function_over_hypers(start, current_best, compute_grad=False)
+    opt_acq   = chooser.acquisition_function_over_hypers(opt, current_best, compute_grad=False)
+    assert np.all(opt_acq >= start_acq)
+    assert np.any(opt_acq > start_acq)
+
+    # Past the deadline the starting points are returned as they are
+    opt = np.vstack(chooser.optimize_batch(start, current_best, deadline=0.0))
+    assert np.array_equal(opt, start)
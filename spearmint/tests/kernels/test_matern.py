@@ -217,3 +217,22 @@ def test_matern_grad():
 
 
 
+
+def test_cov_cache():
+    npr.seed(1)
+
+    N = 20
+    D = 3
+
+    kernel = Matern52(D)
+    data   = npr.rand(N,D)
+
+    # Component-wise changes as in slice sampling go through the cache
+    for i in xrange(30):
+        kernel.ls.value = kernel.ls.value.copy()
+        kernel.ls.value[i % D] = npr.rand() + 0.1
+        if i % 4 == 0:
+            data = data.copy()
+            data[:,i % D] = npr.rand(N)
+
+        np.testing.assert_allclose(kernel.cov(data), kernel.cross_cov(data, data), rtol=1e-10, atol=1e-12)
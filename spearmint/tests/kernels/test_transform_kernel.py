@@ -185,7 +185,7 @@
 import numpy        as np
 import numpy.random as npr
 
-from spearmint.kernels         import Matern52, TransformKernel
+from spearmint.kernels         import Matern52, Noise, Scale, SumKernel, TransformKernel
 from spearmint.transformations import BetaWarp, Normalization, Linear, Transformer
 
 def test_grad():
@@ -225,5 +225,46 @@ def test_grad():
 
     assert np.linalg.norm(dloss - dloss_est) < 1e-6
 
+def test_grad_hypers():
+    npr.seed(1)
+
+    eps = 1e-6
+    N   = 10
+    D   = 5
+
+    beta_warp   = BetaWarp(2)
+    norm        = Normalization(2)
+    transformer = Transformer(D)
+    transformer.add_layer((beta_warp,[0,2]), (norm, [1,4]))
+
+    matern = Matern52(D)
+    scale  = Scale(matern)
+    noise  = Noise(D)
+    kernel = TransformKernel(SumKernel(scale, noise), transformer)
+
+    matern.ls.value       = npr.rand(D) + 0.5
+    beta_warp.alpha.value = npr.rand(2) + 0.5
+    beta_warp.beta.value  = npr.rand(2) + 0.5
+    scale.amp2.value      = 1.5
+    noise.noise.value     = 0.1
+
+    data = npr.rand(N,D)
+    V    = npr.randn(N,N)
+
+    grads = kernel.cov_grad_hypers(data, V)
+    assert set([id(hyper) for hyper, grad in grads]) == set([id(h) for h in (matern.ls, beta_warp.alpha, beta_warp.beta, scale.amp2, noise.noise)])
 
+    for hyper, grad in grads:
+        value    = np.atleast_1d(np.array(hyper.value, dtype=float))
+        grad_est = np.zeros(value.shape)
+        for i in xrange(value.size):
+            step    = np.zeros(value.shape)
+            step[i] = eps
+            hyper.value = value + step if hyper.isArray else value[0] + eps
+            loss_1      = np.sum(V*kernel.cov(data))
+            hyper.value = value - step if hyper.isArray else value[0] - eps
+            loss_2      = np.sum(V*kernel.cov(data))
+            grad_est[i] = (loss_1 - loss_2) / (2*eps)
+        hyper.value = value if hyper.isArray else value[0]
 
+        assert np.linalg.norm(grad - grad_est) < 1e-6
@@ -185,7 +185,10 @@
 import numpy        as np
 import numpy.random as npr
 
-from spearmint.models import GP
+from spearmint.models            import GP
+from spearmint.models            import gp as gp_module
+from spearmint.models.gp         import past_deadline as real_past_deadline
+from spearmint.utils.compression import compress_nested_container, decompress_nested_container
 
 def test_gp_init():
     gp = GP(5)
@@ -278,3 +281,182 @@ def test_predict():
     assert np.linalg.norm(dloss - dloss_est) < 1e-6
 
 
+
+def test_cache_predictions():
+    npr.seed(1)
+
+    N = 10
+    D = 3
+
+    gp = GP(D, burnin=5, mcmc_iters=3)
+
+    inputs  = npr.rand(N,D)
+    pending = npr.rand(2,D)
+    vals    = inputs.sum(1) + np.sqrt(1e-3)*npr.randn(N)
+    grid    = npr.rand(20,D)
+
+    gp.fit(inputs, vals, pending)
+    gp.cache_predictions(grid)
+
+    # The cached predictions match fresh ones in every state
+    for i in xrange(gp.num_states):
+        gp.set_state(i)
+        mu, v = gp.predict(grid)
+        mu_new, v_new = gp.predict(grid.copy())
+        assert not mu.flags.writeable
+        np.testing.assert_allclose(mu, mu_new)
+        np.testing.assert_allclose(v, v_new)
+
+    # Blocks of rows are cached next to each other
+    blocks = [grid[:10], grid[10:]]
+    gp.cache_predictions(blocks[0])
+    gp.cache_predictions(blocks[1], keep=True)
+    assert not gp.predict(blocks[0])[0].flags.writeable
+    assert not gp.predict(blocks[1])[0].flags.writeable
+    assert gp.predict(grid)[0].flags.writeable
+
+    # Refitting drops them
+    gp.cache_predictions(grid)
+    gp.fit(inputs, vals)
+    assert gp.predict(grid)[0].flags.writeable
+
+def test_resume_chain():
+    npr.seed(1)
+
+    N = 10
+    D = 3
+
+    inputs = npr.rand(N,D)
+    vals   = inputs.sum(1) + np.sqrt(1e-3)*npr.randn(N)
+
+    gp_dict = GP(D, burnin=5, mcmc_iters=3).fit(inputs, vals)
+    assert gp_dict['chain length'] == 8
+
+    # The samples are saved as one array per hyper and the RNG as a seed
+    assert all([values.shape[0] == 3 for values in gp_dict['samples'].values()])
+    assert isinstance(gp_dict['chain state']['seed'], int)
+
+    # The chain continues from the saved state, also after a round trip
+    # through the database format, whatever the global random state
+    saved = decompress_nested_container(compress_nested_container(gp_dict))
+
+    npr.seed(2)
+    resumed = GP(D, burnin=5, mcmc_iters=3).fit(inputs, vals, hypers=gp_dict)
+    npr.seed(3)
+    restored = GP(D, burnin=5, mcmc_iters=3).fit(inputs, vals, hypers=saved)
+
+    assert resumed['chain length'] == restored['chain length'] == 11
+
+    # The slice widths adapted during burn-in are kept fixed afterwards
+    for sampler_dict, resumed_dict in zip(gp_dict['chain state']['samplers'], resumed['chain state']['samplers']):
+        np.testing.assert_array_equal(sampler_dict['sigma'], resumed_dict['sigma'])
+    assert gp_dict['chain state']['samplers'][1]['sigma'].shape == (3*D,)
+    for name in resumed['hypers']:
+        np.testing.assert_array_equal(resumed['hypers'][name], restored['hypers'][name])
+
+    # Without refitting, the saved samples are the states
+    gp = GP(D, burnin=5, mcmc_iters=3)
+    gp.fit(inputs, vals, hypers=saved, fit_hypers=False)
+    assert gp.num_states == 3
+
+def test_chain_random_state():
+    npr.seed(1)
+
+    N = 10
+    D = 3
+
+    inputs = npr.rand(N,D)
+    vals   = inputs.sum(1) + np.sqrt(1e-3)*npr.randn(N)
+
+    # The chains draw from RNGs of their own and leave the global one as it was
+    gp_a   = GP(D, burnin=5, mcmc_iters=3)
+    gp_b   = GP(D, burnin=5, mcmc_iters=3)
+    state  = npr.get_state()
+    dict_a = gp_a.fit(inputs, vals)
+    dict_b = gp_b.fit(inputs, -vals)
+
+    assert np.array_equal(npr.get_state()[1], state[1]) and npr.get_state()[2] == state[2]
+    assert dict_a['chain state']['seed'] != dict_b['chain state']['seed']
+
+    # The next fit of a chain does not depend on the fits of the other
+    # models in between
+    refit = GP(D, burnin=5, mcmc_iters=3).fit(inputs, vals, hypers=dict_a)
+    GP(D, burnin=5, mcmc_iters=3).fit(inputs, -vals, hypers=dict_b)
+    again = GP(D, burnin=5, mcmc_iters=3).fit(inputs, vals, hypers=dict_a)
+
+    for name in refit['hypers']:
+        np.testing.assert_array_equal(refit['hypers'][name], again['hypers'][name])
+
+def test_fit_ml():
+    npr.seed(1)
+
+    N = 20
+    D = 3
+
+    inputs = npr.rand(N,D)
+    vals   = np.sin(3*inputs).sum(1) + np.sqrt(1e-3)*npr.randn(N)
+
+    gp = GP(D, fit_method='ml')
+    gp.fit(inputs, vals)
+
+    assert gp.num_states == 1
+    assert gp.chain_length == 0
+
+    def log_posterior():
+        return gp.log_likelihood() + sum([p.prior_logprob() for p in gp.params.values()])
+
+    # The fit is a mode, so small moves of the hypers do not improve it
+    best   = log_posterior()
+    hypers = dict((name, p.value) for name, p in gp.params.iteritems())
+    for i in xrange(20):
+        for name, p in gp.params.iteritems():
+            p.value = hypers[name]*np.exp(1e-3*npr.randn(*np.shape(hypers[name])))
+        assert log_posterior() <= best + 1e-4
+
+def test_burnin_resume():
+    npr.seed(1)
+
+    N = 20
+    D = 2
+
+    inputs = npr.rand(N,D)
+    vals   = np.sin(3*inputs).sum(1) + 0.1*npr.randn(N)
+
+    # The chain is stationary before the full burn-in
+    gp     = GP(D, burnin=100, mcmc_iters=10)
+    hypers = gp.fit(inputs, vals)
+    assert gp.diagnostics['burn-in'] < 100
+    assert hypers['chain state']['burned in']
+
+    # Fitting again continues the chain without another burn-in
+    gp     = GP(D, burnin=100, mcmc_iters=10)
+    hypers = gp.fit(inputs, vals, hypers=hypers)
+    assert gp.diagnostics['burn-in'] == 0
+
+    # A burn-in that the deadline cuts short after 30 samples goes on in
+    # the next fit from where it stopped
+    checks = [0]
+    def past_deadline(deadline):
+        checks[0] += 1
+        return checks[0] > 30
+
+    gp_module.past_deadline = past_deadline
+    try:
+        gp     = GP(D, burnin=100, mcmc_iters=10)
+        hypers = gp.fit(inputs, vals, deadline=0.0)
+    finally:
+        gp_module.past_deadline = real_past_deadline
+    assert not hypers['chain state']['burned in']
+    assert hypers['chain state']['burn-in trace'].shape == (30,)
+
+    hypers = decompress_nested_container(compress_nested_container(hypers))
+    gp     = GP(D, burnin=100, mcmc_iters=10)
+    resumed = gp.fit(inputs, vals, hypers=hypers)
+    assert resumed['chain state']['burned in']
+    assert 'burn-in trace' not in resumed['chain state']
+
+    # The burn-in only counts the new samples, and ends at a check of
+    # the whole trace, including the samples of the first fit
+    num_burned = gp.diagnostics['burn-in']
+    assert gp.chain_length == hypers['chain length'] + num_burned + 10
+    assert 30 + num_burned >= 40 and (30 + num_burned) % 10 == 0
@@ -185,7 +185,8 @@
 import numpy        as np
 import numpy.random as npr
 
-from spearmint.models import GPClassifier
+from spearmint.models            import GPClassifier
+from spearmint.utils.compression import compress_nested_container, decompress_nested_container
 
 def test_gp_init():
     gp = GPClassifier(5)
@@ -200,14 +201,14 @@ def test_fit():
     num_pending   = 3
     num_fantasies = 2
 
-    gp = GPClassifier(D, burnin=burnin, mcmc_iters=mcmc_iters, num_fantasies=num_fantasies)
-    
     inputs     = np.vstack((0.1*npr.rand(N,D),npr.rand(N,D)))
     inputs[12] = np.ones(D)
     pending    = npr.rand(3,D)
     W          = npr.randn(D,1)
     vals       = (inputs - inputs.mean(0)).dot(W).flatten() > 0
 
+    # The model seeds its chain from the global RNG, so it is built after the data
+    gp = GPClassifier(D, burnin=burnin, mcmc_iters=mcmc_iters, num_fantasies=num_fantasies)
     gp.fit(inputs, vals, pending)
 
     probs = np.zeros(inputs.shape[0])
@@ -221,7 +222,9 @@ def test_fit():
 
     assert gp.values.shape[1] == 2
 
-    assert gp.chain_length == burnin + mcmc_iters
+    # Burn-in ends early once the chain is stationary
+    assert gp.chain_length == gp.diagnostics['burn-in'] + mcmc_iters
+    assert gp.diagnostics['burn-in'] <= 3*burnin
     assert all([np.all(p.value != p.initial_value) for p in gp.params.values()])
     assert len(gp._cache_list) == mcmc_iters
     assert len(gp._hypers_list) == mcmc_iters
@@ -286,4 +289,62 @@ def test_predict():
             pred[i,j] += eps
             dloss_est[i,j] = ((loss_1 - loss_2) / (2*eps))
 
-    assert np.linalg.norm(dloss - dloss_est) < 1e-5
\ No newline at end of file
+    # The error of the finite differences grows with the gradient, which
+    # depends on the sampled hypers
+    assert np.linalg.norm(dloss - dloss_est) < 1e-5*max(1.0, 0.1*np.linalg.norm(dloss))
+
+def test_latent_values_dict():
+    npr.seed(1)
+
+    N = 10
+    D = 3
+
+    gp = GPClassifier(D, burnin=5, mcmc_iters=3)
+
+    inputs = npr.rand(N,D)
+    vals   = inputs[:,0] > 0.5
+
+    gp.fit(inputs, vals)
+    latent_values = gp.latent_values.value.copy()
+
+    gp_dict = decompress_nested_container(compress_nested_container(gp.to_dict()))
+
+    # Reorder the data and add a new point, which gets the default latent value
+    perm       = npr.permutation(N)
+    new_inputs = np.vstack((inputs[perm], npr.rand(1,D)))
+    new_vals   = np.append(vals[perm], True)
+
+    gp.fit(new_inputs, new_vals, hypers=gp_dict, fit_hypers=False)
+
+    np.testing.assert_array_equal(gp.latent_values.value, np.append(latent_values[perm], 0.5))
+
+def test_laplace():
+    npr.seed(1)
+
+    N = 20
+    D = 2
+
+    gp = GPClassifier(D, burnin=5, mcmc_iters=3, **{'latent-inference' : 'laplace'})
+
+    inputs = npr.rand(N,D)
+    vals   = inputs[:,0] > 0.5
+
+    gp.fit(inputs, vals)
+
+    # The latent values are at the mode of their posterior, f - m = K grad log p(y|f)
+    K = gp.noiseless_kernel.cov(inputs)
+    log_lik, grad, W = gp._likelihood_terms(gp.latent_values.value)
+    np.testing.assert_allclose(gp.latent_values.value - gp.mean.value, np.dot(K, grad), atol=1e-2)
+
+    pi = gp.function_over_hypers(gp.pi, inputs)
+    assert np.mean((pi > 0.5) == vals) > 0.8
+
+    # Evaluating other hypers, as a rejected proposal does, leaves the state alone
+    latent_values = gp.latent_values.value.copy()
+    pred          = gp.predict(inputs)
+    ls            = gp.params['ls'].value.copy()
+    gp.params['ls'].value = 2*ls
+    gp.log_likelihood()
+    gp.params['ls'].value = ls
+    np.testing.assert_array_equal(gp.latent_values.value, latent_values)
+    np.testing.assert_array_equal(gp.predict(inputs)[0], pred[0])
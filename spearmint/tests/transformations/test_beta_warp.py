@@ -182,16 +182,24 @@
 # to enter into this License and Terms of Use on behalf of itself and
 # its Institution.
 
+import sys
+import timeit
 import warnings
 
-import numpy        as np
-import numpy.random as npr
+import numpy         as np
+import numpy.random  as npr
+import scipy.stats   as sps
+import scipy.special as spe
 
-from nose.tools import assert_raises
+from scipy.integrate import quad
 
-from spearmint.transformations import BetaWarp
-from spearmint.utils           import priors
-from spearmint.utils.param     import Param as Hyperparameter
+from nose.tools          import assert_raises
+from nose.plugins.attrib import attr
+
+from spearmint.transformations           import BetaWarp
+from spearmint.transformations.beta_warp import beta_cdf, beta_pdf, beta_cdf_grad
+from spearmint.utils                     import priors
+from spearmint.utils.param               import Param as Hyperparameter
 
 def test_validation():
     warnings.filterwarnings('error')
@@ -256,4 +264,137 @@ def test_backward_pass():
     bw.forward_pass(data)
     assert np.all(bw.backward_pass(v) == 0.53033008588991071*v)
 
+def test_matches_scipy_stats():
+    npr.seed(1)
+
+    N = 50
+    D = 4
+
+    # Parameters on both sides of 1, where the pdf is infinite or zero
+    # at the ends of the interval, and inputs that include the ends
+    bw = BetaWarp(D)
+    bw.alpha.value = np.array([0.3, 1.0, 2.5, 7.0])
+    bw.beta.value  = np.array([4.0, 0.5, 1.0, 0.2])
+
+    data = npr.rand(N,D)
+    data[0] = 0.0
+    data[1] = 1.0
+    V = npr.randn(N,D)
+
+    # The warp and its gradient as they were computed through scipy.stats
+    expected_out = sps.beta.cdf(data, bw.alpha.value, bw.beta.value)
+    expected_dx  = sps.beta.pdf(data, bw.alpha.value, bw.beta.value)
+    expected_dx[np.logical_not(np.isfinite(expected_dx))] = 1.0
+
+    assert np.allclose(bw.forward_pass(data), expected_out, rtol=1e-12, atol=0)
+    assert np.allclose(bw.backward_pass(V), expected_dx*V, rtol=1e-12, atol=0)
+    assert np.allclose(bw.backward_pass(V, data), expected_dx*V, rtol=1e-12, atol=0)
+
+    # The forward pass cache rewarps only the columns whose parameters
+    # changed, and gives the same result as warping from scratch
+    bw.alpha.value = bw.alpha.value.copy()
+    bw.alpha.value[2] = 1.5
+    assert np.allclose(bw.forward_pass(data), sps.beta.cdf(data, bw.alpha.value, bw.beta.value), rtol=1e-12, atol=0)
+
+def test_backward_pass_hypers():
+    npr.seed(1)
+
+    N = 50
+    D = 4
+
+    bw = BetaWarp(D)
+    bw.alpha.value = np.array([0.3, 1.0, 2.5, 7.0])
+    bw.beta.value  = np.array([4.0, 0.5, 1.0, 0.2])
+
+    data = npr.rand(N,D)
+    data[0] = 0.0
+    data[1] = 1.0
+    V = npr.randn(N,D)
+
+    bw.forward_pass(data)
+    grads = bw.backward_pass_hypers(V)
+    assert [hyper for hyper, grad in grads] == [bw.alpha, bw.beta]
+
+    # Richardson extrapolation of central differences, whose error is of
+    # fourth order, shows that the series are accurate to many digits
+    def loss(hyper, value):
+        hyper.value = value
+        return np.sum(V*sps.beta.cdf(data, bw.alpha.value, bw.beta.value), axis=0)
+
+    for hyper, grad in grads:
+        value = hyper.value.copy()
+        h     = 1e-3*value
+        d_1   = (loss(hyper, value+h) - loss(hyper, value-h)) / (2*h)
+        d_2   = (loss(hyper, value+2*h) - loss(hyper, value-2*h)) / (4*h)
+        hyper.value = value
+
+        np.testing.assert_allclose(grad, (4*d_1 - d_2)/3, rtol=1e-7)
+
+def test_beta_cdf_grad():
+    # The derivatives of the regularized incomplete beta function, as the
+    # integrals of log(t) and log(1-t) times the beta pdf, by quadrature
+    def expected(x, alpha, beta):
+        if x in [0.0, 1.0]:
+            return 0.0, 0.0
+
+        log_beta = spe.betaln(alpha, beta)
+        cdf      = spe.betainc(alpha, beta, x)
+        pdf      = lambda t: np.exp((alpha-1)*np.log(t) + (beta-1)*np.log1p(-t) - log_beta)
+        d_alpha  = quad(lambda t: np.log(t)*pdf(t), 0, x, epsabs=1e-14, limit=200)[0]
+        d_beta   = quad(lambda t: np.log1p(-t)*pdf(t), 0, x, epsabs=1e-14, limit=200)[0]
+        return (d_alpha - cdf*(spe.psi(alpha) - spe.psi(alpha+beta)),
+                d_beta - cdf*(spe.psi(beta) - spe.psi(alpha+beta)))
+
+    alpha = np.array([0.3, 1.0, 2.5, 7.0])
+    beta  = np.array([4.0, 0.5, 1.0, 0.2])
+    data  = np.array([[0.0, 1e-3, 0.3, 0.5],
+                      [0.5, 0.7, 0.999, 1.0],
+                      [0.2, 0.5, 0.8, 0.9]])
+
+    d_alpha, d_beta = beta_cdf_grad(data, alpha, beta)
+    for i in xrange(data.shape[0]):
+        for j in xrange(data.shape[1]):
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                e_alpha, e_beta = expected(data[i,j], alpha[j], beta[j])
+            assert np.allclose([d_alpha[i,j], d_beta[i,j]], [e_alpha, e_beta], rtol=1e-8, atol=1e-12)
+
+    # A single input has one derivative per dimension
+    d_alpha_row, d_beta_row = beta_cdf_grad(data[2], alpha, beta)
+    assert np.allclose(d_alpha_row, d_alpha[2], rtol=1e-12) and np.allclose(d_beta_row, d_beta[2], rtol=1e-12)
+
+@attr('slow')
+def test_benchmark():
+    # Times the warp and its gradient against the scipy.stats path they
+    # replaced, which also copied the inputs on every call, and reports the
+    # speedup and the largest error. Run with: nosetests -s -a slow
+    npr.seed(1)
+
+    D     = 4
+    alpha = np.array([0.3, 1.0, 2.5, 7.0])
+    beta  = np.array([4.0, 0.5, 1.0, 0.2])
+
+    def scipy_stats_path(data):
+        return sps.beta.cdf(data.copy(), alpha, beta), sps.beta.pdf(data.copy(), alpha, beta)
+
+    def special_path(data, log_beta):
+        return beta_cdf(data, alpha, beta), beta_pdf(data, alpha, beta, log_beta)
+
+    for N in [20, 200, 20000]:
+        data     = npr.rand(N,D)
+        log_beta = spe.betaln(alpha, beta)
+
+        old_time = min(timeit.repeat(lambda: scipy_stats_path(data), number=10, repeat=3))
+        new_time = min(timeit.repeat(lambda: special_path(data, log_beta), number=10, repeat=3))
+
+        old_cdf, old_pdf = scipy_stats_path(data)
+        new_cdf, new_pdf = special_path(data, log_beta)
+        cdf_error = np.max(np.abs(new_cdf - old_cdf))
+        pdf_error = np.max(np.abs(new_pdf - old_pdf)/old_pdf)
+
+        sys.stderr.write('BetaWarp N=%d D=%d: speedup %.2fx, max abs cdf error %.3g, max rel pdf error %.3g\n'
+                         % (N, D, old_time/new_time, cdf_error, pdf_error))
 
+        assert new_time < old_time
+        assert cdf_error < 1e-12
+        assert pdf_error < 1e-12
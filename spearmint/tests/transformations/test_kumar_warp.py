@@ -257,3 +257,40 @@ def test_backward_pass():
     assert np.all(bw.backward_pass(v) == 0.5773502691896257*v)
 
 
+
+def test_backward_pass_hypers():
+    npr.seed(1)
+
+    eps = 1e-6
+    N   = 10
+    D   = 3
+
+    kw = KumarWarp(D)
+    kw.alpha.value = npr.rand(D) + 0.5
+    kw.beta.value  = npr.rand(D) + 0.5
+
+    # The derivatives vanish at the ends of the unit interval
+    data = npr.rand(N,D)
+    data[0] = 0.0
+    data[1] = 1.0
+    V    = npr.randn(N,D)
+
+    kw.forward_pass(data)
+    grads = kw.backward_pass_hypers(V)
+    assert [hyper for hyper, grad in grads] == [kw.alpha, kw.beta]
+
+    for hyper, grad in grads:
+        value    = hyper.value.copy()
+        grad_est = np.zeros(D)
+        for i in xrange(D):
+            step    = np.zeros(D)
+            step[i] = eps
+            hyper.value = value + step
+            loss_1      = np.sum(V*kw.forward_pass(data))
+            hyper.value = value - step
+            loss_2      = np.sum(V*kw.forward_pass(data))
+            grad_est[i] = (loss_1 - loss_2) / (2*eps)
+        hyper.value = value
+
+        assert np.all(np.isfinite(grad))
+        np.testing.assert_allclose(grad, grad_est, rtol=1e-6)
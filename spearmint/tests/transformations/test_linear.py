@@ -221,3 +221,33 @@ def test_backward_pass():
 
 
 
+
+def test_backward_pass_hypers():
+    npr.seed(1)
+
+    eps = 1e-5
+    N   = 10
+    D   = 5
+
+    lin = Linear(D)
+
+    data = 0.5*npr.rand(N,D)
+    V    = npr.randn(N,lin.num_factors)
+
+    lin.forward_pass(data)
+    [(hyper, grad)] = lin.backward_pass_hypers(V)
+    assert hyper is lin.weights
+
+    value    = hyper.value.copy()
+    grad_est = np.zeros(value.shape)
+    for i in xrange(value.size):
+        step    = np.zeros(value.shape)
+        step[i] = eps
+        hyper.value = value + step
+        loss_1      = np.sum(V*lin.forward_pass(data))
+        hyper.value = value - step
+        loss_2      = np.sum(V*lin.forward_pass(data))
+        grad_est[i] = (loss_1 - loss_2) / (2*eps)
+    hyper.value = value
+
+    assert np.linalg.norm(grad - grad_est) < 1e-6
@@ -221,3 +221,39 @@ def test_backward_pass():
 
 
 
+
+def test_backward_pass_hypers():
+    npr.seed(1)
+
+    eps = 1e-5
+    N   = 10
+    D   = 5
+
+    nl = NormLin(D)
+
+    data  = npr.rand(N,D)
+    other = npr.rand(N,D)
+    V     = npr.randn(N,nl.output_num_dims())
+
+    nl.forward_pass(data)
+    [(hyper, grad)] = nl.backward_pass_hypers(V)
+    assert hyper is nl.hypers
+
+    # Given other inputs, the inputs of the forward pass are kept
+    [(hyper, grad_other)] = nl.backward_pass_hypers(V, other)
+    np.testing.assert_array_equal(nl.backward_pass_hypers(V)[0][1], grad)
+
+    for inputs, g in [(data, grad), (other, grad_other)]:
+        value    = hyper.value.copy()
+        grad_est = np.zeros(value.shape)
+        for i in xrange(value.size):
+            step    = np.zeros(value.shape)
+            step[i] = eps
+            hyper.value = value + step
+            loss_1      = np.sum(V*nl.forward_pass(inputs))
+            hyper.value = value - step
+            loss_2      = np.sum(V*nl.forward_pass(inputs))
+            grad_est[i] = (loss_1 - loss_2) / (2*eps)
+        hyper.value = value
+
+        assert np.linalg.norm(g - grad_est) < 1e-6
@@ -276,6 +276,24 @@ def test_forward_pass_2():
     assert np.all(outputs == np.array([[4, 4, 4, 4, 4, 4, 4, 2, 2, 2],
             [8, 8, 8, 8, 8, 8, 8, 4, 4, 4]]))
 
+def test_forward_pass_read_only():
+    class OwnedOutput(SimpleTransformation):
+        # Returns an array that it keeps and writes to later
+        def forward_pass(self, inputs):
+            self.outputs = 2*inputs
+            return self.outputs
+
+    st = OwnedOutput(3)
+    t  = Transformer(3)
+    t.add_layer(st)
+
+    outputs = t.forward_pass(np.ones((2,3)))
+
+    # The shared result is read-only, the array of the transformation is not
+    assert not outputs.flags.writeable
+    assert st.outputs.flags.writeable
+    st.outputs[0,0] = 5.0
+
 def test_backward_pass():
     npr.seed(1)
 
@@ -0,0 +1,311 @@
+# -*- coding: utf-8 -*-
+# Spearmint
+#
+# Academic and Non-Commercial Research Use Software License and Terms
+# of Use
+#
+# Spearmint is a software package to perform Bayesian optimization
+# according to specific algorithms (the “Software”).  The Software is
+# designed to automatically run experiments (thus the code name
+# 'spearmint') in a manner that iteratively adjusts a number of
+# parameters so as to minimize some objective in as few runs as
+# possible.
+#
+# The Software was developed by Ryan P. Adams, Michael Gelbart, and
+# Jasper Snoek at Harvard University, Kevin Swersky at the
+# University of Toronto (“Toronto”), and Hugo Larochelle at the
+# Université de Sherbrooke (“Sherbrooke”), which assigned its rights
+# in the Software to Socpra Sciences et Génie
+# S.E.C. (“Socpra”). Pursuant to an inter-institutional agreement
+# between the parties, it is distributed for free academic and
+# non-commercial research use by the President and Fellows of Harvard
+# College (“Harvard”).
+#
+# Using the Software indicates your agreement to be bound by the terms
+# of this Software Use Agreement (“Agreement”). Absent your agreement
+# to the terms below, you (the “End User”) have no rights to hold or
+# use the Software whatsoever.
+#
+# Harvard agrees to grant hereunder the limited non-exclusive license
+# to End User for the use of the Software in the performance of End
+# User’s internal, non-commercial research and academic use at End
+# User’s academic or not-for-profit research institution
+# (“Institution”) on the following terms and conditions:
+#
+# 1.  NO REDISTRIBUTION. The Software remains the property Harvard,
+# Toronto and Socpra, and except as set forth in Section 4, End User
+# shall not publish, distribute, or otherwise transfer or make
+# available the Software to any other party.
+#
+# 2.  NO COMMERCIAL USE. End User shall not use the Software for
+# commercial purposes and any such use of the Software is expressly
+# prohibited. This includes, but is not limited to, use of the
+# Software in fee-for-service arrangements, core facilities or
+# laboratories or to provide research services to (or in collaboration
+# with) third parties for a fee, and in industry-sponsored
+# collaborative research projects where any commercial rights are
+# granted to the sponsor. If End User wishes to use the Software for
+# commercial purposes or for any other restricted purpose, End User
+# must execute a separate license agreement with Harvard.
+#
+# Requests for use of the Software for commercial purposes, please
+# contact:
+#
+# Office of Technology Development
+# Harvard University
+# Smith Campus Center, Suite 727E
+# 1350 Massachusetts Avenue
+# Cambridge, MA 02138 USA
+# Telephone: (617) 495-3067
+# Facsimile: (617) 495-9568
+# E-mail: otd@harvard.edu
+#
+# 3.  OWNERSHIP AND COPYRIGHT NOTICE. Harvard, Toronto and Socpra own
+# all intellectual property in the Software. End User shall gain no
+# ownership to the Software. End User shall not remove or delete and
+# shall retain in the Software, in any modifications to Software and
+# in any Derivative Works, the copyright, trademark, or other notices
+# pertaining to Software as provided with the Software.
+#
+# 4.  DERIVATIVE WORKS. End User may create and use Derivative Works,
+# as such term is defined under U.S. copyright laws, provided that any
+# such Derivative Works shall be restricted to non-commercial,
+# internal research and academic use at End User’s Institution. End
+# User may distribute Derivative Works to other Institutions solely
+# for the performance of non-commercial, internal research and
+# academic use on terms substantially similar to this License and
+# Terms of Use.
+#
+# 5.  FEEDBACK. In order to improve the Software, comments from End
+# Users may be useful. End User agrees to provide Harvard with
+# feedback on the End User’s use of the Software (e.g., any bugs in
+# the Software, the user experience, etc.).  Harvard is permitted to
+# use such information provided by End User in making changes and
+# improvements to the Software without compensation or an accounting
+# to End User.
+#
+# 6.  NON ASSERT. End User acknowledges that Harvard, Toronto and/or
+# Sherbrooke or Socpra may develop modifications to the Software that
+# may be based on the feedback provided by End User under Section 5
+# above. Harvard, Toronto and Sherbrooke/Socpra shall not be
+# restricted in any way by End User regarding their use of such
+# information.  End User acknowledges the right of Harvard, Toronto
+# and Sherbrooke/Socpra to prepare, publish, display, reproduce,
+# transmit and or use modifications to the Software that may be
+# substantially similar or functionally equivalent to End User’s
+# modifications and/or improvements if any.  In the event that End
+# User obtains patent protection for any modification or improvement
+# to Software, End User agrees not to allege or enjoin infringement of
+# End User’s patent against Harvard, Toronto or Sherbrooke or Socpra,
+# or any of the researchers, medical or research staff, officers,
+# directors and employees of those institutions.
+#
+# 7.  PUBLICATION & ATTRIBUTION. End User has the right to publish,
+# present, or share results from the use of the Software.  In
+# accordance with customary academic practice, End User will
+# acknowledge Harvard, Toronto and Sherbrooke/Socpra as the providers
+# of the Software and may cite the relevant reference(s) from the
+# following list of publications:
+#
+# Practical Bayesian Optimization of Machine Learning Algorithms
+# Jasper Snoek, Hugo Larochelle and Ryan Prescott Adams
+# Neural Information Processing Systems, 2012
+#
+# Multi-Task Bayesian Optimization
+# Kevin Swersky, Jasper Snoek and Ryan Prescott Adams
+# Advances in Neural Information Processing Systems, 2013
+#
+# Input Warping for Bayesian Optimization of Non-stationary Functions
+# Jasper Snoek, Kevin Swersky, Richard Zemel and Ryan Prescott Adams
+# Preprint, arXiv:1402.0929, http://arxiv.org/abs/1402.0929, 2013
+#
+# Bayesian Optimization and Semiparametric Models with Applications to
+# Assistive Technology Jasper Snoek, PhD Thesis, University of
+# Toronto, 2013
+#
+# 8.  NO WARRANTIES. THE SOFTWARE IS PROVIDED "AS IS." TO THE FULLEST
+# EXTENT PERMITTED BY LAW, HARVARD, TORONTO AND SHERBROOKE AND SOCPRA
+# HEREBY DISCLAIM ALL WARRANTIES OF ANY KIND (EXPRESS, IMPLIED OR
+# OTHERWISE) REGARDING THE SOFTWARE, INCLUDING BUT NOT LIMITED TO ANY
+# IMPLIED WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+# PURPOSE, OWNERSHIP, AND NON-INFRINGEMENT.  HARVARD, TORONTO AND
+# SHERBROOKE AND SOCPRA MAKE NO WARRANTY ABOUT THE ACCURACY,
+# RELIABILITY, COMPLETENESS, TIMELINESS, SUFFICIENCY OR QUALITY OF THE
+# SOFTWARE.  HARVARD, TORONTO AND SHERBROOKE AND SOCPRA DO NOT WARRANT
+# THAT THE SOFTWARE WILL OPERATE WITHOUT ERROR OR INTERRUPTION.
+#
+# 9.  LIMITATIONS OF LIABILITY AND REMEDIES. USE OF THE SOFTWARE IS AT
+# END USER’S OWN RISK. IF END USER IS DISSATISFIED WITH THE SOFTWARE,
+# ITS EXCLUSIVE REMEDY IS TO STOP USING IT.  IN NO EVENT SHALL
+# HARVARD, TORONTO OR SHERBROOKE OR SOCPRA BE LIABLE TO END USER OR
+# ITS INSTITUTION, IN CONTRACT, TORT OR OTHERWISE, FOR ANY DIRECT,
+# INDIRECT, SPECIAL, INCIDENTAL, CONSEQUENTIAL, PUNITIVE OR OTHER
+# DAMAGES OF ANY KIND WHATSOEVER ARISING OUT OF OR IN CONNECTION WITH
+# THE SOFTWARE, EVEN IF HARVARD, TORONTO OR SHERBROOKE OR SOCPRA IS
+# NEGLIGENT OR OTHERWISE AT FAULT, AND REGARDLESS OF WHETHER HARVARD,
+# TORONTO OR SHERBROOKE OR SOCPRA IS ADVISED OF THE POSSIBILITY OF
+# SUCH DAMAGES.
+#
+# 10. INDEMNIFICATION. To the extent permitted by law, End User shall
+# indemnify, defend and hold harmless Harvard, Toronto and Sherbrooke
+# and Socpra, their corporate affiliates, current or future directors,
+# trustees, officers, faculty, medical and professional staff,
+# employees, students and agents and their respective successors,
+# heirs and assigns (the "Indemnitees"), against any liability,
+# damage, loss or expense (including reasonable attorney's fees and
+# expenses of litigation) incurred by or imposed upon the Indemnitees
+# or any one of them in connection with any claims, suits, actions,
+# demands or judgments arising from End User’s breach of this
+# Agreement or its Institution’s use of the Software except to the
+# extent caused by the gross negligence or willful misconduct of
+# Harvard, Toronto or Sherbrooke or Socpra. This indemnification
+# provision shall survive expiration or termination of this Agreement.
+#
+# 11. GOVERNING LAW. This Agreement shall be construed and governed by
+# the laws of the Commonwealth of Massachusetts regardless of
+# otherwise applicable choice of law standards.
+#
+# 12. NON-USE OF NAME.  Nothing in this License and Terms of Use shall
+# be construed as granting End Users or their Institutions any rights
+# or licenses to use any trademarks, service marks or logos associated
+# with the Software.  You may not use the terms “Harvard” or
+# “University of Toronto” or “Université de Sherbrooke” or “Socpra
+# Sciences et Génie S.E.C.” (or a substantially similar term) in any
+# way that is inconsistent with the permitted uses described
+# herein. You agree not to use any name or emblem of Harvard, Toronto
+# or Sherbrooke, or any of their subdivisions for any purpose, or to
+# falsely suggest any relationship between End User (or its
+# Institution) and Harvard, Toronto and/or Sherbrooke, or in any
+# manner that would infringe or violate any of their rights.
+#
+# 13. End User represents and warrants that it has the legal authority
+# to enter into this License and Terms of Use on behalf of itself and
+# its Institution.
+
+
+import numpy        as np
+import numpy.random as npr
+import scipy.stats  as sps
+
+from spearmint.utils       import priors
+from spearmint.utils.param import Param, ParamLayout, params_to_array, set_params_from_array
+
+# The scipy.stats log densities that the closed forms replace, with the
+# support checks of the priors that have them
+def tophat_logprob(x, xmin, xmax):
+    return -np.inf if np.any(x < xmin) or np.any(x > xmax) else 0.0
+
+def lognormal_tophat_logprob(x, scale, mean, xmin, xmax):
+    return tophat_logprob(x, xmin, xmax) + np.sum(sps.lognorm.logpdf(x, scale, loc=mean))
+
+REFERENCES = [
+    (priors.Tophat(0.5, 2.0),                lambda x: tophat_logprob(x, 0.5, 2.0)),
+    (priors.Lognormal(1.5),                  lambda x: np.sum(sps.lognorm.logpdf(x, 1.5))),
+    (priors.Lognormal(0.7, mean=0.3),        lambda x: np.sum(sps.lognorm.logpdf(x, 0.7, loc=0.3))),
+    (priors.LognormalTophat(1.5, 0.1, 10),   lambda x: lognormal_tophat_logprob(x, 1.5, 0, 0.1, 10)),
+    (priors.LogLogistic(2.5, scale=1.5),     lambda x: np.sum(sps.fisk.logpdf(x, 2.5, scale=1.5))),
+    (priors.Exponential(0.8),                lambda x: np.sum(sps.expon.logpdf(x, scale=0.8))),
+    (priors.Gaussian(0.5, 2.0),              lambda x: np.sum(sps.norm.logpdf(x, loc=0.5, scale=2.0))),
+    (priors.NoPrior(),                       lambda x: 0.0)
+]
+
+def test_block_logprob():
+    npr.seed(1)
+
+    inside  = [np.array([0.6, 1.0, 1.9]), np.array([1.2]), np.array(1.5)]
+    outside = [np.array([0.6, -1.0, 1.9]), np.array([0.6, 1.0, 20.0]), np.array([0.0, 1.0]), np.array(-0.5)]
+
+    for prior, reference in REFERENCES:
+        for x in inside + outside + [npr.rand(10)*3 - 0.5]:
+            expected = reference(x)
+            actual   = prior.block_logprob(x, *prior.block_args())
+            if np.isnan(expected):
+                # scipy.stats.fisk gives nan at 0, where the density is 0
+                assert actual == -np.inf
+            elif expected == -np.inf:
+                assert actual == -np.inf
+            else:
+                assert np.allclose(actual, expected)
+            assert prior.logprob(x) == actual
+
+        # The arguments can also be given per element
+        x    = inside[0]
+        args = [np.ones(x.size)*arg for arg in prior.block_args()]
+        assert np.allclose(prior.block_logprob(x, *args), reference(x))
+
+def test_param_layout():
+    npr.seed(1)
+
+    params = [Param(0.5,             prior=priors.Gaussian(0.0, 1.0),              name='mean'),
+              Param(1.0,             prior=priors.LognormalOnSquare(1.0),          name='amp2'),
+              Param(np.ones(3),      prior=priors.Tophat(0, 10),                   name='ls'),
+              Param(np.ones(2),      prior=priors.LognormalTophat(1.5, 0.1, 10),   name='alpha'),
+              Param(np.ones(2)*2,    prior=priors.LognormalTophat(1.5, 0.1, 10),   name='beta'),
+              Param(1e-3,            prior=priors.NonNegative(priors.Horseshoe(0.1)), name='noise')]
+    layout = ParamLayout(params)
+
+    assert layout.size == 10
+
+    # Packing and unpacking round trips, with scalars staying scalars
+    x = npr.rand(layout.size) + 0.5
+    layout.set_params(x)
+    assert np.all(params_to_array(params) == x)
+    assert all([np.isscalar(p.value) for p in params if not p.isArray])
+
+    y = x.copy()
+    set_params_from_array(params, y*2)
+    layout.set_params(x)
+    assert np.all(params_to_array(params) == x)
+
+    # The fused prior is the sum of the priors of the params, in and out of their support
+    for x in [npr.rand(layout.size) + 0.5, npr.rand(layout.size)*12 - 1]:
+        set_params_from_array(params, x)
+        expected = sum([p.prior_logprob() for p in params])
+        assert np.allclose(layout.prior_logprob(x), expected) or layout.prior_logprob(x) == expected == -np.inf
+
+    # Evaluating the prior does not change the params
+    before = params_to_array(params)
+    layout.prior_logprob(npr.rand(layout.size))
+    assert np.all(params_to_array(params) == before)
+
+def finite_difference(fun, x, eps=1e-6):
+    x    = np.asarray(x, dtype=float)
+    grad = np.zeros(x.shape)
+    for i in np.ndindex(*x.shape):
+        step    = np.zeros(x.shape)
+        step[i] = eps
+        grad[i] = (fun(x + step) - fun(x - step)) / (2*eps)
+    return grad
+
+def test_grad_logprob():
+    npr.seed(1)
+
+    cov  = np.array([[2.0, 0.5, 0.0], [0.5, 1.0, 0.2], [0.0, 0.2, 0.5]])
+    more = [priors.LognormalOnSquare(1.0, mean=0.2),
+            priors.Horseshoe(0.1),
+            priors.NonNegative(priors.Gaussian(0.0, 1.0)),
+            priors.ProductOfPriors([priors.Lognormal(1.0), priors.Exponential(2.0)]),
+            priors.MultivariateNormal(np.array([0.1, 0.2, 0.3]), cov)]
+
+    # Within the support of every prior
+    for prior in [prior for prior, reference in REFERENCES] + more:
+        for x in [np.array([0.6, 1.0, 1.9]), np.array(1.5)]:
+            if isinstance(prior, priors.MultivariateNormal) and x.ndim == 0:
+                continue
+            grad = prior.grad_logprob(x)
+            assert np.shape(grad) == x.shape
+            np.testing.assert_allclose(grad, finite_difference(prior.logprob, x), rtol=1e-6, atol=1e-8)
+
+def test_param_layout_grad():
+    npr.seed(1)
+
+    params = [Param(0.5,             prior=priors.Gaussian(0.0, 1.0),              name='mean'),
+              Param(1.0,             prior=priors.LognormalOnSquare(1.0),          name='amp2'),
+              Param(np.ones(3),      prior=priors.LogLogistic(2.5, scale=1.5),     name='ls'),
+              Param(np.ones(2),      prior=priors.LognormalTophat(1.5, 0.1, 10),   name='alpha'),
+              Param(np.ones(2)*2,    prior=priors.LognormalTophat(1.5, 0.1, 10),   name='beta'),
+              Param(1e-3,            prior=priors.NonNegative(priors.Horseshoe(0.1)), name='noise')]
+    layout = ParamLayout(params)
+
+    x = npr.rand(layout.size) + 0.5
+    np.testing.assert_allclose(layout.prior_grad(x), finite_difference(layout.prior_logprob, x), rtol=1e-6, atol=1e-8)
@@ -197,10 +197,21 @@ class AbstractTransformation(object):
     def forward_pass(self, inputs):
         pass
 
+    # If inputs is given, it is the input of the forward pass that the
+    # gradient V belongs to. Otherwise the input of the most recent
+    # forward pass is used.
     @abstractmethod
-    def backward_pass(self, V):
+    def backward_pass(self, V, inputs=None):
         pass
 
+    # The gradient wrt the hypers of a function whose gradient wrt the
+    # outputs is V, as a list of (hyper, gradient) pairs where each gradient
+    # has the shape of the value of its hyper. inputs is as for backward_pass.
+    def backward_pass_hypers(self, V, inputs=None):
+        if self.hypers is None:
+            return []
+        raise NotImplementedError('%s does not implement gradients wrt its hypers.' % self.__class__.__name__)
+
     def output_num_dims(self):
         return self.num_dims
 
@@ -183,13 +183,19 @@
 # its Institution.
 
 import warnings
-import numpy       as np
-import scipy.stats as sps
+import numpy         as np
+import scipy.stats   as sps
+import scipy.special as spe
 
 from .abstract_transformation import AbstractTransformation
 from ..utils                  import priors
 from ..utils.param            import Param as Hyperparameter
 
+# The number of terms of the power series of the incomplete beta function
+# in beta_cdf_grad. The series is summed at x <= 1/2, where the terms shrink
+# at least like 2^-n.
+DEFAULT_SERIES_TERMS = 64
+
 
 def truncate_inputs(func):
     """
@@ -201,13 +207,17 @@ def truncate_inputs(func):
     don't want to do this, so print out a warning just in case.
     """
     def inner(cls_instance, inputs, *args):
-        inputs = inputs.copy()
-        if np.any(inputs < 0):
-            warnings.warn('BetaWarp encountered negative values: %s' % inputs[inputs<0])
-            inputs[inputs<0] = 0.0
-        if np.any(inputs > 1):
-            warnings.warn('BetaWarp encountered values above 1: %s' % inputs[inputs>1])
-            inputs[inputs>1] = 1.0
+        # Only copy the inputs if they actually need to be truncated
+        below = inputs < 0
+        above = inputs > 1
+        if np.any(below) or np.any(above):
+            inputs = inputs.copy()
+            if np.any(below):
+                warnings.warn('BetaWarp encountered negative values: %s' % inputs[below])
+                inputs[below] = 0.0
+            if np.any(above):
+                warnings.warn('BetaWarp encountered values above 1: %s' % inputs[above])
+                inputs[above] = 1.0
 
         return func(cls_instance, inputs, *args)
     return inner
@@ -234,6 +244,15 @@ class BetaWarp(AbstractTransformation):
 
         assert self.alpha.value.shape[0] == self.num_dims and self.beta.value.shape[0] == self.num_dims
 
+        self._cache_inputs  = None
+        self._cache_alpha   = None
+        self._cache_beta    = None
+        self._cache_outputs = None
+
+        self._lbeta_alpha = None
+        self._lbeta_beta  = None
+        self._lbeta       = None
+
     @property
     def hypers(self):
         return (self.alpha, self.beta)
@@ -242,16 +261,146 @@ class BetaWarp(AbstractTransformation):
     def forward_pass(self, inputs):
         self._inputs = inputs
 
-        return sps.beta.cdf(inputs, self.alpha.value, self.beta.value)
+        alpha = self.alpha.value
+        beta  = self.beta.value
+
+        # If only some of alpha and beta changed since the last call on the
+        # same inputs, only warp the columns they belong to
+        if (self._cache_inputs is not None and self._cache_inputs.shape == inputs.shape
+            and np.array_equal(self._cache_inputs, inputs)):
+            changed = np.nonzero((alpha != self._cache_alpha) | (beta != self._cache_beta))[0]
+            if changed.size > 0:
+                self._cache_outputs[...,changed] = beta_cdf(inputs[...,changed], alpha[changed], beta[changed])
+        else:
+            self._cache_inputs  = inputs.copy()
+            self._cache_outputs = beta_cdf(inputs, alpha, beta)
+
+        self._cache_alpha = alpha.copy()
+        self._cache_beta  = beta.copy()
+
+        return self._cache_outputs.copy()
+
+    def backward_pass(self, V, inputs=None):
+        alpha  = self.alpha.value
+        beta   = self.beta.value
+        inputs = self._inputs if inputs is None else np.clip(inputs, 0.0, 1.0)
 
-    def backward_pass(self, V):
-        dx = sps.beta.pdf(self._inputs, self.alpha.value, self.beta.value)
+        dx = beta_pdf(inputs, alpha, beta, self._log_beta(alpha, beta))
         dx[np.logical_not(np.isfinite(dx))] = 1.0
 
         return dx*V
 
+    def backward_pass_hypers(self, V, inputs=None):
+        alpha  = self.alpha.value
+        beta   = self.beta.value
+        inputs = self._inputs if inputs is None else np.clip(inputs, 0.0, 1.0)
+
+        d_alpha, d_beta = beta_cdf_grad(inputs, alpha, beta)
+
+        return [(self.alpha, np.sum(V*d_alpha, axis=0)), (self.beta, np.sum(V*d_beta, axis=0))]
+
+    def _log_beta(self, alpha, beta):
+        # The normalizer of the pdf only changes with alpha and beta
+        if not (np.array_equal(alpha, self._lbeta_alpha) and np.array_equal(beta, self._lbeta_beta)):
+            self._lbeta_alpha = alpha.copy()
+            self._lbeta_beta  = beta.copy()
+            self._lbeta       = spe.betaln(alpha, beta)
+
+        return self._lbeta
+
+
+# These compute the same values as sps.beta.cdf and sps.beta.pdf on [0,1]
+# but go straight to the special functions, skipping the argument checking
+# and broadcasting machinery of scipy.stats, which is most of the cost.
+def beta_cdf(x, alpha, beta):
+    return spe.betainc(alpha, beta, x)
+
+def beta_pdf(x, alpha, beta, log_beta=None):
+    if log_beta is None:
+        log_beta = spe.betaln(alpha, beta)
+
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        return np.exp(spe.xlogy(alpha-1, x) + spe.xlog1py(beta-1, -x) - log_beta)
+
+def beta_cdf_grad(x, alpha, beta):
+    """return the derivatives of beta_cdf wrt alpha and beta
+
+    x is N x D, or D, and alpha and beta have one value per column.
+
+    The derivatives come from the power series of the incomplete beta
+    function B_y(p,q) = sum_n c_n y^(p+n)/(p+n), the integral of
+    t^(p-1)(1-t)^(q-1) from 0 to y, in which c_n are the coefficients of
+    (1-t)^(q-1). With I_y(p,q) = B_y(p,q)/B(p,q),
+
+        dI/dp = dB_y/dp / B(p,q) - I_y(p,q) (psi(p) - psi(p+q))
+
+    and the same for q, where the coefficients of dB_y/dq are those of
+    log(1-t)(1-t)^(q-1). At x > 1/2 the series are summed at y = 1-x with
+    the parameters swapped, since I_x(a,b) = 1 - I_{1-x}(b,a), so that they
+    always converge at least like 2^-n.
+    """
+    x        = np.asarray(x, dtype=float)
+    x2d      = np.atleast_2d(x)
+    num_dims = x2d.shape[1]
+
+    # The series of the first num_dims groups are summed at x itself and
+    # those of the others at 1-x. At 0 and 1, where y is 0, the cdf does
+    # not depend on the parameters.
+    high   = x2d > 0.5
+    y      = np.where(high, 1 - x2d, x2d)
+    group  = np.arange(num_dims) + num_dims*high
+    inside = y > 0
+    p      = np.append(alpha, beta).astype(float)
+    q      = np.append(beta, alpha).astype(float)
+    d_p    = np.zeros(x2d.shape)
+    d_q    = np.zeros(x2d.shape)
+
+    if np.any(inside):
+        # Sorted by group, so that each group is a block of rows
+        g     = group[inside]
+        order = np.argsort(g, kind='mergesort')
+        g     = g[order]
+        y_in  = y[inside][order]
+        ends  = np.cumsum(np.bincount(g, minlength=p.size))
+
+        num_terms = min(DEFAULT_SERIES_TERMS, int(np.ceil(np.log(np.finfo(float).eps)/np.log(np.max(y_in)))) + 1)
+        n = np.arange(num_terms)
+
+        # The coefficients of (1-t)^(q-1) and of log(1-t)(1-t)^(q-1),
+        # the product of the first and the series of log(1-t)
+        c     = np.cumprod(np.column_stack((np.ones(q.size), (n[1:] - q[:,np.newaxis])/n[1:])), axis=1)
+        lag   = n[np.newaxis,:] - n[:,np.newaxis]
+        log_c = np.dot(c, np.where(lag > 0, -1.0/np.maximum(lag, 1), 0.0))
+
+        p_n   = p[:,np.newaxis] + n
+        coefs = np.dstack((c/p_n, c/p_n**2, log_c/p_n))
+
+        # The powers y^n, one row per y, times the coefficients of the sums
+        powers       = np.empty((y_in.size, num_terms))
+        powers[:,0]  = 1.0
+        powers[:,1:] = y_in[:,np.newaxis]
+        np.cumprod(powers, axis=1, out=powers)
 
+        sums = np.empty((y_in.size, 3))
+        for i in xrange(p.size):
+            start = ends[i-1] if i > 0 else 0
+            if ends[i] > start:
+                sums[start:ends[i]] = np.dot(powers[start:ends[i]], coefs[i])
 
+        log_y  = np.log(y_in)
+        y_p    = np.exp(p[g]*log_y)*np.exp(-spe.betaln(p, q))[g]
+        cdf    = spe.betainc(p[g], q[g], y_in)
+        psi    = spe.psi(np.append(p, q))
+        psi_pq = spe.psi(p+q)[g]
 
+        d_p_in = np.empty(y_in.size)
+        d_q_in = np.empty(y_in.size)
+        d_p_in[order] = y_p*(log_y*sums[:,0] - sums[:,1]) - cdf*(psi[g] - psi_pq)
+        d_q_in[order] = y_p*sums[:,2] - cdf*(psi[g+p.size] - psi_pq)
+        d_p[inside]   = d_p_in
+        d_q[inside]   = d_q_in
 
+    d_alpha = np.where(high, -d_q, d_p)
+    d_beta  = np.where(high, -d_p, d_q)
 
+    return d_alpha.reshape(x.shape), d_beta.reshape(x.shape)
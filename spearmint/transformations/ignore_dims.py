@@ -207,7 +207,7 @@ class IgnoreDims(AbstractTransformation):
 
         return new_inputs
 
-    def backward_pass(self, V):
+    def backward_pass(self, V, inputs=None):
         JV = V.copy()
         JV[:,self.ign] = 0.0
 
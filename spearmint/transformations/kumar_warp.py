@@ -184,7 +184,8 @@
 
 
 import warnings
-import numpy as np
+import numpy         as np
+import scipy.special as spe
 
 from .abstract_transformation import AbstractTransformation
 from ..utils                  import priors
@@ -200,6 +201,16 @@ def _kumaraswamy_cdf(x, a, b):
     Cx = 1.0 - (1.0 - x**a)**b
     return Cx
 
+def _kumaraswamy_cdf_grad(x, a, b):
+    # The derivatives of the cdf wrt a and b. Both vanish at 0 and 1,
+    # where the products below are 0 times an infinite log.
+    xa = x**a
+    with np.errstate(divide='ignore', invalid='ignore'):
+        da = b*(1.0-xa)**(b-1.0)*spe.xlogy(xa, x)
+        db = -spe.xlogy((1.0-xa)**b, 1.0-xa)
+    da[np.logical_not(np.isfinite(da))] = 0.0
+    return da, db
+
 def truncate_inputs(func):
     """
     Decorator function.
@@ -255,8 +266,17 @@ class KumarWarp(AbstractTransformation):
 
         return x
 
-    def backward_pass(self, V):
-        dx = _kumaraswamy_pdf(self._inputs, self.alpha.value, self.beta.value)
+    def backward_pass(self, V, inputs=None):
+        inputs = self._inputs if inputs is None else np.clip(inputs, 0.0, 1.0)
+
+        dx = _kumaraswamy_pdf(inputs, self.alpha.value, self.beta.value)
         dx[np.logical_not(np.isfinite(dx))] = 1.0
 
         return dx*V
+
+    def backward_pass_hypers(self, V, inputs=None):
+        inputs = self._inputs if inputs is None else np.clip(inputs, 0.0, 1.0)
+
+        d_alpha, d_beta = _kumaraswamy_cdf_grad(inputs, self.alpha.value, self.beta.value)
+
+        return [(self.alpha, np.sum(V*d_alpha, axis=0)), (self.beta, np.sum(V*d_beta, axis=0))]
@@ -219,11 +219,17 @@ class Linear(AbstractTransformation):
         return self.num_factors
 
     def forward_pass(self, inputs):
+        self._inputs = inputs
         return inputs.dot(self.W)
 
-    def backward_pass(self, V):
+    def backward_pass(self, V, inputs=None):
         return V.dot(self.W.T)
 
+    def backward_pass_hypers(self, V, inputs=None):
+        inputs = self._inputs if inputs is None else inputs
+
+        return [(self.weights, inputs.T.dot(V).flatten())]
+
 
 
 
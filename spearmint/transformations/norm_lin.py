@@ -183,6 +183,8 @@
 # its Institution.
 
 
+import numpy as np
+
 from .abstract_transformation import AbstractTransformation
 from .normalization           import Normalization
 from .linear                  import Linear
@@ -214,11 +216,17 @@ class NormLin(AbstractTransformation):
 
         return proj_inputs
 
-    def backward_pass(self, V):
+    def backward_pass(self, V, inputs=None):
         JV_proj = self._proj.backward_pass(V)
-        JV_norm = self._norm.backward_pass(JV_proj)
+        JV_norm = self._norm.backward_pass(JV_proj, inputs)
 
         return JV_norm
 
+    def backward_pass_hypers(self, V, inputs=None):
+        # Without changing the inputs that the layers keep from the forward pass
+        norm_inputs = None if inputs is None else self._norm._normalize(np.maximum(inputs, 0.0))
+
+        return self._proj.backward_pass_hypers(V, norm_inputs)
+
 
 
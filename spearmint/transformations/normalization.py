@@ -215,13 +215,18 @@ class Normalization(AbstractTransformation):
     def forward_pass(self, inputs):
         self._inputs = inputs
 
+        return self._normalize(inputs)
+
+    def _normalize(self, inputs):
         return (inputs+EPSILON) / (inputs+EPSILON).sum(1)[:,None]
 
-    def backward_pass(self, V):
-        s = (self._inputs+EPSILON).sum(1)
+    def backward_pass(self, V, inputs=None):
+        inputs = self._inputs if inputs is None else np.maximum(inputs, 0.0)
+
+        s = (inputs+EPSILON).sum(1)
         if V.ndim == 2:
-            return V/s[:,None] - (((self._inputs+EPSILON)*V).sum(1)/(s**2))[:,None]
+            return V/s[:,None] - (((inputs+EPSILON)*V).sum(1)/(s**2))[:,None]
         elif V.ndim == 3:
-            return V/s[np.newaxis,:,np.newaxis,] - (((self._inputs+EPSILON)*V).sum(-1)/(s[np.newaxis,:]**2))[:,:,np.newaxis]
+            return V/s[np.newaxis,:,np.newaxis,] - (((inputs+EPSILON)*V).sum(-1)/(s[np.newaxis,:]**2))[:,:,np.newaxis]
 
 
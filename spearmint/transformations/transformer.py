@@ -183,12 +183,20 @@
 # its Institution.
 
 import copy
+import inspect
 import numpy as np
 
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 
 from .abstract_transformation import AbstractTransformation
 
+# The outputs of recent forward passes are memoized, keyed by the identity
+# of the input array and the current hyperparameter values, so that e.g. the
+# training inputs are warped once per MCMC state rather than on every call.
+# These bound the number of entries and their total size.
+DEFAULT_MEMO_ENTRIES = 64
+DEFAULT_MEMO_BYTES   = 2**26
+
 class Transformer(object):
     """
     A transformer is essentially a simple multilayer perceptron that
@@ -202,6 +210,13 @@ class Transformer(object):
         self.layer_inds            = []
         self.layer_remaining_inds  = []
         self.layer_output_dims     = []
+        self.layer_plans           = []
+
+        self._scratch           = {}
+        self._memoize           = True
+        self._memo              = OrderedDict()
+        self._memo_bytes        = 0
+        self._last_layer_inputs = None
 
     def add_layer(self, *layer_transformations):
         num_input_dims = self.layer_output_dims[-1] if self.layer_output_dims else self.num_dims
@@ -214,6 +229,10 @@ class Transformer(object):
             transformations, t_inds = zip(*layer_transformations)
 
         self.validate_layer(t_inds)
+
+        # Memoizing is only safe if every transformation can run its backward
+        # pass from given inputs rather than from the state of its last forward pass
+        self._memoize = self._memoize and all([_accepts_inputs(t.backward_pass) for t in transformations])
         
         self.layer_transformations.append(transformations)
         self.layer_inds.append(t_inds)
@@ -225,6 +244,8 @@ class Transformer(object):
         output_dims = [t.output_num_dims() for t in transformations]
         self.layer_output_dims.append(sum(output_dims) + len(remaining_inds))
 
+        self.layer_plans.append(LayerPlan(transformations, t_inds, list(remaining_inds), num_input_dims))
+
         output_inds = []
         i = 0
         for ndims in output_dims:
@@ -247,46 +268,173 @@ class Transformer(object):
         assert all([count == 1 for count in counts.values()]), 'Each index may only be used once.'
 
     def forward_pass(self, inputs):
+        """transform the inputs
+
+        The returned array is read-only since it may be shared with later
+        calls on the same inputs. The inputs of each layer are remembered
+        for the backward pass that follows.
+        """
         assert self.layer_transformations, 'Transformer should contain transformations.'
-        
+
+        key   = (id(inputs), inputs.shape, self._hyper_snapshot()) if self._memoize else None
+        entry = self._memo.pop(key, None)
+        if entry is not None and np.array_equal(entry[0], inputs):
+            self._memo[key] = entry # most recently used goes last
+            self._last_layer_inputs = entry[1]
+            return entry[2]
+        elif entry is not None:
+            self._memo_bytes -= entry[3]
+
+        inputs       = inputs.copy()
+        layer_inputs = []
+
         prev_layer = inputs
-        for transformations, t_inds, remaining_inds, output_num_dims in zip(self.layer_transformations,
-                                                                            self.layer_inds,
-                                                                            self.layer_remaining_inds,
-                                                                            self.layer_output_dims):
-
-            layer_out = np.zeros((prev_layer.shape[0], output_num_dims))
-            i = 0
-            for transformation, inds in zip(transformations, t_inds):
-                t_len = transformation.output_num_dims()
-                layer_out[:,i:i+t_len] = transformation.forward_pass(prev_layer[:,inds])
-                i += t_len
-
-            layer_out[:,i:] = prev_layer[:,remaining_inds]
+        for plan in self.layer_plans:
+            layer_inputs.append(prev_layer)
+
+            if plan.identity:
+                layer_out = plan.transformations[0].forward_pass(prev_layer)
+            else:
+                layer_out = np.empty((prev_layer.shape[0], plan.output_dims))
+                for transformation, in_sel, out_sel in plan.parts:
+                    layer_out[:,out_sel] = transformation.forward_pass(prev_layer[:,in_sel])
+                if plan.remaining is not None:
+                    layer_out[:,plan.remaining_out] = prev_layer[:,plan.remaining]
+
             prev_layer = layer_out
 
+        # The output of an identity layer belongs to its transformation,
+        # so only a view of it is made read-only
+        layer_out = layer_out.view()
+        layer_out.flags.writeable = False
+        self._last_layer_inputs = layer_inputs
+
+        num_bytes = sum([x.nbytes for x in layer_inputs]) + layer_out.nbytes
+        if self._memoize and num_bytes <= DEFAULT_MEMO_BYTES:
+            self._memo[key]   = (inputs, layer_inputs, layer_out, num_bytes)
+            self._memo_bytes += num_bytes
+            while len(self._memo) > DEFAULT_MEMO_ENTRIES or self._memo_bytes > DEFAULT_MEMO_BYTES:
+                self._memo_bytes -= self._memo.popitem(last=False)[1][3]
+
         return layer_out
 
+    def _hyper_snapshot(self):
+        values = []
+        for transformations in self.layer_transformations:
+            for transformation in transformations:
+                hypers = transformation.hypers
+                if hypers is None:
+                    continue
+                if not isinstance(hypers, (tuple, list)):
+                    hypers = (hypers,)
+                values.extend([np.atleast_1d(getattr(hyper, 'value', hyper)) for hyper in hypers])
+
+        return np.hstack(values).tostring() if values else ''
+
     def backward_pass(self, V):
+        """multiply V by the jacobian of the most recent forward pass"""
+        assert self.layer_transformations, 'Transformer should contain transformations.'
+
+        for l in xrange(len(self.layer_plans)-1, -1, -1):
+            V = self._backward_layer(l, V)
+
+        return V
+
+    def backward_pass_hypers(self, V):
+        """the gradient wrt the hypers of the transformations
+
+        V is the gradient of some function wrt the outputs of the most
+        recent forward pass. Returns a list of (hyper, gradient) pairs.
+        """
         assert self.layer_transformations, 'Transformer should contain transformations.'
 
-        for transformations, t_inds, remaining_inds, output_num_dims in zip(
-                self.layer_transformations,
-                self.layer_inds,
-                self.layer_remaining_inds,
-                self.layer_output_dims)[::-1]:
+        grads = []
+        for l in xrange(len(self.layer_plans)-1, -1, -1):
+            plan         = self.layer_plans[l]
+            layer_inputs = self._last_layer_inputs[l]
+
+            if plan.identity:
+                grads += self._backward_hypers_part(plan.transformations[0], V, layer_inputs)
+            else:
+                for transformation, in_sel, out_sel in plan.parts:
+                    grads += self._backward_hypers_part(transformation, V[...,out_sel], layer_inputs[:,in_sel])
 
-            JV = np.zeros(list(V.shape[:-1])+[len([i for inds in t_inds for i in inds]) + len(remaining_inds)])
-            i = 0
-            for transformation, inds in zip(transformations, t_inds):
-                t_len = transformation.output_num_dims()
-                JV[...,inds] = transformation.backward_pass(V[...,i:i+t_len])
-                i += t_len
+            if l > 0:
+                V = self._backward_layer(l, V)
 
-            JV[...,remaining_inds] = V[...,i:]
-            V = JV
+        return grads
+
+    def _backward_layer(self, l, V):
+        plan         = self.layer_plans[l]
+        layer_inputs = self._last_layer_inputs[l]
+
+        if plan.identity:
+            return self._backward_part(plan.transformations[0], V, layer_inputs)
+
+        # Only the output of the first layer is returned, the others are
+        # consumed right away and can reuse their buffers between calls
+        shape = V.shape[:-1] + (plan.input_dims,)
+        if l == 0:
+            JV = np.empty(shape)
+        else:
+            JV = self._scratch.get(l)
+            if JV is None or JV.shape != shape:
+                JV = self._scratch[l] = np.empty(shape)
+
+        for transformation, in_sel, out_sel in plan.parts:
+            JV[...,in_sel] = self._backward_part(transformation, V[...,out_sel], layer_inputs[:,in_sel])
+        if plan.remaining is not None:
+            JV[...,plan.remaining] = V[...,plan.remaining_out]
 
         return JV
 
-        
-        
\ No newline at end of file
+    def _backward_part(self, transformation, V, inputs):
+        if self._memoize:
+            return transformation.backward_pass(V, inputs)
+        else:
+            return transformation.backward_pass(V)
+
+    def _backward_hypers_part(self, transformation, V, inputs):
+        if self._memoize:
+            return transformation.backward_pass_hypers(V, inputs)
+        else:
+            return transformation.backward_pass_hypers(V)
+
+
+class LayerPlan(object):
+    """the precompiled layout of a transformer layer
+
+    Index sets that are contiguous become slices so that gathering them
+    makes views rather than copies. A layer with a single transformation
+    that takes all of its inputs in order is the identity layout and
+    needs no gathering or scattering at all.
+    """
+    def __init__(self, transformations, t_inds, remaining_inds, input_dims):
+        self.transformations = transformations
+        self.input_dims      = input_dims
+        self.identity        = (len(transformations) == 1 and not remaining_inds and
+                                list(t_inds[0]) == range(input_dims))
+
+        self.parts = []
+        i = 0
+        for transformation, inds in zip(transformations, t_inds):
+            t_len = transformation.output_num_dims()
+            self.parts.append((transformation, _selector(inds), slice(i, i+t_len)))
+            i += t_len
+
+        self.output_dims   = i + len(remaining_inds)
+        self.remaining     = _selector(remaining_inds) if remaining_inds else None
+        self.remaining_out = slice(i, self.output_dims)
+
+
+def _selector(inds):
+    inds = list(inds)
+    if inds == range(inds[0], inds[0]+len(inds)):
+        return slice(inds[0], inds[0]+len(inds))
+    else:
+        return np.array(inds, dtype=int)
+
+
+def _accepts_inputs(backward_pass):
+    args, varargs, _, _ = inspect.getargspec(backward_pass)
+    return 'inputs' in args or varargs is not None
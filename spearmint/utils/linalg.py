@@ -187,6 +187,79 @@ import numpy as np
 import scipy.weave
 import scipy.linalg as spla
 
+# Jitter for cholesky(), relative to the mean of the diagonal. It starts
+# at DEFAULT_JITTER and grows by DEFAULT_JITTER_GROWTH per retry.
+DEFAULT_JITTER        = 1e-10
+DEFAULT_JITTER_GROWTH = 10.0
+DEFAULT_JITTER_TRIES  = 6
+DEFAULT_CHOL_CACHE    = 2
+
+# Counts of what cholesky() did, for instrumentation
+cholesky_stats = {
+    'calls'      : 0,
+    'cache hits' : 0,
+    'jittered'   : 0,
+    'failures'   : 0,
+    'max jitter' : 0.0,
+    'last jitter': 0.0
+}
+
+def cholesky(A, lower=True, max_tries=DEFAULT_JITTER_TRIES, cache=None):
+    """return the Cholesky factor of the symmetric matrix A, with jitter if needed
+
+    If A is not numerically positive definite, e.g. because of duplicate
+    inputs or a tiny noise, the factorization is retried with a growing
+    multiple of the identity added to A, up to max_tries times. The jitter
+    that was used is recorded in cholesky_stats. If all tries fail, the
+    LinAlgError of the last one is raised.
+
+    The cache is an OrderedDict that the caller owns, e.g. one per model.
+    If it is given, it keeps the last DEFAULT_CHOL_CACHE factors, so that
+    factorizing one of those matrices again is a lookup. Cached factors are
+    read-only. Only pass a cache where the same matrix really recurs, since
+    each miss hashes and copies A.
+    """
+    cholesky_stats['calls'] += 1
+
+    key = None
+    if cache is not None and A.size > 0:
+        key = (A.shape, lower, hash(A.tostring()))
+        if key in cache and np.array_equal(cache[key][0], A):
+            cache[key] = cache.pop(key)
+            cholesky_stats['cache hits'] += 1
+            return cache[key][1]
+
+    jitter = 0.0
+    scale  = np.mean(np.diag(A)) if A.size > 0 else 1.0
+    scale  = scale if np.isfinite(scale) and scale > 0 else 1.0
+    for i in xrange(max_tries+1):
+        try:
+            if jitter > 0:
+                chol = spla.cholesky(A + jitter*np.eye(A.shape[0]), lower=lower)
+            else:
+                chol = spla.cholesky(A, lower=lower)
+            break
+        except np.linalg.LinAlgError:
+            if i == max_tries:
+                cholesky_stats['failures'] += 1
+                raise
+            jitter = DEFAULT_JITTER*scale if jitter == 0 else jitter*DEFAULT_JITTER_GROWTH
+
+    cholesky_stats['last jitter'] = jitter
+    if jitter > 0:
+        cholesky_stats['jittered']  += 1
+        cholesky_stats['max jitter'] = max(cholesky_stats['max jitter'], jitter)
+
+    if key is not None:
+        A = A.copy()
+        A.flags.writeable    = False
+        chol.flags.writeable = False
+        cache[key] = (A, chol)
+        while len(cache) > DEFAULT_CHOL_CACHE:
+            cache.popitem(last=False)
+
+    return chol
+
 # Update Cholesky decomposition to include a single extra
 # row/column in the input matrix which is significantly faster than
 # recomputing the entire cholesky decomposition.
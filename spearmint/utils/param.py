@@ -204,6 +204,98 @@ def params_to_array(params_iterable):
     return np.hstack([param.value for param in params_iterable])
     # Not sure if copying is really needed
 
+class ParamLayout(object):
+    """the layout of a list of Params in a flat parameter array
+
+    The layout is compiled once from the params and then maps a flat array
+    back onto them without re-inspecting each param. The priors that act
+    elementwise (see utils.priors) are grouped by type so that the prior
+    log probability of the whole array, and its gradient, cost one numpy
+    call per prior type.
+
+    Parameters
+    ----------
+    params_iterable : iterable of Params
+        The layout becomes stale if the sizes of the params change.
+    """
+    def __init__(self, params_iterable):
+        self.params = list(params_iterable)
+        self.slices = []
+        self.scalar = []
+
+        index = 0
+        for param in self.params:
+            size = param.size()
+            self.slices.append(slice(index, index+size))
+            self.scalar.append(size == 1 and not param.isArray)
+            index += size
+        self.size = index
+
+        # Group the elementwise priors by type. The arguments of each group
+        # are expanded to one entry per element of the flat array.
+        groups = {}
+        self.other_priors = []
+        for param, sl, scalar in zip(self.params, self.slices, self.scalar):
+            if param.prior.block_args is None:
+                self.other_priors.append((param.prior, sl, scalar))
+                continue
+            if isinstance(param.prior, priors.NoPrior):
+                continue
+            prior_type = type(param.prior)
+            if prior_type not in groups:
+                groups[prior_type] = ([], [])
+            groups[prior_type][0].append(np.arange(sl.start, sl.stop))
+            groups[prior_type][1].append([np.ones(sl.stop-sl.start)*arg for arg in param.prior.block_args()])
+
+        self.prior_groups = []
+        for prior_type, (inds, args) in groups.iteritems():
+            inds = np.hstack(inds)
+            args = tuple(np.hstack(arg) for arg in zip(*args))
+            self.prior_groups.append((prior_type, inds, args))
+
+    def set_params(self, params_array):
+        """Update the params with the new values stored in params_array"""
+        for param, sl, scalar in zip(self.params, self.slices, self.scalar):
+            if scalar:
+                param.value = params_array[sl.start]
+            else:
+                param.value = params_array[sl]
+
+    def prior_logprob(self, params_array):
+        """the summed prior log probability of params_array
+
+        The values of the params are not changed. Returns as soon as any
+        prior is -inf.
+        """
+        lp = 0.0
+        for prior_type, inds, args in self.prior_groups:
+            lp += prior_type.block_logprob(params_array[inds], *args)
+            if lp == -np.inf:
+                return lp
+        for prior, sl, scalar in self.other_priors:
+            if scalar:
+                lp += prior.logprob(params_array[sl.start])
+            else:
+                lp += prior.logprob(params_array[sl])
+            if lp == -np.inf:
+                return lp
+        return lp
+
+    def prior_grad(self, params_array):
+        """the gradient of prior_logprob wrt params_array, in closed form
+
+        Only meaningful where the prior log probability is finite.
+        """
+        grad = np.zeros(self.size)
+        for prior_type, inds, args in self.prior_groups:
+            grad[inds] = prior_type.block_grad(params_array[inds], *args)
+        for prior, sl, scalar in self.other_priors:
+            if scalar:
+                grad[sl] = prior.grad_logprob(params_array[sl.start])
+            else:
+                grad[sl] = prior.grad_logprob(params_array[sl])
+        return grad
+
 def params_to_dict(params_iterable):
     params_dict = {}
     for param in params_iterable:
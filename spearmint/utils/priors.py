@@ -189,15 +189,35 @@ import scipy.stats as sps
 from operator import add # same as lambda x,y:x+y I think
 # import scipy.special.gammaln as log_gamma
 
+LOG_SQRT_2PI = 0.5*np.log(2*np.pi)
 
 
+# Priors that act independently on each element of a parameter can be
+# evaluated in blocks: block_args() returns the prior's own arguments and
+# the static method block_logprob(x, *args) evaluates the summed log
+# probability of x, where each argument is either a scalar or an array
+# of the same size as x. The static method block_grad(x, *args) is its
+# gradient wrt x, elementwise. This is what lets utils.param.ParamLayout
+# fuse the priors of many parameters into a single numpy call per prior
+# type. Priors that do not support this set block_args to None.
+#
+# All priors have grad_logprob(x), the gradient of logprob in closed form.
+# It is only meaningful within the support of the prior.
+
 class AbstractPrior(object):
     __metaclass__ = ABCMeta
 
+    block_args = None
+
     @abstractmethod
     def logprob(self, x):
         pass
 
+    def grad_logprob(self, x):
+        if self.block_args is None:
+            raise NotImplementedError('%s does not implement the gradient of its log probability.' % self.__class__.__name__)
+        return self.block_grad(x, *self.block_args())
+
     # Some of these are "improper priors" and I cannot sample from them
     # In this case the sample method will just return None
     # (or could raise an exception)
@@ -216,11 +236,22 @@ class Tophat(AbstractPrior):
             raise Exception("xmax must be greater than xmin")
 
     def logprob(self, x):
-        if np.any(x < self.xmin) or np.any(x > self.xmax):
+        return Tophat.block_logprob(x, self.xmin, self.xmax)
+
+    def block_args(self):
+        return (self.xmin, self.xmax)
+
+    @staticmethod
+    def block_logprob(x, xmin, xmax):
+        if np.any(x < xmin) or np.any(x > xmax):
             return -np.inf
         else:
             return 0.  # More correct is -np.log(self.xmax-self.xmin), but constants don't matter
 
+    @staticmethod
+    def block_grad(x, xmin, xmax):
+        return np.zeros(np.shape(x))
+
     def sample(self, n_samples):
         return self.xmin + npr.rand(n_samples) * (self.xmax-self.xmin)
 
@@ -243,6 +274,10 @@ class Horseshoe(AbstractPrior):
         # (or am I wrong and for the univariate case we have it analytically?)
         return np.sum(np.log(np.log(1 + 3.0 * (self.scale/x)**2) ) )
 
+    def grad_logprob(self, x):
+        u = 3.0 * (self.scale/x)**2
+        return -2*u / (x*(1 + u)*np.log(1 + u))
+
     def sample(self, n_samples):
         # Sample from standard half-cauchy distribution
         lamda = np.abs(npr.standard_cauchy(size=n_samples))
@@ -257,7 +292,25 @@ class Lognormal(AbstractPrior):
         self.mean = mean
 
     def logprob(self, x):
-        return np.sum(sps.lognorm.logpdf(x, self.scale, loc=self.mean))
+        return Lognormal.block_logprob(x, self.scale, self.mean)
+
+    def block_args(self):
+        return (self.scale, self.mean)
+
+    # Same as np.sum(sps.lognorm.logpdf(x, scale, loc=mean)) without the
+    # overhead of scipy.stats, which dominates for small x
+    @staticmethod
+    def block_logprob(x, scale, mean):
+        y = np.asarray(x - mean, dtype=float)
+        if np.any(y <= 0):
+            return -np.inf
+        log_y = np.log(y)
+        return np.sum(-0.5*(log_y/scale)**2 - log_y - np.log(scale) - LOG_SQRT_2PI)
+
+    @staticmethod
+    def block_grad(x, scale, mean):
+        y = np.asarray(x - mean, dtype=float)
+        return -(np.log(y)/scale**2 + 1)/y
 
     def sample(self, n_samples):
         return npr.lognormal(mean=self.mean, sigma=self.scale, size=n_samples)
@@ -273,16 +326,29 @@ class LognormalTophat(AbstractPrior):
             raise Exception("xmax must be greater than xmin")
 
     def logprob(self, x):
-        if np.any(x < self.xmin) or np.any(x > self.xmax):
+        return LognormalTophat.block_logprob(x, self.scale, self.mean, self.xmin, self.xmax)
+
+    def block_args(self):
+        return (self.scale, self.mean, self.xmin, self.xmax)
+
+    @staticmethod
+    def block_logprob(x, scale, mean, xmin, xmax):
+        if np.any(x < xmin) or np.any(x > xmax):
             return -np.inf
         else:
-            return np.sum(sps.lognorm.logpdf(x, self.scale, loc=self.mean))
+            return Lognormal.block_logprob(x, scale, mean)
+
+    @staticmethod
+    def block_grad(x, scale, mean, xmin, xmax):
+        return Lognormal.block_grad(x, scale, mean)
 
     def sample(self, n_samples):
         raise Exception('Sampling of LognormalTophat is not implemented.')
 
 # Let X~lognormal and Y=X^2. This is distribution of Y.
 class LognormalOnSquare(Lognormal):
+    block_args = None
+
     def logprob(self, y):
         if np.any(y < 0): # Need this here or else sqrt(y) may occur with y < 0
             return -np.inf
@@ -291,7 +357,11 @@ class LognormalOnSquare(Lognormal):
         dy_dx = 2*x  # this is the Jacobean or inverse Jacobean, whatever
         # p_y(y) = p_x(sqrt(x)) / (dy/dx)
         # log p_y(y) = log p_x(x) - log(dy/dx)
-        return Lognormal.logprob(self, x) - np.log(dy_dx)
+        return Lognormal.logprob(self, x) - np.sum(np.log(dy_dx))
+
+    def grad_logprob(self, y):
+        x = np.sqrt(y)
+        return Lognormal.block_grad(x, self.scale, self.mean)/(2*x) - 0.5/y
 
     def sample(self, n_samples):
         return Lognormal.sample(self, n_samples)**2
@@ -302,14 +372,46 @@ class LogLogistic(AbstractPrior):
         self.scale = scale
 
     def logprob(self, x):
-        return np.sum(sps.fisk.logpdf(x, self.shape, scale=self.scale))
+        return LogLogistic.block_logprob(x, self.shape, self.scale)
+
+    def block_args(self):
+        return (self.shape, self.scale)
+
+    # Same as np.sum(sps.fisk.logpdf(x, shape, scale=scale))
+    @staticmethod
+    def block_logprob(x, shape, scale):
+        y = np.asarray(x, dtype=float)/scale
+        if np.any(y < 0):
+            return -np.inf
+        with np.errstate(divide='ignore'):
+            log_y = np.log(y)
+        return np.sum(np.log(shape) + (shape-1)*log_y - 2*np.log1p(y**shape) - np.log(scale))
+
+    @staticmethod
+    def block_grad(x, shape, scale):
+        y = np.asarray(x, dtype=float)/scale
+        return ((shape-1)/y - 2*shape*y**(shape-1)/(1 + y**shape))/scale
 
 class Exponential(AbstractPrior):
     def __init__(self, mean):
         self.mean = mean
 
     def logprob(self, x):
-        return np.sum(sps.expon.logpdf(x, scale=self.mean))
+        return Exponential.block_logprob(x, self.mean)
+
+    def block_args(self):
+        return (self.mean,)
+
+    # Same as np.sum(sps.expon.logpdf(x, scale=mean))
+    @staticmethod
+    def block_logprob(x, mean):
+        if np.any(x < 0):
+            return -np.inf
+        return np.sum(-x/mean - np.log(mean))
+
+    @staticmethod
+    def block_grad(x, mean):
+        return -np.ones(np.shape(x))/mean
 
     def sample(self, n_samples):
         return npr.exponential(scale=self.mean, size=n_samples)
@@ -322,7 +424,19 @@ class Gaussian(AbstractPrior):
         self.sigma = sigma
 
     def logprob(self, x):
-        return np.sum(sps.norm.logpdf(x, loc=self.mu, scale=self.sigma))
+        return Gaussian.block_logprob(x, self.mu, self.sigma)
+
+    def block_args(self):
+        return (self.mu, self.sigma)
+
+    # Same as np.sum(sps.norm.logpdf(x, loc=mu, scale=sigma))
+    @staticmethod
+    def block_logprob(x, mu, sigma):
+        return np.sum(-0.5*((x-mu)/sigma)**2 - np.log(sigma) - LOG_SQRT_2PI)
+
+    @staticmethod
+    def block_grad(x, mu, sigma):
+        return -(x-mu)/sigma**2
 
     def sample(self, n_samples):
         return self.mu + npr.randn(n_samples) * self.sigma
@@ -338,6 +452,9 @@ class MultivariateNormal(AbstractPrior):
     def logprob(self, x):
         return sps.multivariate_normal.logpdf(x, mean=self.mu, cov=self.cov)
 
+    def grad_logprob(self, x):
+        return -np.linalg.solve(self.cov, x - self.mu)
+
     def sample(self, n_samples):
         return npr.multivariate_normal(self.mu, self.cov, size=n_samples).T.squeeze()
 
@@ -348,6 +465,17 @@ class NoPrior(AbstractPrior):
     def logprob(self, x):
         return 0.0
 
+    def block_args(self):
+        return ()
+
+    @staticmethod
+    def block_logprob(x):
+        return 0.0
+
+    @staticmethod
+    def block_grad(x):
+        return np.zeros(np.shape(x))
+
 # This class takes in another prior in its constructor
 # And gives you the nonnegative version (actually the positive version, to be numerically safe)
 class NonNegative(AbstractPrior):
@@ -363,6 +491,9 @@ class NonNegative(AbstractPrior):
         else:
             return self.prior.logprob(x)# + np.log(2.0)
         # Above: the log(2) makes it correct, but we don't ever care about it I think
+
+    def grad_logprob(self, x):
+        return self.prior.grad_logprob(x)
         
 
 # This class allows you to compose a list priors
@@ -378,6 +509,9 @@ class ProductOfPriors(AbstractPrior):
             lp += prior.logprob(x)
         return lp
 
+    def grad_logprob(self, x):
+        return reduce(add, [prior.grad_logprob(x) for prior in self.priors])
+
 # class Binomial(AbstractPrior):
 #     def __init__(self, p, n):
 #         self.p = p